@@ -1,9 +1,14 @@
 import unittest
+import itertools
 import main
 import os
 import pickle
 import sympy
-from lhs_generators import create_standard_lhs
+from lhs_generators import create_standard_lhs, lhs_value_cache_path
+from lhs_value_cache import LHSValueCache
+from enumerate_over_signed_rcf import SignedRcfEnumeration, smallest_period, lyndon_words, sign_periods
+from search_log import SearchLog
+from ramanujan.ResultsStore import ResultsStore
 
 
 class APITests(unittest.TestCase):
@@ -62,6 +67,179 @@ class APITests(unittest.TestCase):
         self.assertIn([(sympy.E / (-2 + sympy.E)), [1, 1], [1, 0, 0, -1, 0, 0, -1, 0, 0, 1]], adjusted)
         print('Search results are as expected.')
 
+    def test_ESMA_api4(self): # Test parallel search configuration. Results should match the serial search.
+        cmd = 'ESMA -mode search -constant e -cycle_range 2 2 -depth 105 -poly_deg 1 -coeff_lim 2 -workers 2' + \
+              ' -no_print'
+        cmd = cmd.split(' ')
+        parser = main.init_parser()
+        args = parser.parse_args(cmd)
+        results = main.enumerate_over_signed_rcf_main(args)
+        self.assertEqual(len(results), 13)
+        adjusted = [[res[0], res[1], list(res[3])] for res in results]
+        self.assertIn([(sympy.E / (sympy.E - 1)), [1, -1], [1, 0, -2, 0, 1]], adjusted)
+        self.assertIn([-1 + sympy.E, [-1, 1], [1, 0, -2, 0, 1]], adjusted)
+        print('Parallel search results are as expected.')
+
+    def test_ESMA_api5(self): # Test numeric build configuration. Should give the same LHS values as the standard one.
+        cmd = 'ESMA -mode build -lhs standard -poly_deg 1 -coeff_lim 2 -numeric_build -no_print'
+        cmd = cmd.split(' ')
+        parser = main.init_parser()
+        args = parser.parse_args(cmd)
+        lhs = main.enumerate_over_signed_rcf_main(args)
+        x = sympy.Symbol('x')
+        numeric_values = set(sympy.N(var.subs({x: sympy.E}), 30) for var in lhs)
+        standard = create_standard_lhs(poly_deg=1, coefficients_limit=2, do_print=False)
+        standard_values = set(sympy.N(var.subs({x: sympy.E}), 30) for var in standard)
+        self.assertEqual(len(lhs), len(numeric_values))
+        self.assertEqual(numeric_values, standard_values)
+        print("Identical enumeration values.")
+
+    def test_ESMA_api6(self): # Test search using a compact enumeration, built numerically and converted from a pickle.
+        path = './tmp.npy'
+        cmd = 'ESMA -mode build -lhs standard -poly_deg 1 -coeff_lim 2 -numeric_build -compact -out_dir ' + path + \
+              ' -no_print'
+        parser = main.init_parser()
+        main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+        cmd = 'ESMA -mode search -constant e -cycle_range 2 2 -lhs ' + path + ' -no_print'
+        results = main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+        os.remove(path)
+        self.assertEqual(len(results), 13)
+        adjusted = [[res[0], res[1], list(res[3])] for res in results]
+        self.assertIn([(sympy.E / (-2 + sympy.E)), [1, 1], [1, 0, 0, -1, 0, 0, -1, 0, 0, 1]], adjusted)
+
+        with open('./tmp', 'wb') as file:
+            pickle.dump(create_standard_lhs(poly_deg=1, coefficients_limit=2, do_print=False), file)
+        cmd = 'ESMA -mode convert -lhs ./tmp -out_dir ' + path
+        main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+        cmd = 'ESMA -mode search -constant e -cycle_range 2 2 -lhs ' + path + ' -no_print'
+        results = main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+        os.remove('./tmp')
+        os.remove(path)
+        self.assertEqual(len(results), 13)
+        print('Compact enumeration results are as expected.')
+
+    def test_ESMA_api7(self): # Test resuming a killed search from its log. Results should match an uninterrupted search.
+        enum = SignedRcfEnumeration(sympy.E, [2, 2], depth=105, coefficients_limit=2, poly_deg=1, do_print=False)
+        os.makedirs('./tmp')
+        search_log = SearchLog('./tmp/search_log')
+        enum.find_hits(search_log)
+        search_log.close()
+        self.assertEqual(len(search_log.done), len(enum.create_lhs_enumeration()))
+        with open('./tmp/search_log', 'r+b') as f:  # kill the search in the middle of writing a record
+            f.truncate(os.path.getsize('./tmp/search_log') // 2)
+        self.assertLess(len(SearchLog('./tmp/search_log').done), len(search_log.done))
+        cmd = 'ESMA -out_dir ./tmp -mode search -constant e -cycle_range 2 2 -depth 105 -poly_deg 1' + \
+              ' -coeff_lim 2 -no_print'
+        parser = main.init_parser()
+        results = main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+        self.assertEqual(len(results), 13)
+        adjusted = [[res[0], res[1], list(res[3])] for res in results]
+        self.assertIn([(sympy.E / (sympy.E - 1)), [1, -1], [1, 0, -2, 0, 1]], adjusted)
+        self.assertIn([-1 + sympy.E, [-1, 1], [1, 0, -2, 0, 1]], adjusted)
+        self.assertFalse(os.path.exists('./tmp/search_log'))
+        os.remove('./tmp/res_list_0')
+        os.remove('./tmp/recurring_by_value_0')
+        os.rmdir('./tmp')
+        print('Resumed search results are as expected.')
+
+
+    def test_ESMA_api8(self): # Test grouping results that are mobius transforms of each other.
+        cmd = 'ESMA -mode search -constant e -cycle_range 2 3 -depth 105 -poly_deg 2 -coeff_lim 1 -numeric_build' + \
+              ' -group_equivalent -no_print'
+        parser = main.init_parser()
+        results = main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+        # every result is a mobius transform of either e or coth(1)
+        self.assertEqual(len(results), 2)
+        print('Grouped results are as expected.')
+
+    def test_ESMA_api9(self): # Test search with cached LHS values. A second search should use the values of the first.
+        path = './tmp'
+        with open(path, 'wb') as file:
+            pickle.dump(create_standard_lhs(poly_deg=1, coefficients_limit=2, do_print=False), file)
+        cmd = 'ESMA -mode search -constant e -cycle_range 2 2 -lhs ' + path + ' -cache_values -no_print'
+        parser = main.init_parser()
+        results = main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+        values_path = lhs_value_cache_path(path, 'e')
+        self.assertTrue(os.path.exists(values_path))
+        n_cached = len(LHSValueCache(values_path))
+        self.assertGreater(n_cached, 0)
+        cached_results = main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+        self.assertEqual(len(LHSValueCache(values_path)), n_cached)  # nothing new to evaluate
+        os.remove(path)
+        os.remove(values_path)
+        self.assertEqual(len(results), 13)
+        adjusted = [[res[0], res[1], list(res[3])] for res in results]
+        self.assertEqual([[res[0], res[1], list(res[3])] for res in cached_results], adjusted)
+        self.assertIn([(sympy.E / (-2 + sympy.E)), [1, 1], [1, 0, 0, -1, 0, 0, -1, 0, 0, 1]], adjusted)
+        print('Cached values search results are as expected.')
+
+    def test_ESMA_api10(self): # Test searching twice with a results database. The second search verifies nothing new.
+        path = './tmp.db'
+        cmd = 'ESMA -mode search -constant e -cycle_range 2 2 -depth 105 -poly_deg 1 -coeff_lim 2 -results_db ' + \
+              path + ' -no_print'
+        parser = main.init_parser()
+        verify_result = SignedRcfEnumeration.verify_result
+        verified = []
+
+        def counting_verify_result(enum, res):  # count the results that are verified (and not taken from the database)
+            key = verify_result(enum, res)
+            if key is not None:
+                verified.append(res)
+            return key
+
+        SignedRcfEnumeration.verify_result = counting_verify_result
+        try:
+            results = main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+            n_verified = len(verified)
+            store = ResultsStore(path)
+            n_conjectures = store.count_conjectures([sympy.E])
+            store.close()
+            second_results = main.enumerate_over_signed_rcf_main(parser.parse_args(cmd.split(' ')))
+        finally:
+            SignedRcfEnumeration.verify_result = verify_result
+        store = ResultsStore(path)
+        self.assertEqual(store.count_conjectures([sympy.E]), n_conjectures)
+        store.close()
+        os.remove(path)
+        self.assertEqual(len(results), 13)
+        self.assertGreaterEqual(n_verified, len(results))
+        self.assertEqual(n_conjectures, n_verified)
+        self.assertEqual(len(verified), n_verified)  # the known results were skipped
+        adjusted = [[res[0], res[1], list(res[3])] for res in results]
+        self.assertEqual([[res[0], res[1], list(res[3])] for res in second_results], adjusted)
+        print('Results database search results are as expected.')
+
+
+    def test_ESMA_sign_periods(self): # Test generating sign periods without deduplicating them.
+        def rotation_class(period):
+            primitive = period[:smallest_period(period)]
+            return min(tuple(primitive[i:] + primitive[:i]) for i in range(len(primitive)))
+
+        def n_lyndon_words(n):  # necklace formula, (1/n) * sum over d | n of mobius(d) * 2^(n/d)
+            return sum(sympy.mobius(d) * 2 ** (n // d) for d in sympy.divisors(n)) // n
+
+        self.assertEqual(smallest_period([1, -1, 1, -1, 1, -1]), 2)
+        self.assertEqual(smallest_period([1, -1, 1, -1, 1]), 5)
+        self.assertEqual(smallest_period([1, 1, 1]), 1)
+
+        words = list(lyndon_words(8))
+        for n in range(1, 9):
+            self.assertEqual(len([word for word in words if len(word) == n]), n_lyndon_words(n))
+        # only primitive words, each the smallest of its rotations
+        self.assertTrue(all(smallest_period(word) == len(word) for word in words))
+        self.assertTrue(all(tuple(word) == rotation_class(word) for word in words))
+
+        periods = list(sign_periods(3, 6))
+        primitives = [tuple(period[:smallest_period(period)]) for period in periods]
+        self.assertEqual(len(set(primitives)), len(periods))  # every sign sequence is generated once
+        # and every sign sequence with a period of length 3 to 6 is generated
+        self.assertEqual(set(primitives), {word[:smallest_period(word)] for n in range(3, 7)
+                                           for word in itertools.product([-1, 1], repeat=n)})
+        rotated_periods = list(sign_periods(3, 6, rotations_equivalent=True))
+        rotation_classes = [rotation_class(period) for period in rotated_periods]
+        self.assertEqual(len(set(rotation_classes)), len(rotated_periods))  # a single rotation of each period
+        self.assertEqual(set(rotation_classes), {rotation_class(period) for period in periods})
+
 
 if __name__ == '__main__':
     unittest.main()
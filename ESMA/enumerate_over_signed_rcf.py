@@ -1,14 +1,22 @@
 import os
 import pickle
+import multiprocessing
 from time import time
 import itertools
+from functools import reduce
+from math import gcd
 import mpmath
 import sympy
-from sympy import lambdify, Rational
+from sympy import Rational
 from massey import slow_massey
-from EfficientGCF import EfficientGCF
-from ramanujan.utils.mobius import GeneralizedContinuedFraction
-from ramanujan.utils.convergence_rate import calculate_convergence
+from lhs_value_cache import LHSValueCache
+from lhs_compact import CompactLHS, RationalLHS
+from search_log import SearchLog
+from ramanujan.utils.mobius import GeneralizedContinuedFraction, evaluate_gcf_to_precision
+from ramanujan.utils.convergence_rate import estimate_convergence
+from ramanujan.utils.utils import values_agree, create_mpf_const_generator
+from ramanujan.utils.equivalence import group_by_equivalence
+from ramanujan.ResultsStore import ResultsStore
 
 """
 Some important terminology:
@@ -52,10 +60,166 @@ def create_series_from_shift_reg(poly_a, initials, n):
     return a_
 
 
+def _poly_trim(poly):
+    """
+    removes zero coefficients of the highest powers. (coefficients are ordered from the free coefficient upwards)
+    An empty list is the zero polynomial.
+    """
+    poly = list(poly)
+    while poly and poly[-1] == 0:
+        poly.pop()
+    return poly
+
+
+def _poly_primitive(poly):
+    """
+    divides an integer polynomial by its content, and makes its leading coefficient positive.
+    """
+    content = reduce(gcd, poly)
+    if poly[-1] < 0:
+        content = -content
+    return [c // content for c in poly]
+
+
+def _poly_pseudo_rem(poly_a, poly_b):
+    """
+    pseudo remainder of integer polynomials. the remainder of lc(b)^k * a divided by b, so no fractions are needed.
+    """
+    rem = list(poly_a)
+    lead = poly_b[-1]
+    while len(rem) >= len(poly_b):
+        factor = rem[-1]
+        shift = len(rem) - len(poly_b)
+        rem = [lead * c for c in rem]
+        for i, c in enumerate(poly_b):
+            rem[shift + i] -= factor * c
+        rem = _poly_trim(rem)
+    return rem
+
+
+def _poly_exact_div(poly_a, poly_b):
+    """
+    divides integer polynomials, assuming poly_b divides poly_a and is primitive (so the quotient is integer).
+    """
+    rem = list(poly_a)
+    quotient = [0] * (len(poly_a) - len(poly_b) + 1)
+    for shift in reversed(range(len(quotient))):
+        factor = rem[shift + len(poly_b) - 1] // poly_b[-1]
+        quotient[shift] = factor
+        for i, c in enumerate(poly_b):
+            rem[shift + i] -= factor * c
+    return quotient
+
+
+def poly_gcd(poly_a, poly_b):
+    """
+    greatest common divisor of integer polynomials (primitive, with a positive leading coefficient).
+    Uses the euclidean algorithm with pseudo remainders.
+    :param poly_a: non zero polynomial coefficients, where poly_a[0] is the free coefficient.
+    :param poly_b: non zero polynomial coefficients, where poly_b[0] is the free coefficient.
+    :return: gcd coefficients, where gcd[0] is the free coefficient.
+    """
+    poly_a, poly_b = _poly_primitive(poly_a), _poly_primitive(poly_b)
+    if len(poly_a) < len(poly_b):
+        poly_a, poly_b = poly_b, poly_a
+    while poly_b:
+        rem = _poly_pseudo_rem(poly_a, poly_b)
+        poly_a, poly_b = poly_b, (_poly_primitive(rem) if rem else rem)
+    return poly_a
+
+
+def canonical_rational(numerator, denominator):
+    """
+    Canonical form of the rational function |P(x)/Q(x)|, so that equal functions get equal forms.
+    Common polynomial factors and common content are removed, and both leading coefficients are made positive.
+    :param numerator: P coefficients, where numerator[0] is the free coefficient.
+    :param denominator: Q coefficients, where denominator[0] is the free coefficient.
+    :return: tuple of (numerator, denominator) coefficients tuples, or None if the function is a constant (P ∝ Q)
+             or degenerated.
+    """
+    numerator, denominator = _poly_trim(numerator), _poly_trim(denominator)
+    if not numerator or not denominator:
+        return None
+    divisor = poly_gcd(numerator, denominator)
+    if len(divisor) > 1:
+        numerator = _poly_exact_div(numerator, divisor)
+        denominator = _poly_exact_div(denominator, divisor)
+    if len(numerator) == 1 and len(denominator) == 1:
+        return None
+    content = gcd(reduce(gcd, numerator), reduce(gcd, denominator))
+    numer_sign = 1 if numerator[-1] > 0 else -1
+    denom_sign = 1 if denominator[-1] > 0 else -1
+    return tuple(numer_sign * c // content for c in numerator), tuple(denom_sign * c // content for c in denominator)
+
+
+def smallest_period(word):
+    """
+    length of the shortest period that word is a repetition of (uses the KMP failure function).
+    :param word: sequence.
+    :return: p such that word == word[:p] * (len(word) // p)
+    """
+    failure = [0] * len(word)
+    k = 0
+    for i in range(1, len(word)):
+        while k > 0 and word[i] != word[k]:
+            k = failure[k - 1]
+        if word[i] == word[k]:
+            k += 1
+        failure[i] = k
+    period = len(word) - failure[-1]
+    return period if len(word) % period == 0 else len(word)
+
+
+def lyndon_words(max_len, alphabet=(-1, 1)):
+    """
+    Generates all Lyndon words (aperiodic necklace representatives) of length up to max_len, in lexicographic order.
+    Uses Duval's algorithm, so only the current word is kept in memory.
+    :param max_len: maximal length of the words.
+    :param alphabet: sorted alphabet.
+    """
+    word = [0]
+    while word:
+        yield [alphabet[c] for c in word]
+        m = len(word)
+        while len(word) < max_len:
+            word.append(word[len(word) - m])
+        while word and word[-1] == len(alphabet) - 1:
+            word.pop()
+        if word:
+            word[-1] += 1
+
+
+def sign_periods(min_len, max_len, rotations_equivalent=False):
+    """
+    Generates the sign periods of the search, ordered by length.
+    A period that repeats a shorter one represents the same sign sequence, so every sequence is generated once: as
+    the shortest repetition of its primitive period with a length in range. No set of seen periods is kept.
+    :param min_len: shortest period length.
+    :param max_len: longest period length.
+    :param rotations_equivalent: generate a single rotation of each period (the Lyndon word). A rotated period gives
+                                 a tail of the same sign sequence, so its continued fractions are Mobius transforms of
+                                 the original's. This is only valid when the LHS enumeration is closed under those
+                                 transforms, hence it is off by default. Shrinks the domain by about the period length.
+    """
+    def is_shortest_repetition(period_len, cyc_len):
+        return -(-min_len // period_len) * period_len == cyc_len
+
+    for cyc_len in range(min_len, max_len + 1):
+        if rotations_equivalent:
+            for word in lyndon_words(cyc_len):
+                if cyc_len % len(word) == 0 and is_shortest_repetition(len(word), cyc_len):
+                    yield word * (cyc_len // len(word))
+        else:
+            for word in itertools.product([-1, 1], repeat=cyc_len):
+                if is_shortest_repetition(smallest_period(word), cyc_len):
+                    yield list(word)
+
+
 class SignedRcfEnumeration(object):
 
     def __init__(self, sym_constant, cycle_len_range, depth=100, coefficients_limit=None, poly_deg=None, min_deg=None,
-                 prime=199, custom_enum=None, do_print=True):
+                 prime=199, custom_enum=None, do_print=True, workers=1, value_cache=None, numeric_build=False,
+                 rotations_equivalent=False):
         """
         Initialize search engine.
         Basically, this is a 3 step procedure:
@@ -75,7 +239,12 @@ class SignedRcfEnumeration(object):
         :param min_deg: Used to exclude lower degree numerator and denominator polynomials in rational LHS from search.
         :param prime: Prime number in use by Massey algorithm.
         :param custom_enum: A ready-made enumeration that only requires substituting a variable 'x' with the constant.
+                            Either a list of sympy expressions, or a CompactLHS (see lhs_compact.py).
         :param do_print: Print outputs (Used as False primarily for unit tests).
+        :param workers: Number of worker processes for the search. The LHS enumeration is sharded between them.
+        :param value_cache: LHSValueCache holding numeric values of LHS expressions. A new one is used by default.
+        :param numeric_build: Dedup the rational LHS enumeration numerically instead of using sympy.simplify.
+        :param rotations_equivalent: Search a single rotation of each sign period (see sign_periods).
         """
         self.enum_dps = 500
         self.verify_dps = 1000
@@ -86,10 +255,7 @@ class SignedRcfEnumeration(object):
         self.poly_deg = poly_deg
         self.min_deg = min_deg
         self.const_sym = sym_constant
-        try:
-            self.const_val = lambdify((), sym_constant, modules="mpmath")
-        except AttributeError:
-            self.const_val = self.const_sym.mpf_val
+        self.const_val = self.__create_const_generator()
 
         self.depth = depth
         self.beauty_standard = self.depth//4
@@ -97,20 +263,46 @@ class SignedRcfEnumeration(object):
         'beauty standard' is a Threshold for the length of a sequence LFSR (Berlekamp–Massey output). Only extracted 
         sequences with shorter LFSR will be considered as a possible valuable result.
         """
-        self.verify_depth = 1000
+        self.verify_depth = 8000  # maximal depth, results are verified with as many terms as needed for 100 digits.
+        self.verify_guard_digits = 10
         self.prime = prime
         self.custom_enum = custom_enum
         self.do_print = do_print
+        self.workers = workers
+        self.value_cache = None
+        self._attach_value_cache(LHSValueCache() if value_cache is None else value_cache)
+        self.numeric_build = numeric_build
+        self.rotations_equivalent = rotations_equivalent
+
+    def _attach_value_cache(self, value_cache):
+        value_cache.const_gen = self.const_val
+        self.value_cache = value_cache
+
+    def __create_const_generator(self):
+        return create_mpf_const_generator([self.const_sym])[0]
+
+    def __getstate__(self):
+        """
+        Used when sending the search engine to worker processes.
+        lambdified functions can't be pickled, and the LHS enumeration and its values are sent separately (sharded).
+        """
+        state = self.__dict__.copy()
+        state['const_val'] = None
+        state['custom_enum'] = None
+        state['value_cache'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.const_val = self.__create_const_generator()
 
     def create_sign_seq_enumeration(self):
         """
         Creates a list of all possible sign sequences.
-        Uses either a pre defined dictionary or a function to skip redundancies.
+        A sign period that is a repetition of a shorter period within the searched range is skipped, since it
+        represents the same sequence (see sign_periods).
         """
-        sign_seqs = []
-        for cyc_len in range(self.min_cycle_len, self.max_cycle_len+1):
-            sign_seqs = sign_seqs + list(itertools.product([-1, 1], repeat=cyc_len))
-        return sign_seqs
+        return list(sign_periods(self.min_cycle_len, self.max_cycle_len, self.rotations_equivalent))
 
     def create_rational_symbol(self, numerator, denominator):
         """
@@ -129,28 +321,93 @@ class SignedRcfEnumeration(object):
             denom_sym += denominator[i]*(self.const_sym**i)
         return numer_sym/denom_sym
 
+    def __create_coefficients_variations(self):
+        coeffs = [i for i in range(-self.coeff_lim, self.coeff_lim+1)]
+        if self.min_deg is not None:
+            numerators = [list(numer) for numer in list(itertools.product(coeffs, repeat=self.poly_deg + 1))
+                          if len(numer) >= self.min_deg+1]
+            denominators = [list(denom) for denom in list(itertools.product(coeffs, repeat=self.poly_deg + 1))
+                            if len(denom) >= self.min_deg+1]
+        else:
+            numerators = [list(numer) for numer in list(itertools.product(coeffs, repeat=self.poly_deg+1))]
+            denominators = [list(denom) for denom in list(itertools.product(coeffs, repeat=self.poly_deg+1))]
+        return itertools.product(numerators, denominators)
+
+    def create_rational_variations_coeffs(self):
+        """
+        Creates a list of all possible rational functions for the LHS, as canonical coefficients (see
+        canonical_rational), without using sympy.
+        Functions equal as rational functions are removed by their canonical form. If the LHS is not generic (a
+        constant was given instead of a symbol) functions that coincide numerically on the constant are removed as
+        well, keyed by their high precision value. In that case the numerator's sign is flipped if needed, so that the
+        function is positive on the constant.
+        :return: list of (numerator, denominator) coefficients tuples, where numerator[0] is the free coefficient.
+        """
+        if self.do_print:
+            print("Starting numeric enumeration over LHS")
+            print("Number of variations before dedup is: {}".format(
+                (2*self.coeff_lim + 1) ** (2*(self.poly_deg + 1))))
+        start = time()
+        numeric_keys = not isinstance(self.const_sym, sympy.Symbol)
+        if numeric_keys:
+            # algebraic constants might turn a rational function into a rational number
+            check_rational = self.const_sym.is_algebraic is not False
+            with mpmath.workdps(self.enum_dps):
+                const_val = mpmath.mpf(self.const_val())
+            with mpmath.workdps(60):
+                powers = [+const_val ** i for i in range(self.poly_deg + 1)]
+        forms = set()
+        values = set()
+        variations = []
+        for numer, denom in self.__create_coefficients_variations():
+            form = canonical_rational(numer, denom)
+            if form is None or form in forms:
+                continue
+            forms.add(form)
+            if numeric_keys:
+                with mpmath.workdps(60):
+                    numer_val = mpmath.fsum(c * p for c, p in zip(form[0], powers))
+                    denom_val = mpmath.fsum(c * p for c, p in zip(form[1], powers))
+                    if numer_val == 0 or denom_val == 0:
+                        continue
+                    value = numer_val / denom_val
+                    if value < 0:
+                        value = -value
+                        form = (tuple(-c for c in form[0]), form[1])
+                    if check_rational and mpmath.pslq([value, 1], maxcoeff=10**6, maxsteps=1000) is not None:
+                        continue
+                    key = mpmath.nstr(value, 40)
+                if key in values:
+                    continue
+                values.add(key)
+            variations.append(form)
+        if self.do_print:
+            print("Finished numeric enumeration. {} variations left. Took {} seconds".format(
+                len(variations), round(time() - start, 2)))
+        return variations
+
     def create_rational_variations_enum(self):
         """
         Creates a list of all possible rational expressions for the LHS.
         Expressions saved as sympy-simplified, positive expressions to reduce redundancy.
         Additional checks are performed to exclude degenerated cases.
+        If numeric_build was requested, the dedup is done by create_rational_variations_coeffs and sympy is only used
+        to create the surviving expressions.
         """
+        if self.numeric_build:
+            variations = self.create_rational_variations_coeffs()
+            if not isinstance(self.const_sym, sympy.Symbol):  # variations are already positive on the constant
+                return set(self.create_rational_symbol(numer, denom) for numer, denom in variations)
+            # evaluating abs of a generic expression is slow, it is evaluated when the constant is substituted.
+            return set(sympy.Abs(self.create_rational_symbol(numer, denom), evaluate=False)
+                       for numer, denom in variations)
         if self.do_print:
             print("Starting enumeration over LHS")
         unsimplified = (2*self.coeff_lim + 1) ** (2*(self.poly_deg + 1))
         if self.do_print:
             print("Number of variations before simplification is: {}".format(unsimplified))
         start = time()
-        coeffs = [i for i in range(-self.coeff_lim, self.coeff_lim+1)]
-        if self.min_deg is not None:
-            numerators = [list(numer) for numer in list(itertools.product(coeffs, repeat=self.poly_deg + 1))
-                          if len(numer) >= self.min_deg+1]
-            denominators = [list(denom) for denom in list(itertools.product(coeffs, repeat=self.poly_deg + 1))
-                            if len(denom) >= self.min_deg+1]
-        else:
-            numerators = [list(numer) for numer in list(itertools.product(coeffs, repeat=self.poly_deg+1))]
-            denominators = [list(denom) for denom in list(itertools.product(coeffs, repeat=self.poly_deg+1))]
-        variations = itertools.product(numerators, denominators)
+        variations = self.__create_coefficients_variations()
         expressions = set()
         cnt = 0
         mytimer= time()
@@ -172,76 +429,170 @@ class SignedRcfEnumeration(object):
             ("Finished enumerations. Took {}  seconds".format(round(time()-start, 2)))
         return expressions
 
-    def find_signed_rcf_conj(self):
+    def create_lhs_enumeration(self):
         """
-        Builds the final domain.
-        Iterates throgh the domain:
-        extraction->massey->check->save.
-        Additional checks are performed to exclude degenerated cases.
-        If a generic enumeration is given will use it instead of enumerating.
+        Builds the LHS enumeration to search. If a generic enumeration is given will use it instead of enumerating.
+        Sets are sorted, so an LHS has the same index in every search with the same parameters (required for resuming
+        a search, see search_log.py).
+        :return: list of LHS symbolic expressions, or a CompactLHS.
         """
-        inter_results = []
-        redundant_cycles = set()
-        # Enumerate:
         if self.custom_enum is None:
             lhs = self.create_rational_variations_enum()
+        elif isinstance(self.custom_enum, CompactLHS):
+            return self.custom_enum  # streamed from disk. sympy expressions are created only for hits
         else:
             if self.do_print:
                 print("Substituting " + str(self.const_sym) + ' into generic LHS:')
             strt = time()
-            lhs = [var.subs({sympy.symbols('x'): self.const_sym}) for var in self.custom_enum]
+            lhs = self.custom_enum
+            if isinstance(lhs, (set, frozenset)):
+                lhs = sorted(lhs, key=sympy.default_sort_key)
+            lhs = [var.subs({sympy.symbols('x'): self.const_sym}) for var in lhs]
             if self.do_print:
                 print("Took {} sec".format(time() - strt))
-        sign_seqs = []
-        for cyc_len in range(self.min_cycle_len, self.max_cycle_len + 1):
-            sign_seqs = sign_seqs + list(itertools.product([-1, 1], repeat=cyc_len))
+        if isinstance(lhs, (set, frozenset)):
+            lhs = sorted(lhs, key=sympy.default_sort_key)
+        return list(lhs)
+
+    def iter_signed_rcf_conj(self, lhs=None, done_lhs=frozenset(), done_pairs=frozenset()):
+        """
+        Builds the final domain.
+        Iterates throgh the domain:
+        extraction->massey->check->save.
+        Additional checks are performed to exclude degenerated cases.
+        Intermediate results are yielded as soon as all sign periods of an LHS were searched.
+        If more than one worker was requested, the LHS enumeration is split into contiguous shards that are searched
+        in a process pool. Shards are yielded in order, so results are identical to a serial search.
+        :param lhs: (opt) LHS enumeration, as created by create_lhs_enumeration.
+        :param done_lhs: (opt) indices of LHS to skip.
+        :param done_pairs: (opt) (LHS index, sign period) pairs to skip.
+        :return: generator of (LHS index, intermediate results of the LHS).
+        """
+        if lhs is None:
+            lhs = self.create_lhs_enumeration()
+        sign_seqs = self.create_sign_seq_enumeration()
         domain_size = len(lhs) * len(sign_seqs)
         if self.do_print:
             print("De-Facto Domain Size is: {}\n Starting preliminary search...".format(domain_size))
-        checkpoint = max(domain_size // 20, 5)
+        if self.workers <= 1:
+            yield from self._search_lhs_shard(lhs, sign_seqs, domain_size, 0, done_lhs, done_pairs)
+            return
+
+        # Use more shards than workers to balance the load between them
+        n_shards = min(self.workers * 4, max(len(lhs), 1))
+        shard_size = -(-len(lhs) // n_shards)
+        shard_args = []
+        for first in range(0, len(lhs), shard_size):
+            shard = lhs[first:first + shard_size]
+            shard_done = set(i for i in done_lhs if first <= i < first + shard_size)
+            if len(shard_done) == len(shard):
+                continue
+            shard_args.append((self, shard, sign_seqs, self.value_cache.subset(shard), first, shard_done, done_pairs))
+        n_results = 0
+        start = time()
+        with multiprocessing.Pool(self.workers) as pool:
+            for i, (shard_results, shard_cache) in enumerate(pool.imap(_search_shard_worker, shard_args)):
+                self.value_cache.merge(shard_cache)
+                n_results += sum(len(results) for _, results in shard_results)
+                if self.do_print:
+                    print("\n{} out of {} shards searched.".format(i + 1, len(shard_args)))
+                    print("{} possible results found".format(n_results))
+                    print("{} minutes passed.\n".format(round((time() - start) / 60, 2)))
+                yield from shard_results
+
+    def find_signed_rcf_conj(self):
+        """
+        Searches the whole domain (see iter_signed_rcf_conj).
+        :return: intermediate results of the form [lhs, sign_period, a_initialization, a_LFSR].
+        """
+        inter_results = []
+        for _, results in self.iter_signed_rcf_conj():
+            inter_results += results
+        return inter_results
+
+    def _search_lhs_shard(self, lhs, sign_seqs, domain_size=None, first_index=0, done_lhs=frozenset(),
+                          done_pairs=frozenset()):
+        """
+        Searches a part of the LHS enumeration against all sign periods.
+        :param lhs: list of LHS symbolic expressions.
+        :param sign_seqs: non redundant sign periods (see create_sign_seq_enumeration).
+        :param domain_size: if given, prints progress relative to it.
+        :param first_index: index of the first LHS of the shard in the whole enumeration.
+        :param done_lhs: indices of LHS to skip.
+        :param done_pairs: (LHS index, sign period) pairs to skip.
+        :return: generator of (LHS index, intermediate results of the form [lhs, sign_period, a_initialization, a_LFSR]).
+        """
+        n_results = 0
+        do_print = self.do_print and domain_size is not None
+        checkpoint = max(domain_size // 20, 5) if do_print else 0
         count = 0
         start = time()
-        # Iterate
-        bad_variation = []
-        for instance in itertools.product(lhs, sign_seqs):
-            count += 1
-            var, sign_period = instance[0], list(instance[1])
-            if var == bad_variation:
-                continue
-            bad_variation = []
-            if ''.join([str(c) for c in sign_period]) in redundant_cycles:
+        for index, var in enumerate(lhs, first_index):
+            if index in done_lhs:
+                count += len(sign_seqs)
                 continue
-            # if this cycle was not redundant it renders some future cycles redundant:
-            for i in range(2, (self.max_cycle_len // len(sign_period)) + 1):
-                redun = sign_period * i
-                redundant_cycles.add(''.join([str(c) for c in redun]))
-            var_gen = lambdify((), var, modules="mpmath")
-            seq_len = len(sign_period)
-            if (count % checkpoint == 0) and (self.do_print):
-                print("\n{}% of domain searched.".format(round(100 * count / domain_size, 2)))
-                print("{} possible results found".format(len(inter_results)))
-                print("{} minutes passed.\n".format(round((time() - start) / 60, 2)))
-            b_ = (sign_period * ((self.depth // seq_len) + 1))  # Concatenate periods to form sequence.
-            b_ = b_[:self.depth]  # Cut to proper size.
-            with mpmath.workdps(self.enum_dps):
-                try:
-                    signed_rcf = GeneralizedContinuedFraction.from_irrational_constant(const_gen=var_gen, b_=b_)
-                except ZeroDivisionError:
-                    if self.do_print:
-                        print('lhs:')
-                    sympy.pprint(var)
-                    bad_variation = var
+            inter_results = []
+            for sign_period in sign_seqs:
+                count += 1
+                seq_len = len(sign_period)
+                if do_print and (count % checkpoint == 0):
+                    print("\n{}% of domain searched.".format(round(100 * count / domain_size, 2)))
+                    print("{} possible results found".format(n_results + len(inter_results)))
+                    print("{} minutes passed.\n".format(round((time() - start) / 60, 2)))
+                if (index, tuple(sign_period)) in done_pairs:
                     continue
-            a_ = signed_rcf.a_
-            if 0 in a_:
-                continue
-            if len(a_) < self.depth:
-                continue
-            a_lfsr = list(slow_massey(a_, self.prime))
-            clear_end_zeros(a_lfsr)
-            if len(a_lfsr) < self.beauty_standard:
-                inter_results.append([var, sign_period, a_[:(len(a_lfsr)-1)], a_lfsr])
-        return inter_results
+                b_ = (sign_period * ((self.depth // seq_len) + 1))  # Concatenate periods to form sequence.
+                b_ = b_[:self.depth]  # Cut to proper size.
+                with mpmath.workdps(self.enum_dps):
+                    try:
+                        # the value is computed once and cached, a zero denominator raises here
+                        var_gen = self.value_cache.generator(var, self.enum_dps)
+                        signed_rcf = GeneralizedContinuedFraction.from_irrational_constant(const_gen=var_gen, b_=b_)
+                    except ZeroDivisionError:
+                        if self.do_print:
+                            print('lhs:')
+                            sympy.pprint(var)
+                        break  # skip the rest of the sign periods for this variation
+                a_ = signed_rcf.a_
+                if 0 in a_:
+                    continue
+                if len(a_) < self.depth:
+                    continue
+                a_lfsr = list(slow_massey(a_, self.prime))
+                clear_end_zeros(a_lfsr)
+                if len(a_lfsr) < self.beauty_standard:
+                    var_sym = var.sym_expression(self.const_sym) if isinstance(var, RationalLHS) else var
+                    inter_results.append([var_sym, sign_period, a_[:(len(a_lfsr)-1)], a_lfsr])
+            n_results += len(inter_results)
+            yield index, inter_results
+
+    def verify_result(self, res):
+        """
+        Validate an intermediate result to 100 digit precision, using as many terms as needed (up to verify_depth).
+        :param res: intermediate result of the form [lhs, sign_period, a_initialization, a_LFSR].
+        :return: string of the numeric value if the result holds, None otherwise.
+        """
+        def create_series(n_terms):
+            a_ = create_series_from_shift_reg(res[3], res[2], n_terms)
+            b_ = (res[1] * ((n_terms // len(res[1])) + 1))
+            return a_, [0] + b_[:n_terms - 1]  # ESMA's b0 is b1 in MITM (see EfficientGCF.py)
+        with mpmath.workdps(self.verify_dps):
+            lhs_val = self.value_cache.get(res[0], self.verify_dps)
+            rhs_val = evaluate_gcf_to_precision(create_series, 100 + self.verify_guard_digits, self.verify_depth).value
+            if not values_agree(lhs_val, rhs_val, 100):
+                return None
+            return mpmath.nstr(lhs_val, 100)
+
+    @staticmethod
+    def _collect_verified(res, key, verified_results, recurring_value_results):
+        """
+        If a numeric value appears multiple times, the first is kept as valid. The rest saved as recurring for later.
+        """
+        if key not in recurring_value_results:
+            verified_results.append(res)
+            recurring_value_results[key] = []
+        else:
+            recurring_value_results[key].append(res)
 
     def verify_results(self, results):
         """
@@ -250,29 +601,33 @@ class SignedRcfEnumeration(object):
         """
         verified_results = []
         recurring_value_results = {}
-        res_set = set()
         for res in results:
-            var_gen = lambdify((), res[0], modules="mpmath")
-            a_ = create_series_from_shift_reg(res[3], res[2], self.verify_depth)
-            b_ = (res[1] * ((self.verify_depth // len(res[1])) + 1))
-            b_ = b_[:self.verify_depth]
-            gcf = EfficientGCF(a_, b_)
-            with mpmath.workdps(self.verify_dps):
-                lhs_str = mpmath.nstr(var_gen(), 100)
-                rhs_val = gcf.evaluate()
-                rhs_str = mpmath.nstr(rhs_val, 100)
-                if rhs_str != lhs_str:
-                    continue
-                key = lhs_str
-            if key not in res_set:
-                res_set.add(key)
-                verified_results.append(res)
-                recurring_value_results[key] = []
-            else:
-                recurring_value_results[key].append(res)
-                continue
+            key = self.verify_result(res)
+            if key is not None:
+                self._collect_verified(res, key, verified_results, recurring_value_results)
         return verified_results, recurring_value_results
 
+    def group_equivalent_results(self, results, recurring_value_results, limit=None):
+        """
+        Keep a single result out of results whose values are mobius transforms of each other (see
+        ramanujan/utils/equivalence.py). The rest are saved as recurring results of the kept one.
+        :param results: verified results.
+        :param recurring_value_results: dictionary of recurring results, as returned by verify_results.
+        :param limit: (opt) only group results related by a transform with coefficients up to limit.
+        :return: List of representative results, and the dictionary of recurring results.
+        """
+        with mpmath.workdps(self.verify_dps):
+            values = [self.value_cache.get(res[0], self.verify_dps) for res in results]
+            classes = group_by_equivalence(list(range(len(results))), values, 100, limit=limit)
+            representatives = []
+            for equivalent in classes:
+                representatives.append(results[equivalent[0]])
+                key = mpmath.nstr(values[equivalent[0]], 100)
+                for i in equivalent[1:]:
+                    recurring_value_results[key] += [results[i]] + recurring_value_results.pop(
+                        mpmath.nstr(values[i], 100), [])
+        return representatives, recurring_value_results
+
     def print_results(self, results, latex=True):
         """
         Print results in either unicode or LaTex.
@@ -284,18 +639,18 @@ class SignedRcfEnumeration(object):
             lfsr = res[3]
             cycle = res[1]
             initials = res[2]
-            var_gen = lambdify((), var_sym, modules="mpmath")
+            lhs_val = self.value_cache.get(var_sym, mpmath.mp.dps)
             a_ = create_series_from_shift_reg(lfsr, initials, self.depth)
             b_ = (cycle * (self.depth // len(cycle)))[:self.depth]
             gcf = GeneralizedContinuedFraction(a_, b_)
-            rate = calculate_convergence(gcf, lambdify((), var_sym, 'mpmath')())
+            rate = estimate_convergence(gcf)
             if not latex:
                 print(str(res_num))
                 print('lhs: ')
                 sympy.pprint(var_sym)
                 print('rhs :')
                 gcf.print(8)
-                print('lhs value: ' + mpmath.nstr(var_gen(), 50))
+                print('lhs value: ' + mpmath.nstr(lhs_val, 50))
                 print('rhs value: ' + mpmath.nstr(gcf.evaluate(), 50))
                 print('a_n LFSR: {},\n With initialization: {}'.format(lfsr, initials))
                 print('b_n period: ' + str(cycle))
@@ -308,39 +663,91 @@ class SignedRcfEnumeration(object):
                 print('\n$\\{b_n\\}$ Sequence period: \\! ' + str(cycle))
                 print('\nConvergence rate: ${}$ digits per term\n\n'.format(mpmath.nstr(rate, 5)))
 
-    def find_hits(self):
+    def search_log_header(self, lhs):
+        """
+        :param lhs: the LHS enumeration searched.
+        :return: parameters that identify a search (see search_log.py).
+        """
+        return {'constant': str(self.const_sym), 'lhs_size': len(lhs), 'cycle_range': [self.min_cycle_len, self.max_cycle_len],
+                'rotations_equivalent': self.rotations_equivalent, 'depth': self.depth,
+                'poly_deg': self.poly_deg, 'coeff_lim': self.coeff_lim, 'min_deg': self.min_deg}
+
+    def find_hits(self, search_log=None, results_store=None):
         """
         Use search engine to find results.
+        Intermediate results are verified as soon as they are found. If a SearchLog is given, verified results are
+        appended to it immediately, and LHS that were already searched by the logged search are skipped.
+        :param search_log: (opt) SearchLog to persist results in and resume from.
+        :param results_store: (opt) ResultsStore. Results that were verified by previous runs are taken from it without
+                              verifying them again, and the new results are added to it.
         :return: List of verified results, alongside a dictionary of similar results (of same numeric value).
         (The duplicates might prove useful later if we can find different sign series leading to different a series for
         same variation.)
         """
+        verified_results = []
+        recurring_value_results = {}
+        known_values = {}
+        new_results = []
+        start = time()
         with mpmath.workdps(self.enum_dps):
-            start = time()
-            # Search
-            results = self.find_signed_rcf_conj()
-            end = time()
-            if self.do_print:
-                print('That took {}s'.format(end - start))
-        with mpmath.workdps(self.verify_dps):
-            if self.do_print:
-                print('Starting to verify results...')
-            start = time()
-            # Validate
-            verified_results, recurring_value_results = self.verify_results(results)
-            end = time()
-            if self.do_print:
-                print('{} results were verified.\nThat took {}'.format(len(verified_results), end - start))
+            lhs = self.create_lhs_enumeration()
+            if results_store is not None:
+                results_store.start_run('esma', self.const_sym, self.search_log_header(lhs))
+                known_values = results_store.known_esma_values(self.const_sym)
+            if search_log is None:
+                stream = self.iter_signed_rcf_conj(lhs)
+            else:
+                search_log.start(self.search_log_header(lhs))
+                if search_log.done and self.do_print:
+                    print('Resuming a search. {} LHS were already searched'.format(len(search_log.done)))
+                for _, res, key in search_log.results:
+                    self._collect_verified(res, key, verified_results, recurring_value_results)
+                stream = self.iter_signed_rcf_conj(lhs, search_log.done, search_log.done_pairs())
+            # Search and validate
+            for index, results in stream:
+                for res in results:
+                    key = known_values.get(ResultsStore.esma_result_key(res)) if known_values else None
+                    if key is None:
+                        key = self.verify_result(res)
+                        if key is None:
+                            continue
+                        new_results.append((res, key))
+                    self._collect_verified(res, key, verified_results, recurring_value_results)
+                    if search_log is not None:
+                        search_log.add_result(index, res, key)
+                if search_log is not None:
+                    search_log.mark_done(index)
+        if results_store is not None:
+            results_store.add_esma_results(self.const_sym, [res for res, _ in new_results],
+                                           [key for _, key in new_results])
+        end = time()
+        if self.do_print:
+            print('{} results were verified.\nThat took {}s'.format(len(verified_results), end - start))
             # Print if requested:
-            if self.do_print:
+            with mpmath.workdps(self.verify_dps):
                 self.print_results(verified_results)
         return verified_results, recurring_value_results
 
 
+def _search_shard_worker(args):
+    """
+    Entry point of a worker process in a parallel search.
+    :param args: tuple of (SignedRcfEnumeration, LHS shard, sign periods, LHSValueCache of the shard,
+                 index of the shard's first LHS, LHS indices to skip, (LHS index, sign period) pairs to skip).
+    :return: list of (LHS index, intermediate results) of the shard, and the shard's values cache.
+    """
+    enum, lhs_shard, sign_seqs, value_cache, first_index, done_lhs, done_pairs = args
+    enum._attach_value_cache(value_cache)
+    with mpmath.workdps(enum.enum_dps):
+        results = list(enum._search_lhs_shard(lhs_shard, sign_seqs, None, first_index, done_lhs, done_pairs))
+    return results, enum.value_cache
+
+
 def esma_search_wrapper(constant, custom_enum, poly_deg, coeff_lim,
-                   cycle_range, min_deg, depth, out_dir=None, do_print=True):
+                   cycle_range, min_deg, depth, out_dir=None, do_print=True, workers=1, value_cache=None,
+                   numeric_build=False, rotations_equivalent=False, group_equivalent=False, results_db=None):
     """
-    A Wrapper for searching using ESMA (currently without multiprocessing).
+    A Wrapper for searching using ESMA.
     :param constant: sympy constant
     :param custom_enum: A ready-made enumeration that only requires substituting a variable 'x' with the constant. (opt)
     :param poly_deg: Maximum degree of numerator and denominator polynomials in the rational LHS.
@@ -349,22 +756,48 @@ def esma_search_wrapper(constant, custom_enum, poly_deg, coeff_lim,
     :param min_deg: Used to exclude lower degree numerator and denominator polynomials in rational LHS. (opt)
     :param depth: Number of elements of a series to extract. Relates to length of typical LFSRs  of the consant. (opt)
     :param out_dir: Path of director to save result binaries. (opt)
+                    Verified results are logged there while searching. If a search with the same parameters was killed,
+                    it is resumed from its log.
     :param do_print: Print outputs (Used as False primarily for unit tests). (opt)
+    :param workers: Number of worker processes to search with. (opt)
+    :param value_cache: LHSValueCache to use. If it was created with a path, it is saved there after the search. (opt)
+    :param numeric_build: Dedup the LHS enumeration numerically instead of using sympy.simplify. (opt)
+    :param rotations_equivalent: Search a single rotation of each sign period (see sign_periods). (opt)
+    :param group_equivalent: Return a single result out of results whose values are mobius transforms of each other.
+                             The rest are returned as its recurring results. (opt)
+    :param results_db: Path of a results database (see ramanujan/ResultsStore.py). Results are added to it, and results
+                       it already holds are not verified again. (opt)
     :return: A list of results of the form [lhs(sympy), sign_period, a_initialization, a_LFSR].
              Dictionary, maps strings of values to lists of recurring results sharing value. (result format as above).
     """
     if depth is not None:
         enum = SignedRcfEnumeration(sym_constant=constant, cycle_len_range=cycle_range, depth=depth,
                                     coefficients_limit=coeff_lim, poly_deg=poly_deg, min_deg=min_deg,
-                                    custom_enum=custom_enum, do_print=do_print)
+                                    custom_enum=custom_enum, do_print=do_print, workers=workers,
+                                    value_cache=value_cache, numeric_build=numeric_build,
+                                    rotations_equivalent=rotations_equivalent)
     else:
         enum = SignedRcfEnumeration(sym_constant=constant, cycle_len_range=cycle_range, coefficients_limit=coeff_lim,
-                                    poly_deg=poly_deg, min_deg=min_deg, custom_enum=custom_enum, do_print=do_print)
-    result_list, recurring_results_dict = enum.find_hits()
+                                    poly_deg=poly_deg, min_deg=min_deg, custom_enum=custom_enum, do_print=do_print,
+                                    workers=workers, value_cache=value_cache, numeric_build=numeric_build,
+                                    rotations_equivalent=rotations_equivalent)
+    search_log = None
+    if out_dir:
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        search_log = SearchLog('/'.join([out_dir, 'search_log']))
+    results_store = ResultsStore(results_db) if results_db else None
+    result_list, recurring_results_dict = enum.find_hits(search_log, results_store)
+    if results_store is not None:
+        results_store.close()
+    if group_equivalent:
+        result_list, recurring_results_dict = enum.group_equivalent_results(result_list, recurring_results_dict)
+        if do_print:
+            print('{} classes of results that are not mobius transforms of each other'.format(len(result_list)))
+    if value_cache is not None and value_cache.path is not None:
+        value_cache.save()
     if out_dir:
         path = out_dir
-        if not os.path.isdir(path):
-            os.makedirs(path)
         dup = '/'.join([path, 'recurring_by_value_0'])
         res = '/'.join([path, 'res_list_0'])
         i = 1
@@ -376,6 +809,7 @@ def esma_search_wrapper(constant, custom_enum, poly_deg, coeff_lim,
             pickle.dump(result_list, f)
         with open(dup, 'wb') as f:
             pickle.dump(recurring_results_dict, f)
+        search_log.remove()  # results are saved, nothing to resume
     return result_list, recurring_results_dict
 
 
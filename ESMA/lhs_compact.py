@@ -0,0 +1,182 @@
+import os
+import pickle
+import mpmath
+import numpy as np
+import sympy
+from collections import namedtuple
+
+"""
+A compact format for generic LHS enumerations.
+Pickled sets of sympy expressions are slow to load and to substitute into, and take a lot of memory. Since every LHS
+generator creates rational functions of 'x', an enumeration can be stored as an int64 array (saved as .npy) where
+each row holds:
+    [numerator coefficients (width) | denominator coefficients (width) | tag]
+coefficients are ordered from the free coefficient upwards, and padded with zeros up to the width.
+The tag holds flags (e.g. whether the absolute value should be taken) in its low byte, and the structure of the
+generator that created the row in the rest (used only for printing).
+The array is memory mapped, so a search can stream it without creating any sympy object.
+"""
+
+TAG_ABS = 1  # the LHS is |P(x)/Q(x)|
+STRUCTURE_RATIONAL = 0  # P(x)/Q(x), see lhs_generators.create_standard_lhs
+STRUCTURE_BIASED_MONOM = 1  # a*x**k + b, see lhs_generators.create_biased_monoms
+STRUCTURE_SHIFT = 8
+
+
+class RationalLHS(namedtuple('RationalLHS', 'numerator denominator tag')):
+    """
+    A single LHS of a compact enumeration. Hashable, so it can be used as a key of LHSValueCache.
+    """
+    __slots__ = ()
+
+    def evaluate(self, const):
+        """
+        :param const: mpf value of the constant.
+        :return: value of the LHS in the working precision.
+        """
+        numerator = mpmath.mpf(0)
+        for c in reversed(self.numerator):
+            numerator = numerator * const + c
+        denominator = mpmath.mpf(0)
+        for c in reversed(self.denominator):
+            denominator = denominator * const + c
+        value = numerator / denominator
+        return abs(value) if self.tag & TAG_ABS else value
+
+    def sym_expression(self, const_sym):
+        """
+        :param const_sym: sympy constant (or symbol) to substitute for 'x'.
+        :return: sympy expression of the LHS.
+        """
+        numerator = sum(c * const_sym ** i for i, c in enumerate(self.numerator))
+        denominator = sum(c * const_sym ** i for i, c in enumerate(self.denominator))
+        expression = numerator / denominator
+        if self.tag >> STRUCTURE_SHIFT != STRUCTURE_RATIONAL:
+            expression = sympy.expand(expression)
+        return abs(expression) if self.tag & TAG_ABS else expression
+
+
+class CompactLHS(object):
+    """
+    A read only, memory mapped view over a compact LHS enumeration.
+    Behaves like a sequence of RationalLHS objects. Slices are views as well.
+    """
+
+    def __init__(self, path, start=0, stop=None):
+        self.path = path
+        self.start = start
+        self.stop = stop
+        self.__open()
+
+    def __open(self):
+        rows = np.load(self.path, mmap_mode='r')
+        self.width = (rows.shape[1] - 1) // 2
+        self.rows = rows[self.start:self.stop]
+
+    def __getstate__(self):
+        # sent to worker processes by path, so the enumeration is not copied.
+        return {'path': self.path, 'start': self.start, 'stop': self.stop}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__open()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError('CompactLHS only supports contiguous slices')
+            return CompactLHS(self.path, self.start + start, self.start + stop)
+        return self.__row_to_lhs(self.rows[item])
+
+    def __iter__(self):
+        for row in self.rows:
+            yield self.__row_to_lhs(row)
+
+    def __row_to_lhs(self, row):
+        row = row.tolist()
+        return RationalLHS(tuple(row[:self.width]), tuple(row[self.width:2 * self.width]), row[-1])
+
+
+def save_compact_lhs(path, variations, tags=0):
+    """
+    Save rational functions as a compact LHS enumeration.
+    :param path: file to save to.
+    :param variations: list of (numerator, denominator) coefficients, where numerator[0] is the free coefficient.
+    :param tags: tag for all rows, or a list of tags (one per variation).
+    :return: CompactLHS of the saved file.
+    """
+    if isinstance(tags, int):
+        tags = [tags] * len(variations)
+    width = max([max(len(numer), len(denom)) for numer, denom in variations], default=1)
+    rows = np.zeros((len(variations), 2 * width + 1), dtype=np.int64)
+    for i, ((numer, denom), tag) in enumerate(zip(variations, tags)):
+        rows[i, :len(numer)] = numer
+        rows[i, width:width + len(denom)] = denom
+        rows[i, -1] = tag
+    with open(path, 'wb') as f:  # np.save adds a .npy suffix when given a path
+        np.save(f, rows)
+    return CompactLHS(path)
+
+
+def expression_to_rational(expression, structure=STRUCTURE_RATIONAL):
+    """
+    Convert a generic LHS expression (of 'x') to the compact representation.
+    :param expression: sympy expression, must be a rational function of 'x' (optionally under Abs).
+    :param structure: structure tag of the generator that created the expression.
+    :return: (numerator, denominator, tag)
+    """
+    x = sympy.symbols('x')
+    tag = structure << STRUCTURE_SHIFT
+    if expression.has(sympy.Abs):
+        # e.g. 2*Abs(x/(x - 1)) or 1/Abs(x + 2) as created by sympy.simplify. Only products of positive numbers and
+        # absolute values can be written as the absolute value of a single rational function.
+        for factor in sympy.Mul.make_args(expression):
+            if factor.is_Pow:
+                factor = factor.base
+            if not (isinstance(factor, sympy.Abs) or (factor.is_number and factor.is_positive)):
+                raise ValueError('{} is not an absolute value of a rational function of x'.format(expression))
+        tag |= TAG_ABS
+        expression = expression.replace(sympy.Abs, lambda arg: arg)
+    numerator, denominator = sympy.fraction(sympy.together(expression))
+    try:
+        numerator = sympy.Poly(numerator, x).all_coeffs()[::-1]
+        denominator = sympy.Poly(denominator, x).all_coeffs()[::-1]
+    except sympy.PolynomialError:
+        raise ValueError('{} is not a rational function of x'.format(expression))
+    if not all(c.is_integer for c in numerator + denominator):
+        raise ValueError('{} has non integer coefficients'.format(expression))
+    return [int(c) for c in numerator], [int(c) for c in denominator], tag
+
+
+def save_compact_lhs_from_expressions(path, expressions, structure=STRUCTURE_RATIONAL):
+    """
+    Save generic LHS expressions (as created by lhs_generators.py) in the compact format.
+    Sets are sorted, so the order of the enumeration is reproducible.
+    :param path: file to save to.
+    :param expressions: iterable of sympy expressions of 'x'.
+    :param structure: structure tag of the generator that created the expressions.
+    :return: CompactLHS of the saved file.
+    """
+    if isinstance(expressions, (set, frozenset)):
+        expressions = sorted(expressions, key=sympy.default_sort_key)
+    converted = [expression_to_rational(expression, structure) for expression in expressions]
+    return save_compact_lhs(path, [(numer, denom) for numer, denom, _ in converted], [tag for _, _, tag in converted])
+
+
+def convert_pickled_lhs(pickle_path, out_path, structure=STRUCTURE_RATIONAL):
+    """
+    Convert an existing pickled LHS enumeration to the compact format.
+    :param pickle_path: path of the pickled enumeration.
+    :param out_path: path of the compact enumeration to create.
+    :param structure: structure tag of the generator that created the enumeration.
+    :return: CompactLHS of the saved file.
+    """
+    if os.path.exists(out_path):
+        raise FileExistsError(out_path)
+    with open(pickle_path, 'rb') as f:
+        expressions = pickle.load(f)
+    return save_compact_lhs_from_expressions(out_path, expressions, structure)
@@ -3,6 +3,7 @@ import pickle
 import itertools
 from sympy import Abs, symbols
 from enumerate_over_signed_rcf import SignedRcfEnumeration
+from lhs_compact import save_compact_lhs, save_compact_lhs_from_expressions, TAG_ABS
 
 """
 The purpose of this file is to allow for the construction enumerations following a specific pattern. 
@@ -10,13 +11,15 @@ Similar to the series generators of the MITM flavor. Here we chose patterns for
 The enumeration of the LHS is a substantial part of the search. 
 """
 
-def create_standard_lhs(poly_deg, coefficients_limit, out_path=None, do_print=True):
+def create_standard_lhs(poly_deg, coefficients_limit, out_path=None, do_print=True, numeric=False, compact=False):
     """
     Prepares generic LHS enumerations (variable 'x'). When used later in searching conjectures- 'x' will be substituted
     to any constant.
     :param poly_deg: Degree of polynomials in rational function.
     :param coefficients_limit: Limit for coefficients (symmetrical).
     :param out_dir: Directory for saving the binary LHS enumeration.
+    :param numeric: Dedup by canonical polynomial forms instead of sympy.simplify (much faster).
+    :param compact: Save the enumeration in the compact format (see lhs_compact.py) instead of pickling it.
     :return: List of standard generic LHS enumerations that can later be used for enumerating over any constant.
     """
     if do_print:
@@ -24,16 +27,31 @@ def create_standard_lhs(poly_deg, coefficients_limit, out_path=None, do_print=Tr
     strt = time()
     x = symbols('x')
     enum = SignedRcfEnumeration(sym_constant=x, cycle_len_range=None, coefficients_limit=coefficients_limit,
-                                poly_deg=poly_deg, do_print=do_print)
-    generic_variations = enum.create_rational_variations_enum()
-    if out_path is not None:
-        with open(out_path, 'wb') as file:
-            pickle.dump(generic_variations, file)
+                                poly_deg=poly_deg, do_print=do_print, numeric_build=numeric)
+    if compact and numeric:  # no need for sympy at all
+        generic_variations = save_compact_lhs(out_path, enum.create_rational_variations_coeffs(), TAG_ABS)
+    elif compact:
+        generic_variations = save_compact_lhs_from_expressions(out_path, enum.create_rational_variations_enum())
+    else:
+        generic_variations = enum.create_rational_variations_enum()
+        if out_path is not None:
+            with open(out_path, 'wb') as file:
+                pickle.dump(generic_variations, file)
     if do_print:
         print("Finished. Took {} sec".format(time() - strt))
     return generic_variations
 
 
+def lhs_value_cache_path(lhs_path, constant_name):
+    """
+    Values of a generic LHS enumeration depend on the constant substituted, so each constant has its own cache file.
+    :param lhs_path: Path of the pickled LHS enumeration.
+    :param constant_name: Name of the constant (as in g_const_dict).
+    :return: Path of the values cache (see lhs_value_cache.py) next to the LHS enumeration.
+    """
+    return '{}.{}.values'.format(lhs_path, constant_name)
+
+
 def create_biased_monoms(max_deg, const_coeff_lim, bias_lim):  # monom = x**d.
     """
     Prepares a generic LHS enumeration of the form: ax**k+b. Where a,b,k  are integers, and x is the variable.
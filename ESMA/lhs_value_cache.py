@@ -0,0 +1,92 @@
+import os
+import pickle
+import mpmath
+from sympy import lambdify
+from lhs_compact import RationalLHS
+
+"""
+Numeric values of LHS expressions are needed for every sign period searched, and again in the verification and
+printing stages. This file holds a cache that evaluates each expression once per precision, and can be saved next to
+a pickled generic LHS enumeration (see lhs_generators.py) for later searches of the same constant.
+"""
+
+
+class LHSValueCache(object):
+
+    def __init__(self, path=None, values=None, const_gen=None):
+        """
+        Values are stored at the highest precision computed so far. Lower precisions are served by rounding.
+        :param path: (opt) file to load the cache from and save it to.
+        :param values: (opt) dictionary of pre computed values of the form {expression: (dps, value)}.
+        :param const_gen: (opt) generator function of the constant, required for evaluating compact LHS entries
+                          (see lhs_compact.py).
+        """
+        self.path = path
+        self.const_gen = const_gen
+        self.values = {} if values is None else values
+        if path is not None and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                self.values.update(pickle.load(f))
+
+    def __getstate__(self):
+        # lambdified functions can't be pickled. the constant is attached again by the search engine.
+        state = self.__dict__.copy()
+        state['const_gen'] = None
+        return state
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, var):
+        return var in self.values
+
+    def get(self, var, dps):
+        """
+        Get the numeric value of an expression.
+        :param var: sympy expression, or a RationalLHS.
+        :param dps: required decimal precision.
+        :return: mpf with a precision of dps.
+        """
+        cached = self.values.get(var)
+        with mpmath.workdps(dps):
+            if cached is not None and cached[0] >= dps:
+                return +cached[1]  # unary plus rounds to the working precision
+            if isinstance(var, RationalLHS):
+                value = var.evaluate(mpmath.mpf(self.const_gen()))
+            else:
+                value = mpmath.mpf(lambdify((), var, modules="mpmath")())
+        self.values[var] = (dps, value)
+        return value
+
+    def generator(self, var, dps):
+        """
+        :return: a generator function of the value (the form expected by GeneralizedContinuedFraction).
+        """
+        value = self.get(var, dps)
+        return lambda: value
+
+    def subset(self, variables):
+        """
+        :param variables: iterable of expressions.
+        :return: a new cache holding only the values of the given expressions (used for sharding a search).
+        """
+        return LHSValueCache(values={var: self.values[var] for var in variables if var in self.values},
+                             const_gen=self.const_gen)
+
+    def merge(self, other):
+        """
+        Adds values computed by another cache, keeping the more precise one.
+        :param other: LHSValueCache.
+        """
+        for var, (dps, value) in other.values.items():
+            if var not in self.values or self.values[var][0] < dps:
+                self.values[var] = (dps, value)
+
+    def save(self, path=None):
+        """
+        Save the cache to disk.
+        :param path: (opt) path to save to. defaults to the path the cache was created with.
+        """
+        path = self.path if path is None else path
+        with open(path, 'wb') as f:
+            pickle.dump(self.values, f)
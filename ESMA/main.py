@@ -7,6 +7,8 @@ import ramanujan.constants  # declares constants as sympy Singeltons, "not" used
 
 from time import time
 from enumerate_over_signed_rcf import esma_search_wrapper
+from lhs_value_cache import LHSValueCache
+from lhs_compact import CompactLHS, convert_pickled_lhs, save_compact_lhs_from_expressions, STRUCTURE_BIASED_MONOM
 from ramanujan.constants import g_const_dict
 
 
@@ -22,12 +24,16 @@ def get_lhs_generator(generator_name, args):
         if args.poly_deg <= 0 or len(args.coeff_lim) != 2 or args.coeff_lim[0] <= 0 or args.coeff_lim[1] <= 0:
             print("Degree and limits must be positive. Expecting two coefficient limits.")
             raise AttributeError
-        return lhs_generators.create_biased_monoms(args.poly_deg, args.coeff_lim[0], args.coeff_lim[1])
+        lhs = lhs_generators.create_biased_monoms(args.poly_deg, args.coeff_lim[0], args.coeff_lim[1])
+        if args.compact and args.out_dir is not None:
+            return save_compact_lhs_from_expressions(args.out_dir, lhs, STRUCTURE_BIASED_MONOM)
+        return lhs
     if generator_name == 'standard':
         if args.poly_deg <= 0 or not isinstance(args.coeff_lim, int) or args.coeff_lim <= 0:
             print("Degree and limits must be positive. Expecting a single coefficient limit.")
             raise AttributeError
-        return lhs_generators.create_standard_lhs(args.poly_deg, args.coeff_lim, args.out_dir, do_print=(not args.no_print))
+        return lhs_generators.create_standard_lhs(args.poly_deg, args.coeff_lim, args.out_dir, do_print=(not args.no_print),
+                                                  numeric=args.numeric_build, compact=args.compact)
 
 
 # Initialize the argument parser that accepts inputs from the end user
@@ -48,9 +54,11 @@ Currently the you can use only this enumerator:
 
     srcf_parser.set_defaults(which='ESMA')
     srcf_parser.add_argument('-out_dir', type=str,
-                             help='Directory to output binary results or file path for existing generic enumeration')
-    srcf_parser.add_argument('-mode', choices=['build', 'search'],
-                             help='Build LHS enumerations or find conjectures')
+                             help='Directory to output binary results (a killed search is resumed from it), or file path ' +
+                                  'for existing generic enumeration')
+    srcf_parser.add_argument('-mode', choices=['build', 'search', 'convert'],
+                             help='Build LHS enumerations, find conjectures, or convert a pickled LHS enumeration ' +
+                                  'to the compact format')
     # Search-only arguments:
     srcf_parser.add_argument('-constant', choices=g_const_dict.keys(), nargs='?', default=None, const=None,
                              help='constant to search for')
@@ -58,6 +66,16 @@ Currently the you can use only this enumerator:
                              help='Shortest and longest period-length for the signed sequences to search')
     srcf_parser.add_argument('-depth', type=int, nargs='?', default=None, const=None,
                              help='In case depth needs to be changed (if insufficient precision error repeats)')
+    srcf_parser.add_argument('-rotations_equivalent', action='store_true',
+                             help='Search a single rotation of each sign period')
+    srcf_parser.add_argument('-group_equivalent', action='store_true',
+                             help='Keep a single result out of results that are mobius transforms of each other')
+    srcf_parser.add_argument('-workers', type=int, nargs='?', default=1, const=1,
+                             help='Number of worker processes to search with')
+    srcf_parser.add_argument('-cache_values', action='store_true',
+                             help='Keep numeric LHS values next to the given LHS enumeration for later searches')
+    srcf_parser.add_argument('-results_db', type=str, nargs='?', default=None, const=None,
+                             help='SQLite database to add results to. Results it already holds are not verified again')
     srcf_parser.add_argument('-no_print', action='store_true')
 
     # Dual-purpose arguments:
@@ -69,6 +87,10 @@ Currently the you can use only this enumerator:
                              help='Minimum degree from which to search. Useful for breaking up searches.')
     srcf_parser.add_argument('-coeff_lim', type=int, nargs='?', default=None, const=None,
                              help='Maximum absolute value for the coefficients of the LHS function')
+    srcf_parser.add_argument('-compact', action='store_true',
+                             help='Save the built LHS enumeration in the compact (.npy) format')
+    srcf_parser.add_argument('-numeric_build', action='store_true',
+                             help='Dedup the rational LHS numerically instead of using sympy.simplify (much faster)')
     return parser
 
 def enumerate_over_signed_rcf_main(args):
@@ -83,18 +105,37 @@ def enumerate_over_signed_rcf_main(args):
                 return
             else:
                 print('Saving the pickled enumeration to ' + str(args.out_dir))
+        if args.compact and args.out_dir is None:
+            print("A compact enumeration must be saved to a file (use -out_dir)")
+            raise ValueError
         lhs = get_lhs_generator(args.lhs, args)
         return lhs
+    if args.mode == 'convert':
+        if args.lhs is None or args.out_dir is None:
+            print("Converting requires a pickled LHS enumeration (-lhs) and an output file (-out_dir)")
+            raise ValueError
+        lhs = convert_pickled_lhs(args.lhs, args.out_dir)
+        print('Converted {} LHS variations to {}'.format(len(lhs), args.out_dir))
+        return lhs
     if args.mode == 'search':
         print('Running a search for conjectures using ESMA algorithm:')
         if args.lhs is not None:
-            with open(args.lhs, 'rb') as f:
-                print("Starting to load existing LHS enumeration:")
-                strt = time()
-                custom_lhs = pickle.load(f)
-                print("Loaded {} LHS variations. Took {} sec".format(len(custom_lhs), time() - strt))
+            print("Starting to load existing LHS enumeration:")
+            strt = time()
+            if args.lhs.endswith('.npy'):
+                custom_lhs = CompactLHS(args.lhs)
+            else:
+                with open(args.lhs, 'rb') as f:
+                    custom_lhs = pickle.load(f)
+            print("Loaded {} LHS variations. Took {} sec".format(len(custom_lhs), time() - strt))
+            if args.cache_values:
+                value_cache = LHSValueCache(lhs_generators.lhs_value_cache_path(args.lhs, args.constant))
+                print("Loaded {} cached LHS values".format(len(value_cache)))
+            else:
+                value_cache = None
         else:
             custom_lhs = None
+            value_cache = None
             if min(args.poly_deg, args.coeff_lim) <= 0:
                 print("poly_deg and coeff_lim must be positive integers.")
                 raise ValueError
@@ -109,7 +150,13 @@ def enumerate_over_signed_rcf_main(args):
                                          min_deg=args.min_deg,
                                          depth=args.depth,
                                          out_dir=args.out_dir,
-                                         do_print=(not args.no_print))
+                                         do_print=(not args.no_print),
+                                         workers=args.workers,
+                                         value_cache=value_cache,
+                                         numeric_build=args.numeric_build,
+                                         rotations_equivalent=args.rotations_equivalent,
+                                         group_equivalent=args.group_equivalent,
+                                         results_db=args.results_db)
         return results
 
 
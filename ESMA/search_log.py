@@ -0,0 +1,86 @@
+import os
+import pickle
+
+"""
+Verified results of a search are appended to a log as soon as they are found, so a killed search keeps its results and
+can be resumed later from where it stopped. The log is a sequence of pickled records:
+    ('header', parameters)              - parameters of the search. A resumed search must have the same parameters.
+    ('result', lhs_index, result, key)  - a verified result, key is the string of its numeric value.
+    ('done', lhs_index)                 - all sign periods of the LHS were searched and their results logged.
+"""
+
+
+class SearchLog(object):
+
+    def __init__(self, path):
+        """
+        Opens a log, loading the records of a previous (killed) search if there are any.
+        :param path: file of the log.
+        """
+        self.path = path
+        self.header = None
+        self.results = []  # (lhs_index, result, key) in the order they were verified
+        self.done = set()
+        valid_size = 0
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                while True:
+                    try:
+                        record = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError, ValueError):  # a kill might leave a partial record
+                        break
+                    valid_size = f.tell()
+                    self.__apply(record)
+        self.file = open(path, 'ab')
+        self.file.truncate(valid_size)
+
+    def __apply(self, record):
+        if record[0] == 'header':
+            self.header = record[1]
+        elif record[0] == 'result':
+            self.results.append(record[1:])
+        elif record[0] == 'done':
+            self.done.add(record[1])
+
+    def __write(self, record):
+        pickle.dump(record, self.file)
+        self.file.flush()
+
+    def is_resumed(self):
+        return self.header is not None
+
+    def done_pairs(self):
+        """
+        :return: set of (lhs_index, sign_period) pairs that have a logged result.
+        """
+        return set((lhs_index, tuple(res[1])) for lhs_index, res, _ in self.results)
+
+    def start(self, header):
+        """
+        Writes the parameters of a new search, or checks them against the parameters of the logged search.
+        :param header: dictionary of search parameters.
+        """
+        if self.header is None:
+            self.header = header
+            self.__write(('header', header))
+        elif self.header != header:
+            print("Search log {} was created by a search with different parameters:\n{}".format(self.path, self.header))
+            raise ValueError
+
+    def add_result(self, lhs_index, res, key):
+        self.results.append((lhs_index, res, key))
+        self.__write(('result', lhs_index, res, key))
+
+    def mark_done(self, lhs_index):
+        self.done.add(lhs_index)
+        self.__write(('done', lhs_index))
+
+    def close(self):
+        self.file.close()
+
+    def remove(self):
+        """
+        Deletes the log once the results of the search were saved.
+        """
+        self.close()
+        os.remove(self.path)
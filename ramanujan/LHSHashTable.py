@@ -1,19 +1,44 @@
 import os
+import mmap
+import zlib
 import struct
 import pickle
 import mpmath
 import itertools
+import contextlib
+import numpy as np
 from time import time
+from bitarray import bitarray
+from collections import namedtuple
+from multiprocessing import shared_memory
 from pybloom_live import BloomFilter
 from functools import reduce
 from math import gcd
 from ramanujan.utils.utils import create_mpf_const_generator
 
-from ramanujan.constants import g_N_initial_search_dps
+from ramanujan.constants import g_N_initial_search_dps, g_N_fingerprint_digits
 
 # precision required from table
 DEFAULT_THRESHOLD = 10**-10
 
+# header of bloom filter files: magic, error rate, number of slices, bits per slice, capacity, count, size of the bits
+# in bytes, size and modification time (ns) of the .db file the filter was built from, crc32 of the bits, flags of the
+# table (BLOOM_FLAG_*), and a crc32 of the preceding header fields.
+BLOOM_FILE_MAGIC = b'LHSBLOOM'
+BLOOM_HEADER_FORMAT = '<8sdQQQQQQqII'
+BLOOM_HEADER_SIZE = 88  # the header and the crc32 are padded, so the bits are aligned to 8 bytes
+BLOOM_FLAG_CANONICAL = 1  # the table is keyed by fractional parts (see LHSHashTable.canonical_key)
+
+# header of fingerprint files: magic, size and modification time (ns) of the .db file, and number of entries. the header
+# is followed by the sorted keys of the entries, and the fingerprint of each entry (int64 arrays).
+FINGERPRINT_FILE_MAGIC = b'LHSFPRNT'
+FINGERPRINT_HEADER_FORMAT = '<8sQqQ'
+FINGERPRINT_HEADER_SIZE = 32
+
+# everything a worker process needs to attach to a table shared by LHSHashTable.share
+SharedLHSHandle = namedtuple('SharedLHSHandle', 'memory_name name threshold canonical sym_constants bloom_params '
+                                                'bloom_size n_keys n_records')
+
 
 class LHSHashTable(object):
     """
@@ -22,8 +47,12 @@ class LHSHashTable(object):
     opened when needed, to reduce memory consumptions.
     The bloom filter is always loaded and used to determine if a LHS value is in the database
     all LHS possibilities within computed domain
+    The next g_N_fingerprint_digits digits of each entry (its fingerprint, see fingerprint) are stored in a third file,
+    that is mapped when needed, so hits can be compared with them without opening self.s_name.
     """
-    def __init__(self, name, search_range, const_vals, threshold=DEFAULT_THRESHOLD) -> None:
+    canonical = False  # tables pickled by older versions don't have it
+
+    def __init__(self, name, search_range, const_vals, threshold=DEFAULT_THRESHOLD, canonical=False) -> None:
         """
         hash table for LHS. storing values in the form of (a + b*x_1 + c*x_2 + ...)/(d + e*x_1 + f*x_2 + ...)
         :param search_range: range for value coefficient values
@@ -31,11 +60,22 @@ class LHSHashTable(object):
         :param threshold: decimal threshold for comparison. in fact, the keys for hashing will be the first
                             -log_{10}(threshold) digits of the value. for example, if threshold is 1e-10 - then the
                             first 10 digits will be used as the hash key.
+        :param canonical: if True, values are keyed by their fractional part (see canonical_key), and values that differ
+                          by an integer are stored once, as the LHS of their fractional part. enumerators look up the
+                          fractional part of GCFs in such tables, and shift the matched LHS back.
+                          the mode is stored in the .bloom file of the table, and opening the table with the other
+                          mode raises ValueError.
         """
         
         self.name = name
         self.s_name = self.lhs_hash_name_to_shelve_name(name)
         self.threshold = threshold
+        self.canonical = canonical
+        self.sym_constants = const_vals
+        self.shared_memory = None
+        self.shared_index = None
+        self.shared_owner = False
+        self.fingerprint_index = None
         key_factor = 1 / threshold
         self.max_key_length = len(str(int(key_factor))) * 2
         self.constant_generator = create_mpf_const_generator(const_vals)
@@ -46,7 +86,7 @@ class LHSHashTable(object):
         self.max_capacity = (search_range * 2 + 1) ** (self.n_constants * 2)
         self.pack_format = 'll' * self.n_constants
         self.lhs_possibilities = {}
-        self.bloom = BloomFilter(capacity=self.max_capacity, error_rate=0.05)
+        self.lhs_fingerprints = []
         
         start_time = time()
 
@@ -55,14 +95,19 @@ class LHSHashTable(object):
             self._load_from_file(self.s_name)
         else:
             print('no existing db found, generating dict')
+            self.bloom = BloomFilter(capacity=self.max_capacity, error_rate=0.05)
             with mpmath.workdps(g_N_initial_search_dps):
+                # the digits after the keys are stored as well (see fingerprint), so the constants have to be precise
+                constants = [mpmath.mpf(1)] + [const() for const in self.constant_generator]
                 self._enumerate_lhs_domain(constants, search_range, key_factor)
-
-        with open(self.s_name, 'wb') as f:
-            pickle.dump(self.lhs_possibilities, f)
+            with open(self.s_name, 'wb') as f:
+                pickle.dump(self.lhs_possibilities, f)
+            self._save_bloom()
+            self._save_fingerprints(self.lhs_fingerprints)
 
         # after init, deleteing self.lhs_possibilities to free unused memory 
         self.lhs_possibilities = None
+        self.lhs_fingerprints = None
         print('initializing LHS dict: {}'.format(time() - start_time))
 
     @staticmethod
@@ -76,11 +121,178 @@ class LHSHashTable(object):
         # +-1 for numeric errors in keys.
         return set(rational_keys + [x + 1 for x in rational_keys] + [x - 1 for x in rational_keys])
 
+    @staticmethod
+    def canonical_key(value, key_factor):
+        """
+        key of a value in canonical tables. values that differ by an integer have the same key.
+        :param value: mpf value.
+        :param key_factor: 1 / threshold.
+        :return: key of the fractional part of value.
+        """
+        return int((value - mpmath.floor(value)) * key_factor)
+
+    @staticmethod
+    def fingerprint(value, key, key_factor):
+        """
+        the g_N_fingerprint_digits digits of a value after the digits of its key.
+        :param value: mpf value (the fractional part of the value in canonical tables).
+        :param key: key of the value.
+        :param key_factor: 1 / threshold.
+        :return: int. values that agree on the digits of the fingerprint have fingerprints that differ by at most 1.
+        """
+        digits_factor = 10 ** g_N_fingerprint_digits
+        return int(value * key_factor * digits_factor) - key * digits_factor
+
     def _load_from_file(self, db_path):
+        self.bloom = self._map_bloom()
+        if self.bloom is not None:
+            return
+        # no valid bloom filter file (e.g. a .db of an older version), rebuild it from the keys.
+        print(f'rebuilding bloom filter of {db_path}')
         with open(db_path, 'rb') as f:
             self.lhs_possibilities = pickle.load(f)
+        self.bloom = BloomFilter(capacity=max(self.max_capacity, len(self.lhs_possibilities)), error_rate=0.05)
         for key in self.lhs_possibilities.keys():
             self.bloom.add(key)
+        self._save_bloom()
+
+    @staticmethod
+    def lhs_hash_name_to_bloom_name(name):
+        return name.split('.')[0] + '.bloom'
+
+    def _save_bloom(self):
+        """
+        write the bits of the bloom filter to a raw file next to the .db file, so loading the table doesn't need to
+        iterate over its keys.
+        """
+        bloom = self.bloom
+        bits = bloom.bitarray.tobytes()
+        db_stat = os.stat(self.s_name)
+        header = struct.pack(BLOOM_HEADER_FORMAT, BLOOM_FILE_MAGIC, bloom.error_rate, bloom.num_slices,
+                             bloom.bits_per_slice, bloom.capacity, bloom.count, len(bits), db_stat.st_size,
+                             db_stat.st_mtime_ns, zlib.crc32(bits), BLOOM_FLAG_CANONICAL if self.canonical else 0)
+        header += struct.pack('<I', zlib.crc32(header))
+        with open(self.lhs_hash_name_to_bloom_name(self.s_name), 'wb') as f:
+            f.write(header.ljust(BLOOM_HEADER_SIZE, b'\0'))
+            f.write(bits)
+
+    def _map_bloom(self):
+        """
+        map the bloom filter file of the table to memory (read only).
+        :return: BloomFilter, or None if the file doesn't exist, is damaged or doesn't match the .db file (its size or
+            modification time changed).
+        :raise ValueError: if the table was created with the other canonical mode.
+        """
+        bloom_name = self.lhs_hash_name_to_bloom_name(self.s_name)
+        if not os.path.isfile(bloom_name):
+            return None
+        with open(bloom_name, 'rb') as f:
+            header = f.read(BLOOM_HEADER_SIZE)
+            header_length = struct.calcsize(BLOOM_HEADER_FORMAT)
+            if len(header) < BLOOM_HEADER_SIZE:
+                return None
+            if struct.unpack('<I', header[header_length: header_length + 4])[0] != zlib.crc32(header[:header_length]):
+                return None
+            magic, *params, n_bytes, db_size, db_mtime, bits_crc, flags = struct.unpack(BLOOM_HEADER_FORMAT,
+                                                                                          header[:header_length])
+            db_stat = os.stat(self.s_name)
+            if magic != BLOOM_FILE_MAGIC or db_size != db_stat.st_size or db_mtime != db_stat.st_mtime_ns or \
+                    os.path.getsize(bloom_name) != BLOOM_HEADER_SIZE + n_bytes:
+                return None
+            if bool(flags & BLOOM_FLAG_CANONICAL) != self.canonical:
+                raise ValueError(f'{self.s_name} was created with canonical={not self.canonical}, '
+                                 f'open it with the same mode')
+            bits = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with memoryview(bits) as view:
+            valid = zlib.crc32(view[BLOOM_HEADER_SIZE:]) == bits_crc
+        if not valid:  # damaged bits
+            bits.close()
+            return None
+        bloom = BloomFilter.__new__(BloomFilter)
+        bloom._setup(*params)
+        bloom.bitarray = bitarray(buffer=memoryview(bits)[BLOOM_HEADER_SIZE:], endian='little')
+        return bloom
+
+    @staticmethod
+    def lhs_hash_name_to_fingerprints_name(name):
+        return name.split('.')[0] + '.fingerprints'
+
+    def _save_fingerprints(self, lhs_fingerprints):
+        """
+        write the fingerprints of the entries to a raw file next to the .db file, sorted by their keys.
+        :param lhs_fingerprints: list of (key, fingerprint) of every entry.
+        """
+        fingerprints = np.array(sorted(lhs_fingerprints), dtype=np.int64).reshape(-1, 2)
+        db_stat = os.stat(self.s_name)
+        header = struct.pack(FINGERPRINT_HEADER_FORMAT, FINGERPRINT_FILE_MAGIC, db_stat.st_size, db_stat.st_mtime_ns,
+                             len(fingerprints))
+        with open(self.lhs_hash_name_to_fingerprints_name(self.s_name), 'wb') as f:
+            f.write(header.ljust(FINGERPRINT_HEADER_SIZE, b'\0'))
+            f.write(np.ascontiguousarray(fingerprints[:, 0]).tobytes())
+            f.write(np.ascontiguousarray(fingerprints[:, 1]).tobytes())
+
+    def _map_fingerprints(self):
+        """
+        map the fingerprint file of the table to memory (read only).
+        :return: sorted keys and fingerprints of the entries (int64 arrays), or None if the file doesn't exist or
+            doesn't match the .db file (its size or modification time changed).
+        """
+        fingerprints_name = self.lhs_hash_name_to_fingerprints_name(self.s_name)
+        if not os.path.isfile(fingerprints_name):
+            return None
+        with open(fingerprints_name, 'rb') as f:
+            header = f.read(FINGERPRINT_HEADER_SIZE)
+            if len(header) < FINGERPRINT_HEADER_SIZE:
+                return None
+            magic, db_size, db_mtime, n_entries = struct.unpack(
+                FINGERPRINT_HEADER_FORMAT, header[:struct.calcsize(FINGERPRINT_HEADER_FORMAT)])
+            db_stat = os.stat(self.s_name)
+            if magic != FINGERPRINT_FILE_MAGIC or db_size != db_stat.st_size or db_mtime != db_stat.st_mtime_ns or \
+                    os.path.getsize(fingerprints_name) != FINGERPRINT_HEADER_SIZE + 16 * n_entries:
+                return None
+            if n_entries == 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        keys = np.frombuffer(data, dtype=np.int64, count=n_entries, offset=FINGERPRINT_HEADER_SIZE)
+        fingerprints = np.frombuffer(data, dtype=np.int64, count=n_entries,
+                                     offset=FINGERPRINT_HEADER_SIZE + 8 * n_entries)
+        return keys, fingerprints
+
+    def fingerprints(self, key):
+        """
+        :param key: key.
+        :return: int64 array of the fingerprints of the entries of key (see fingerprint), empty if it isn't in the
+            table. the fingerprint file is mapped on the first call. tables without one (e.g. of older versions)
+            create it from their entries first.
+        """
+        if getattr(self, 'fingerprint_index', None) is None:  # tables pickled by older versions don't have it
+            self.fingerprint_index = self._map_fingerprints()
+            if self.fingerprint_index is None:
+                print(f'creating fingerprints of {self.s_name}')
+                self._build_fingerprints()
+                self.fingerprint_index = self._map_fingerprints()
+        keys, fingerprints = self.fingerprint_index
+        key = int(key)
+        return fingerprints[np.searchsorted(keys, key, 'left'):np.searchsorted(keys, key, 'right')]
+
+    def _build_fingerprints(self):
+        """
+        evaluate all of the entries of the .db file, and save their fingerprints.
+        """
+        key_factor = 1 / self.threshold
+        with open(self.s_name, 'rb') as f:
+            lhs_possibilities = pickle.load(f)
+        lhs_fingerprints = []
+        with mpmath.workdps(g_N_initial_search_dps):
+            const_vals = [const() for const in self.constant_generator]
+            for str_key, entries in lhs_possibilities.items():
+                key = int(str_key)
+                for entry in entries:
+                    vals = struct.unpack(self.pack_format, entry)
+                    value = mpmath.mpf(self.prod(vals[:self.n_constants], const_vals)) / \
+                        mpmath.mpf(self.prod(vals[-self.n_constants:], const_vals))
+                    lhs_fingerprints.append((key, self.fingerprint(value, key, key_factor)))
+        self._save_fingerprints(lhs_fingerprints)
 
     def _enumerate_lhs_domain(self, constants, search_range, key_factor):
         rational_blacklist = LHSHashTable._create_rational_numbers_blacklist(search_range, key_factor)
@@ -92,6 +304,8 @@ class LHSHashTable(object):
         coef_bottom_list = list(itertools.product(*coefs_bottom))
         denominator_list = [sum(i * j for (i, j) in zip(c_bottom, constants)) for c_bottom in coef_bottom_list]
 
+        canonical_entries = set()
+
         # start enumerating
         for c_top in coef_top_list:
             numerator = sum(i * j for (i, j) in zip(c_top, constants))
@@ -110,9 +324,23 @@ class LHSHashTable(object):
                 if key in rational_blacklist:
                     # don't store values that are independent of the constant (e.g. rational numbers)
                     continue
+
+                entry = (c_top, c_bottom)
+                if self.canonical:
+                    # store (c_top - n*c_bottom) / c_bottom, the LHS of the fractional part of val, once.
+                    shift = int(mpmath.floor(val))
+                    sign = -1 if denominator < 0 else 1
+                    entry = (tuple(sign * (t - shift * b) for t, b in zip(c_top, c_bottom)),
+                             tuple(sign * b for b in c_bottom))
+                    if entry in canonical_entries:
+                        continue
+                    canonical_entries.add(entry)
+                    val -= shift
+                    key = int(val * key_factor)
                 
                 str_key = str(key)
-                self._add_to_lhs_possibilities(str_key, c_top, c_bottom)
+                self._add_to_lhs_possibilities(str_key, *entry)
+                self.lhs_fingerprints.append((key, self.fingerprint(val, key, key_factor)))
                 self.bloom.add(str_key)
     
     def __contains__(self, item):
@@ -163,6 +391,8 @@ class LHSHashTable(object):
         return ret
 
     def _get_by_key(self, key):
+        if getattr(self, 'shared_index', None) is not None:  # tables pickled by older versions don't have it
+            return self._get_by_shared_key(key)
         with open(self.s_name, 'rb') as f:
             if self.lhs_possibilities is None:
                 self.lhs_possibilities = pickle.load(f)
@@ -172,6 +402,135 @@ class LHSHashTable(object):
                 values.append([vals[:self.n_constants], vals[-self.n_constants:]])
             return values
 
+    def _get_by_shared_key(self, key):
+        keys, offsets, records = self.shared_index
+        key = int(key)
+        i = np.searchsorted(keys, key)
+        if i == len(keys) or keys[i] != key:
+            raise KeyError(str(key))
+        return [[tuple(int(c) for c in row[:self.n_constants]), tuple(int(c) for c in row[self.n_constants:])]
+                for row in records[offsets[i]:offsets[i + 1]]]
+
+    def sorted_keys(self):
+        """
+        :return: sorted int64 array of the keys of the table (see SortMergeGCFEnumerator).
+        """
+        if getattr(self, 'shared_index', None) is not None:
+            return self.shared_index[0].copy()  # a view would keep the shared memory block from being closed
+        with open(self.s_name, 'rb') as f:
+            lhs_possibilities = pickle.load(f)
+        return np.sort(np.fromiter((int(k) for k in lhs_possibilities), dtype=np.int64, count=len(lhs_possibilities)))
+
+    def share(self):
+        """
+        Copy the bloom filter and the LHS entries to a single shared memory block, so processes of a worker pool can use
+        this table without a copy of their own. The entries are stored as a sorted array of keys, with the coefficients
+        of each key's entries in a second array.
+        Call unshare when the workers are done, or use shared instead.
+        :return: SharedLHSHandle, to pass to LHSHashTable.attach in the workers.
+        """
+        with open(self.s_name, 'rb') as f:
+            lhs_possibilities = pickle.load(f)
+        str_keys = sorted(lhs_possibilities.keys(), key=int)
+        keys = np.array([int(k) for k in str_keys], dtype=np.int64)
+        offsets = np.cumsum([0] + [len(lhs_possibilities[k]) for k in str_keys], dtype=np.int64)
+        # entries were packed with pack_format, as native longs
+        records = np.frombuffer(b''.join(b''.join(lhs_possibilities[k]) for k in str_keys), dtype=np.dtype('l'))
+        records = records.astype(np.int64).reshape(-1, 2 * self.n_constants)
+        del lhs_possibilities
+
+        bloom_bytes = self.bloom.bitarray.tobytes()
+        bloom_size = -(-len(bloom_bytes) // 8) * 8  # align the arrays to 8 bytes
+        size = bloom_size + keys.nbytes + offsets.nbytes + records.nbytes
+        memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        memory.buf[:len(bloom_bytes)] = bloom_bytes
+        shared_arrays = self._shared_arrays(memory, bloom_size, len(keys), len(records), self.n_constants)
+        for shared_array, array in zip(shared_arrays, [keys, offsets, records]):
+            shared_array[:] = array
+        self.shared_memory = memory
+        self.shared_index = shared_arrays
+        self.shared_owner = True
+        bloom = self.bloom
+        bloom_params = (bloom.error_rate, bloom.num_slices, bloom.bits_per_slice, bloom.capacity, bloom.count)
+        return SharedLHSHandle(self.shared_memory.name, self.name, self.threshold, self.canonical, self.sym_constants,
+                               bloom_params, bloom_size, len(keys), len(records))
+
+    @contextlib.contextmanager
+    def shared(self):
+        """
+        share the table (see share) for the duration of a with block, and unshare it at its end.
+        :return: SharedLHSHandle, to pass to LHSHashTable.attach in the workers.
+        """
+        handle = self.share()
+        try:
+            yield handle
+        finally:
+            self.unshare()
+
+    def unshare(self):
+        """
+        Stop using the shared memory block. The process that shared the table also frees it, and keeps using its own
+        copy of the table. A table that was attached can't be used afterwards.
+        :raise BufferError: if arrays over the block are still used (the block is freed anyway).
+        """
+        memory = getattr(self, 'shared_memory', None)
+        if memory is None:
+            return
+        # arrays over the block have to be released before it is closed
+        self.shared_memory = None
+        self.shared_index = None
+        if not self.shared_owner:
+            self.bloom = None
+        if self.shared_owner:
+            memory.unlink()
+        memory.close()
+
+    def __del__(self):
+        try:
+            self.unshare()
+        except BufferError:  # the arrays that still use the block keep it mapped until they are freed
+            pass
+
+    @staticmethod
+    def _shared_arrays(memory, bloom_size, n_keys, n_records, n_constants):
+        """
+        :return: keys, offsets and records arrays over a shared memory block (see share).
+        """
+        keys = np.ndarray((n_keys,), dtype=np.int64, buffer=memory.buf, offset=bloom_size)
+        offsets = np.ndarray((n_keys + 1,), dtype=np.int64, buffer=memory.buf, offset=bloom_size + keys.nbytes)
+        records = np.ndarray((n_records, 2 * n_constants), dtype=np.int64, buffer=memory.buf,
+                             offset=bloom_size + keys.nbytes + offsets.nbytes)
+        return keys, offsets, records
+
+    @classmethod
+    def attach(cls, handle):
+        """
+        Use a table shared by another process (see share). Nothing is copied, and the table must not be changed.
+        :param handle: SharedLHSHandle returned by share.
+        :return: LHSHashTable over the shared memory block.
+        """
+        ret = cls.__new__(cls)
+        ret.name = handle.name
+        ret.s_name = cls.lhs_hash_name_to_shelve_name(handle.name)
+        ret.threshold = handle.threshold
+        ret.canonical = handle.canonical
+        ret.sym_constants = handle.sym_constants
+        ret.constant_generator = create_mpf_const_generator(handle.sym_constants)
+        ret.n_constants = len(handle.sym_constants) + 1
+        ret.max_key_length = len(str(int(1 / handle.threshold))) * 2
+        ret.pack_format = 'll' * ret.n_constants
+        ret.lhs_possibilities = None
+        ret.fingerprint_index = None
+        ret.shared_memory = shared_memory.SharedMemory(name=handle.memory_name)
+        ret.shared_owner = False  # the process that shared the table frees the memory block
+        ret.bloom = BloomFilter.__new__(BloomFilter)
+        ret.bloom._setup(*handle.bloom_params)
+        ret.bloom.bitarray = bitarray(buffer=ret.shared_memory.buf[:handle.bloom_size], endian='little')
+        ret.max_capacity = ret.bloom.capacity
+        ret.shared_index = cls._shared_arrays(ret.shared_memory, handle.bloom_size, handle.n_keys, handle.n_records,
+                                              ret.n_constants)
+        return ret
+
     @classmethod
     def load_from(cls, name):
         """
@@ -182,6 +541,9 @@ class LHSHashTable(object):
         with open(name, 'rb') as f:
             ret = pickle.load(f)
         ret.s_name = ret.lhs_hash_name_to_shelve_name(name)
+        if ret.bloom is None:  # not pickled, see __getstate__
+            ret._load_from_file(ret.s_name)
+            ret.lhs_possibilities = None
         return ret
 
     def _add_to_lhs_possibilities(self, str_key, c_top, c_bottom):
@@ -214,9 +576,21 @@ class LHSHashTable(object):
             evaluated_values.append(numerator / denominator)
         return evaluated_values
 
+    def __getstate__(self):
+        # the bloom filter is kept in its own file (see _save_bloom), and shared memory can't be pickled.
+        state = self.__dict__.copy()
+        state.update(bloom=None, shared_memory=None, shared_index=None, shared_owner=False, fingerprint_index=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.bloom is None and os.path.isfile(self.s_name):
+            self._load_from_file(self.s_name)
+            self.lhs_possibilities = None
+
     def save(self):
         """
-        save the hash table as file
+        save the hash table as file. the bloom filter and the LHS entries are saved in their own files.
         """
         with open(self.name, 'wb') as f:
             pickle.dump(self, f)
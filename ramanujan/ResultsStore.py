@@ -0,0 +1,181 @@
+import json
+import sqlite3
+from time import time
+
+"""
+Results of MITM and ESMA runs are stored in a local SQLite database, so results of different runs can be queried and
+deduplicated. The tables are:
+    runs        - a run of an enumerator (kind is 'mitm' or 'esma'), with the searched constants and its parameters.
+    domains     - polynomial domains searched by MITM runs.
+    lhs         - LHS expressions, by constants and LHS key (the hash table key for MITM, the expression for ESMA).
+    conjectures - verified results. rhs_an and rhs_bn are the RHS polynomial coefficients for MITM, and the a_n
+                  initialization and LFSR, and the b_n sign period for ESMA. value is the string of the numeric value.
+Polynomials and coefficients are stored as json lists, so the same result is stored the same way in every run.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY, kind TEXT NOT NULL, constants TEXT NOT NULL, parameters TEXT, started REAL);
+CREATE TABLE IF NOT EXISTS domains (
+    id INTEGER PRIMARY KEY, run_id INTEGER REFERENCES runs(id), name TEXT, a_coef_range TEXT, b_coef_range TEXT);
+CREATE TABLE IF NOT EXISTS lhs (
+    id INTEGER PRIMARY KEY, constants TEXT NOT NULL, lhs_key TEXT NOT NULL, c_top TEXT, c_bot TEXT,
+    expression TEXT NOT NULL, UNIQUE (constants, lhs_key, expression));
+CREATE TABLE IF NOT EXISTS conjectures (
+    id INTEGER PRIMARY KEY, run_id INTEGER REFERENCES runs(id), domain_id INTEGER REFERENCES domains(id),
+    lhs_id INTEGER NOT NULL REFERENCES lhs(id), constants TEXT NOT NULL, rhs_an TEXT NOT NULL, rhs_bn TEXT NOT NULL,
+    value TEXT, UNIQUE (constants, lhs_id, rhs_an, rhs_bn));
+CREATE INDEX IF NOT EXISTS lhs_by_key ON lhs (constants, lhs_key);
+CREATE INDEX IF NOT EXISTS conjectures_by_rhs ON conjectures (constants, rhs_an, rhs_bn);
+CREATE INDEX IF NOT EXISTS conjectures_by_lhs ON conjectures (lhs_id);
+"""
+
+
+def constants_name(sym_constants):
+    """
+    :param sym_constants: sympy constant, or list of sympy constants.
+    :return: the string the constants are stored by.
+    """
+    if isinstance(sym_constants, (list, tuple)):
+        return ','.join(str(c) for c in sym_constants)
+    return str(sym_constants)
+
+
+def _to_json(item):
+    return json.dumps(item, default=int)  # default=int handles numpy integers
+
+
+class ResultsStore(object):
+
+    def __init__(self, path):
+        """
+        Opens (or creates) a results database.
+        :param path: file of the database. ':memory:' for a temporary database.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.run_id = None
+        self.domain_id = None
+
+    def start_run(self, kind, sym_constants, parameters=None):
+        """
+        Registers a run. Results added later are attributed to it.
+        :param kind: 'mitm' or 'esma'.
+        :param sym_constants: sympy constants searched.
+        :param parameters: (opt) dictionary of parameters of the run.
+        :return: id of the run.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (kind, constants, parameters, started) VALUES (?, ?, ?, ?)',
+                (kind, constants_name(sym_constants), _to_json(parameters), time()))
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def add_domain(self, poly_domain):
+        """
+        :param poly_domain: poly domain searched by the current run.
+        :return: id of the domain. results added later are attributed to it.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO domains (run_id, name, a_coef_range, b_coef_range) VALUES (?, ?, ?, ?)',
+                (self.run_id, type(poly_domain).__name__, _to_json(getattr(poly_domain, 'a_coef_range', None)),
+                 _to_json(getattr(poly_domain, 'b_coef_range', None))))
+        self.domain_id = cursor.lastrowid
+        return self.domain_id
+
+    def __insert(self, sym_constants, rows, domain_id=None):
+        """
+        :param rows: iterable of (lhs_key, c_top, c_bot, expression, rhs_an, rhs_bn, value), already in json/str form.
+        """
+        constants = constants_name(sym_constants)
+        rows = list(rows)
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO lhs (constants, lhs_key, c_top, c_bot, expression) VALUES (?, ?, ?, ?, ?)',
+                [(constants, *row[:4]) for row in rows])
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO conjectures (run_id, domain_id, lhs_id, constants, rhs_an, rhs_bn, value) '
+                'SELECT ?, ?, id, constants, ?, ?, ? FROM lhs WHERE constants = ? AND lhs_key = ? AND expression = ?',
+                [(self.run_id, domain_id, *row[4:], constants, row[0], row[3]) for row in rows])
+
+    def add_refined_matches(self, sym_constants, results):
+        """
+        Bulk insert of MITM results.
+        :param sym_constants: sympy constants of the LHS hash table.
+        :param results: list of RefinedMatch.
+        """
+        def sym_lhs(coefs):
+            return coefs[0] + sum(c * x for c, x in zip(coefs[1:], sym_constants))
+        self.__insert(sym_constants, ((str(r.lhs_key), _to_json(r.c_top), _to_json(r.c_bot),
+                                       str(sym_lhs(r.c_top) / sym_lhs(r.c_bot)), _to_json(r.rhs_an_poly),
+                                       _to_json(r.rhs_bn_poly), None) for r in results), self.domain_id)
+
+    def add_esma_results(self, sym_constant, results, values):
+        """
+        Bulk insert of ESMA results.
+        :param sym_constant: sympy constant.
+        :param results: list of results of the form [lhs(sympy), sign_period, a_initialization, a_LFSR].
+        :param values: string of the numeric value of each result.
+        """
+        self.__insert(sym_constant, ((str(res[0]), None, None, str(res[0]), _to_json([res[2], res[3]]),
+                                      _to_json(res[1]), value) for res, value in zip(results, values)))
+
+    def known_refined_matches(self, sym_constants):
+        """
+        :param sym_constants: sympy constants of the LHS hash table.
+        :return: dictionary {(rhs_an, rhs_bn): set of (c_top, c_bot)} of stored MITM results. the keys are in json form
+                 (see refined_match_key), and the coefficients are tuples.
+        """
+        known = {}
+        for rhs_an, rhs_bn, c_top, c_bot in self.connection.execute(
+                'SELECT rhs_an, rhs_bn, c_top, c_bot FROM conjectures JOIN lhs ON lhs.id = conjectures.lhs_id '
+                'WHERE conjectures.constants = ? AND c_top IS NOT NULL', (constants_name(sym_constants),)):
+            known.setdefault((rhs_an, rhs_bn), set()).add((tuple(json.loads(c_top)), tuple(json.loads(c_bot))))
+        return known
+
+    def known_esma_values(self, sym_constant):
+        """
+        :param sym_constant: sympy constant.
+        :return: dictionary {(lhs, rhs_an, rhs_bn): value} of stored ESMA results, in json/str form.
+        """
+        return {(expression, rhs_an, rhs_bn): value for expression, rhs_an, rhs_bn, value in self.connection.execute(
+            'SELECT expression, rhs_an, rhs_bn, value FROM conjectures JOIN lhs ON lhs.id = conjectures.lhs_id '
+            'WHERE conjectures.constants = ? AND value IS NOT NULL', (constants_name(sym_constant),))}
+
+    @staticmethod
+    def refined_match_key(result):
+        """
+        :return: key of a MITM hit in known_refined_matches.
+        """
+        return _to_json(result.rhs_an_poly), _to_json(result.rhs_bn_poly)
+
+    @staticmethod
+    def esma_result_key(res):
+        """
+        :return: key of an ESMA result in known_esma_values.
+        """
+        return str(res[0]), _to_json([res[2], res[3]]), _to_json(res[1])
+
+    def has_conjecture(self, sym_constants, rhs_an, rhs_bn):
+        """
+        :return: True if a result with this RHS was stored (by any run), False otherwise.
+        """
+        return self.connection.execute(
+            'SELECT 1 FROM conjectures WHERE constants = ? AND rhs_an = ? AND rhs_bn = ? LIMIT 1',
+            (constants_name(sym_constants), _to_json(rhs_an), _to_json(rhs_bn))).fetchone() is not None
+
+    def count_conjectures(self, sym_constants=None):
+        """
+        :param sym_constants: (opt) count only results of these constants.
+        :return: number of stored results.
+        """
+        if sym_constants is None:
+            return self.connection.execute('SELECT COUNT(*) FROM conjectures').fetchone()[0]
+        return self.connection.execute('SELECT COUNT(*) FROM conjectures WHERE constants = ?',
+                                       (constants_name(sym_constants),)).fetchone()[0]
+
+    def close(self):
+        self.connection.close()
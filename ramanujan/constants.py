@@ -26,9 +26,16 @@ sympy.S.register(Khinchin)
 g_N_verify_terms = 1000  # number of CF terms to calculate in __refine_results. (verify hits)
 g_N_verify_compare_length = 100  # number of digits to compare in __refine_results. (verify hits)
 g_N_verify_dps = 2000  # working decimal precision in __refine_results. (verify hits)
+g_N_verify_max_terms = 8000  # maximal number of CF terms in __refine_results, for slowly converging GCFs.
+g_N_verify_guard_digits = 10  # digits certified beyond g_N_verify_compare_length, so rounding of compared digits holds.
 g_N_initial_search_terms = 32  # number of CF terms to calculate in __first_enumeration (initial search)
 g_N_initial_key_length = 10  # number of digits to compare in __first_enumeration (initial search)
 g_N_initial_search_dps = 50  # working decimal precision in __refine_results. (verify hits)
+g_N_acceleration_terms = 6  # number of last convergents accelerated in __first_enumeration (optional)
+g_N_richardson_nodes = 128  # maximal number of convergents extrapolated to verify sub exponential GCFs (optional)
+g_N_adaptive_depth_guard_digits = 2  # digits beyond g_N_initial_key_length in the depth of a group (optional)
+g_N_fingerprint_digits = 8  # digits after the key stored with every LHS entry, compared before __refine_results
+g_N_fingerprint_max_terms = 256  # maximal number of CF terms for the fingerprint digits. (reject false hits)
 
 # math constants:
 g_const_dict = {
@@ -1,14 +1,16 @@
+import copy
 from time import time
 from typing import List
 from collections import namedtuple
 from collections.abc import Iterable
-from sympy import lambdify
 from abc import ABCMeta, abstractmethod
 
-from ramanujan.utils.mobius import GeneralizedContinuedFraction
+from ramanujan.utils.mobius import GeneralizedContinuedFraction, evaluate_gcf_to_precision
 from ramanujan.utils.utils import find_polynomial_series_coefficients, create_mpf_const_generator, \
     get_series_items_from_iter
-from ramanujan.utils.convergence_rate import calculate_convergence
+from ramanujan.utils.convergence_rate import estimate_convergence_batch
+from ramanujan.utils.equivalence import group_by_equivalence
+from ramanujan.LHSHashTable import LHSHashTable
 from ramanujan.constants import *
 
 Match = namedtuple('Match', 'lhs_key rhs_an_poly rhs_bn_poly')
@@ -52,22 +54,34 @@ class AbstractGCFEnumerator(metaclass=ABCMeta):
             refine_results
 
     """
-    def __init__(self, hash_table, poly_domains_generator, sym_constants):
+    def __init__(self, hash_table, poly_domains_generator, sym_constants, fingerprint_hits=True):
         """
         initialize search engine.
         :param hash_table: LHSHashTable object storing the constant's permutations. Used for 
             querying computed values for
+            a list of LHSHashTable objects can be given to search for all of them in a single enumeration. in that case
+            hits and results are returned as a list per table, in the order of the tables.
         :param poly_domains_generator: An poly_domain object that will generate polynomials to iter through, and
             supply functions for calculating items in each polynomial given
-        :param sym_constants: sympy constants
+        :param sym_constants: sympy constants. if hash_table is a list, a list of sympy constants per table.
         :param lhs_search_limit: range of coefficients for left hand side.
+        :param fingerprint_hits: (optional) if False, find_initial_hits doesn't compare hits with the fingerprints of
+            the LHS entries (see reject_false_hits), and all of them are refined.
         """
         # constants
         self.threshold = 1 * 10 ** (-g_N_initial_key_length)  # key length
         self.enum_dps = g_N_initial_search_dps  # working decimal precision for first enumeration
+        self.fingerprint_hits = fingerprint_hits
         self.verify_dps = g_N_verify_dps  # working decimal precision for validating results.
-        self.const_sym = sym_constants
-        self.constants_generator = create_mpf_const_generator(sym_constants)
+        self.multi_constant = isinstance(hash_table, (list, tuple))
+        if self.multi_constant:
+            self.hash_tables = list(hash_table)
+            self.const_sym_list = list(sym_constants)
+        else:
+            self.hash_tables = [hash_table]
+            self.const_sym_list = [sym_constants]
+        self.const_sym = self.const_sym_list[0]
+        self.constants_generator = create_mpf_const_generator(self.const_sym)
         
         # expand poly domains object
         # there are two methods to generate and iter over domains.  the newer one uses poly_domains_generator only,
@@ -86,7 +100,21 @@ class AbstractGCFEnumerator(metaclass=ABCMeta):
         self.get_bn_iterator = poly_domains_generator.get_b_coef_iterator
         
         # store lhs_hash_table
-        self.hash_table = hash_table
+        self.hash_table = self.hash_tables[0]
+
+    def for_table(self, index):
+        """
+        :param index: index of a LHS hash table given to the enumerator.
+        :return: an enumerator of the same domain, that refines and prints results of that table only.
+        """
+        enumerator = copy.copy(self)
+        enumerator.multi_constant = False
+        enumerator.hash_tables = [self.hash_tables[index]]
+        enumerator.const_sym_list = [self.const_sym_list[index]]
+        enumerator.hash_table = self.hash_tables[index]
+        enumerator.const_sym = self.const_sym_list[index]
+        enumerator.constants_generator = create_mpf_const_generator(enumerator.const_sym)
+        return enumerator
 
     def __get_formatted_results(self, results: List[RefinedMatch]) -> List[FormattedResult]:
         ret = []
@@ -95,7 +123,7 @@ class AbstractGCFEnumerator(metaclass=ABCMeta):
             bn = self.create_bn_series(r.rhs_bn_poly, 250)
             print_length = max(max(get_size_of_nested_list(r.rhs_an_poly), get_size_of_nested_list(r.rhs_bn_poly)), 5)
             gcf = GeneralizedContinuedFraction(an, bn[1:])
-            sym_lhs = self.hash_table.evaluate_sym(r.lhs_key, self.const_sym)[r.lhs_match_idx]
+            sym_lhs = self.hash_table.prod(r.c_top, self.const_sym) / self.hash_table.prod(r.c_bot, self.const_sym)
             ret.append(FormattedResult(sym_lhs, gcf.sym_expression(print_length), gcf))
         return ret
 
@@ -116,6 +144,22 @@ class AbstractGCFEnumerator(metaclass=ABCMeta):
         bn_eq = sympy.Eq(sympy.Symbol('b(n)'), sym_poly(bn_poly_max_deg, bn))
         return an_eq, bn_eq
 
+    def group_equivalent_results(self, results: List[RefinedMatch], limit=None) -> List[List[RefinedMatch]]:
+        """
+        group results whose values are mobius transforms of each other (see utils/equivalence.py).
+        :param results: list of final results as received from refine_results.
+        :param limit: (optional) only group results related by a transform with coefficients up to limit.
+        :return: list of classes of results. the first result of each class is its representative.
+        """
+        if self.multi_constant:
+            return [self.for_table(i).group_equivalent_results(table_results, limit)
+                    for i, table_results in enumerate(results)]
+        with mpmath.workdps(self.verify_dps):
+            const_vals = [const() for const in self.constants_generator]
+            values = [mpmath.mpf(self.hash_table.prod(r.c_top, const_vals)) / self.hash_table.prod(r.c_bot, const_vals)
+                      for r in results]
+            return group_by_equivalence(results, values, g_N_verify_compare_length, limit=limit)
+
     def print_results(self, results: List[RefinedMatch], latex=False, convergence_rate=True):
         """
         pretty print the the results.
@@ -123,8 +167,15 @@ class AbstractGCFEnumerator(metaclass=ABCMeta):
         :param results: list of final results as received from refine_results.
         :param latex: if True print in latex form, otherwise pretty print in unicode.
         """
+        if self.multi_constant:
+            for i, table_results in enumerate(results):
+                print(f'results for {self.const_sym_list[i]}:')
+                self.for_table(i).print_results(table_results, latex, convergence_rate)
+            return
         formatted_results = self.__get_formatted_results(results)
-        for r, raw_r in zip(formatted_results, results):
+        if convergence_rate:
+            rates = estimate_convergence_batch([r.GCF for r in formatted_results])
+        for res_num, (r, raw_r) in enumerate(zip(formatted_results, results)):
             result = sympy.Eq(r.LHS, r.RHS)
             if latex:
                 print(f'$$ {sympy.latex(result)} $$')
@@ -134,9 +185,7 @@ class AbstractGCFEnumerator(metaclass=ABCMeta):
                 sympy.pprint(self.__get_formatted_polynomials(raw_r))
                 print('')
             if convergence_rate:
-                with mpmath.workdps(self.verify_dps):
-                    rate = calculate_convergence(r.GCF, lambdify((), r.LHS, 'mpmath')())
-                print("Converged with a rate of {} digits per term".format(mpmath.nstr(rate, 5)))
+                print("Converged with a rate of {} digits per term".format(mpmath.nstr(rates[res_num], 5)))
 
     def convert_results_to_latex(self, results: List[RefinedMatch]):
         results_in_latex = []
@@ -161,30 +210,136 @@ class AbstractGCFEnumerator(metaclass=ABCMeta):
             end = time()
             if print_results:
                 print(f'that took {end - start}s')
+            if self.fingerprint_hits:
+                results = self.reject_false_hits(results, print_results)
         return results
 
+    def reject_false_hits(self, results, print_results=True):
+        """
+        compare hits with the fingerprints of their LHS entries (the g_N_fingerprint_digits digits after the key, stored
+        in the table, see LHSHashTable.fingerprint), so most key collisions and bloom filter false positives are
+        rejected before refine_results.
+        the .db file of the table isn't read. each hit costs a lookup in the mapped fingerprints of the table, and an
+        evaluation of its gcf with just enough terms for the fingerprint digits (usually g_N_initial_search_terms, at
+        most g_N_fingerprint_max_terms). hits whose fingerprint isn't certified within these terms are compared with a
+        tolerance of the certified digits, so they are kept unless they are clearly false.
+        :param results: intermediate results, as received from _first_enumeration.
+        :param print_results: if true, print the number of rejected hits.
+        :return: intermediate results, without the rejected hits.
+        """
+        if self.multi_constant:
+            return [self.for_table(i).reject_false_hits(table_results, print_results)
+                    for i, table_results in enumerate(results)]
+        key_factor = 1 / self.threshold
+        kept = []
+        for res in results:
+            lhs_fingerprints = self.hash_table.fingerprints(res.lhs_key)
+            if len(lhs_fingerprints) == 0:  # a false positive of the bloom filter
+                continue
+
+            def create_series(n_terms):
+                return self.create_an_series(res.rhs_an_poly, n_terms), self.create_bn_series(res.rhs_bn_poly, n_terms)
+            # significant digits of the key (integer digits and g_N_initial_key_length), and of the fingerprint
+            digits = max(len(str(abs(res.lhs_key))), g_N_initial_key_length) + g_N_fingerprint_digits
+            evaluation = self._evaluate_gcf(create_series, digits, g_N_fingerprint_max_terms,
+                                            min_terms=g_N_initial_search_terms)
+            value = evaluation.value
+            if self.hash_table.canonical:  # canonical tables store fractional parts, see LHSHashTable.canonical_key
+                value -= mpmath.floor(value)
+            rhs_fingerprint = LHSHashTable.fingerprint(value, res.lhs_key, key_factor)
+            # rounding of both fingerprints, and the error of the gcf value in units of the fingerprint
+            tolerance = 1 + abs(evaluation.value) * key_factor * mpmath.mpf(10) ** (g_N_fingerprint_digits -
+                                                                                  evaluation.digits)
+            if any(abs(int(lhs_fingerprint) - rhs_fingerprint) <= tolerance for lhs_fingerprint in lhs_fingerprints):
+                kept.append(res)
+        if print_results:
+            print(f'{len(results) - len(kept)} out of {len(results)} hits were rejected before verification')
+        return kept
+
+    def _evaluate_gcf(self, create_series, digits, max_terms, min_terms=64):
+        """
+        evaluate the gcf of a hit with just enough terms for a required number of digits (see
+        mobius.evaluate_gcf_to_precision). enumerators that find gcfs this can't certify override it.
+        :return: GCFEvaluation of the value, number of terms used, and certified digits.
+        """
+        return evaluate_gcf_to_precision(create_series, digits, max_terms, min_terms)
+
     @abstractmethod    
     def _first_enumeration(self, print_results: bool):
         # override by child
         pass
 
-    def refine_results(self, results):
+    def refine_results(self, results, results_store=None):
+        """
+        verify results of the first enumeration (step (2) explained in __init__ docstring)
+        :param results: intermediate results, as received from find_initial_hits.
+        :param results_store: (optional) ResultsStore. hits that were already verified by a previous run are taken from
+            it without verifying them again, and the new results are added to it.
+        :return: final results.
+        """
+        if self.multi_constant:  # dispatch the hits of each table to it
+            return [self.for_table(i).refine_results(table_results, results_store)
+                    for i, table_results in enumerate(results)]
+        known_results = []
+        if results_store is not None:
+            results, known_results = self.__split_known_results(results, results_store)
+            print(f'{len(known_results)} results were already verified by previous runs')
         with mpmath.workdps(self.verify_dps * 2):
             print('starting to verify results...')
             start = time()
             refined_results = self._refine_results(results, True)  # step (3)
             end = time()
             print(f'that took {end - start}s')
-        return refined_results
+        if results_store is not None:
+            results_store.add_refined_matches(self.const_sym, refined_results)
+        return known_results + refined_results
+
+    def __split_known_results(self, results, results_store):
+        """
+        :return: hits that are not in results_store, and RefinedMatch of the stored hits.
+        """
+        known = results_store.known_refined_matches(self.const_sym)
+        unknown_results = []
+        known_results = []
+        for res in results:
+            known_lhs = known.get(results_store.refined_match_key(res))
+            if known_lhs is None:
+                unknown_results.append(res)
+                continue
+            try:
+                stored_values = self.hash_table[res.lhs_key]
+            except KeyError:
+                continue
+            found = False
+            for i, (c_top, c_bot) in enumerate(stored_values):
+                for known_top, known_bot in known_lhs:
+                    # results of canonical tables are shifted by an integer (see LHSHashTable.canonical_key)
+                    if self.__is_shift_of(known_top, c_top, c_bot) and tuple(c_bot) == known_bot:
+                        known_results.append(RefinedMatch(*res, i, known_top, known_bot))
+                        found = True
+            if not found:
+                unknown_results.append(res)
+        return unknown_results, known_results
+
+    def __is_shift_of(self, known_top, c_top, c_bot):
+        if not self.hash_table.canonical:
+            return tuple(c_top) == known_top
+        diff = [k - t for k, t in zip(known_top, c_top)]
+        shift = next((d // b for d, b in zip(diff, c_bot) if b != 0), 0)
+        return all(d == shift * b for d, b in zip(diff, c_bot))
 
     @abstractmethod
     def _refine_results(self, intermediate_results: List[Match], print_results=True):
         # override by child
         pass 
     
-    def full_execution(self, print_latex=False, print_convergence_rate=True):
+    def full_execution(self, print_latex=False, print_convergence_rate=True, results_store=None):
+        if results_store is not None:
+            all_constants = [c for consts in self.const_sym_list for c in consts]
+            results_store.start_run('mitm', all_constants, {'threshold': self.threshold})
+            results_store.add_domain(self.poly_domains_generator)
         first_iteration = self.find_initial_hits()
-        refined_results = self.refine_results(first_iteration)
+        refined_results = self.refine_results(first_iteration, results_store)
         self.print_results(refined_results, print_latex, print_convergence_rate)
 
         return refined_results
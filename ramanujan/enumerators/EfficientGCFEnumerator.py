@@ -1,12 +1,24 @@
+import sys
+import math
 import itertools
 import mpmath
+import numpy as np
 from typing import List, Iterator, Callable
 from time import time
 
-from ramanujan.utils.mobius import EfficientGCF
-from ramanujan.constants import g_N_initial_search_terms, g_N_verify_terms, g_N_verify_compare_length
+from ramanujan.utils.utils import values_agree
+from ramanujan.utils.series_cache import SeriesCache, SERIES_CACHE_CHUNK, get_series_cache
+from ramanujan.utils.acceleration import ACCELERATORS, accelerate, richardson_evaluation
+from ramanujan.utils.convergence_rate import SUB_EXPONENTIAL, plan_search_depth
+from ramanujan.constants import g_N_initial_search_terms, g_N_verify_compare_length, g_N_verify_max_terms, \
+    g_N_verify_guard_digits, g_N_acceleration_terms, g_N_initial_key_length, g_N_adaptive_depth_guard_digits
+from ramanujan.LHSHashTable import LHSHashTable
 from .AbstractGCFEnumerator import AbstractGCFEnumerator, Match, RefinedMatch
 
+DEFAULT_CACHE_MEMORY = 2 ** 30  # bytes of RAM for the cached series of the first enumeration
+# approximate size of a cached series: a list of g_N_initial_search_terms python ints
+SERIES_BYTES = sys.getsizeof([0] * g_N_initial_search_terms) + g_N_initial_search_terms * sys.getsizeof(2 ** 40)
+
 
 class EfficientGCFEnumerator(AbstractGCFEnumerator):
     """
@@ -14,12 +26,130 @@ class EfficientGCFEnumerator(AbstractGCFEnumerator):
 
     first enumeration will calculate the GCF to dept g_N_initial_search_terms (about 30),
     and compare against the lhs table to g_N_initial_key_length (usually 10 digits)
-    results refining will calculate the GCF to dept g_N_verify_terms (usually 1000)
-    and compare it with g_N_verify_compare_length (100) digits of the given expression
+    results refining will calculate the GCF to the depth needed for g_N_verify_compare_length (100) digits (up to
+    g_N_verify_max_terms) and compare it with g_N_verify_compare_length digits of the given expression
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, cache_memory=DEFAULT_CACHE_MEMORY, accelerator=None, adaptive_depth=False, **kwargs):
+        """
+        :param cache_memory: (optional) bytes of RAM for the cached side of the first enumeration. if it doesn't fit,
+            the cached side is processed in blocks, and the other side is iterated once per block.
+        :param accelerator: (optional) 'wynn' or 'richardson' (see utils/acceleration.py), to find gcfs that converge
+            too slowly for g_N_initial_search_terms. the first enumeration also probes the key of the accelerated value.
+            'wynn' accelerates the last g_N_acceleration_terms convergents of every gcf, for gcfs that converge
+            geometrically but slowly. their hits are certified by the regular evaluation.
+            'richardson' extrapolates all of the convergents of gcfs that are predicted to converge sub-exponentially
+            (see utils/convergence_rate.predict_convergence), for those that converge like c_1/n + c_2/n^2 + ....
+            hits the regular evaluation doesn't certify are evaluated by acceleration.richardson_evaluation.
+        :param adaptive_depth: (optional) if True, the first enumeration groups gcfs by the degrees and leading
+            coefficients of an and bn, and calculates each group from the depth its predicted convergence rate needs
+            for the key (see utils/convergence_rate.py), instead of g_N_initial_search_terms. a gcf whose last
+            convergents still differ in the key's digits (and guard digits) is continued until they don't, up to
+            g_N_initial_search_terms. depth and time per convergence class are kept in self.depth_report.
+        """
         super().__init__(*args, **kwargs)
+        if accelerator is not None and accelerator not in ACCELERATORS:
+            raise ValueError(f'unknown accelerator {accelerator}, use one of {ACCELERATORS}')
+        self.cache_memory = cache_memory
+        self.accelerator = accelerator
+        self.adaptive_depth = adaptive_depth
+        self.depth_report = {}
+
+    @staticmethod
+    def _plan_tiling(size_a, size_b, cache_memory, series_bytes=SERIES_BYTES):
+        """
+        choose the side to cache in the first enumeration, and the number of series in each cached block.
+        the pairs calculated are the same either way, so the cost is the number of series created: the cached side
+        once, and the iterated side once per block. if both fit in memory, the smaller side is cached.
+        :param series_bytes: (optional) size of a cached series.
+        :return: True if {bn} should be cached (False for {an}), and the number of series in a block.
+        """
+        block_length = max(cache_memory // series_bytes, 1)
+
+        def cost(size_cached, size_iterated):
+            return size_cached + -(-size_cached // block_length) * size_iterated
+
+        cost_bn, cost_an = cost(size_b, size_a), cost(size_a, size_b)
+        cache_bn = cost_bn < cost_an or (cost_bn == cost_an and size_a > size_b)
+        return cache_bn, min(block_length, max(size_b if cache_bn else size_a, 1))
+
+    def __poly_signature(self, coef, side):
+        """
+        :param side: 'an' or 'bn'.
+        :return: degree and leading coefficient of the polynomial (None if neither the depth nor the accelerator
+            depend on the convergence class).
+        """
+        if not self.adaptive_depth and self.accelerator != 'richardson':
+            return None
+        if side == 'an':
+            return self.poly_domains_generator.get_poly_an_degree(coef), \
+                self.poly_domains_generator.get_poly_an_lead_coef(coef)
+        return self.poly_domains_generator.get_poly_bn_degree(coef), \
+            self.poly_domains_generator.get_poly_bn_lead_coef(coef)
+
+    def __group_by_signature(self, coef_list, series_list, side):
+        """
+        :return: list of (signature, list of (series, coefficient)) of a cached block, a group per signature of the
+            polynomials (see __poly_signature).
+        """
+        groups = {}
+        for series, coef in zip(series_list, coef_list):
+            groups.setdefault(self.__poly_signature(coef, side), []).append((series, coef))
+        return list(groups.items())
+
+    def __iter_series_blocks(self, coefficient_iter: Iterator,
+                             series_generator: Callable[[List[int], int], List[int]],
+                             block_length: int, side: str):
+        """
+        :param side: 'an' or 'bn', the side of the series. used as part of their key in the series cache.
+        :return: generator of (coefficients, series) of blocks of block_length coefficients. series with '0' in any
+            term (but the first) are filtered out.
+            if the series cache is on (see utils/series_cache.py), series are loaded from it instead of generated. the
+            cache holds chunks of SERIES_CACHE_CHUNK coefficients, that don't depend on block_length (and so on the
+            memory budget), and blocks are cut from them.
+        """
+        series_cache = get_series_cache()
+        coefficient_iter = iter(coefficient_iter)
+        if series_cache is None:
+            while True:
+                block = list(itertools.islice(coefficient_iter, block_length))
+                if not block:
+                    return
+                yield self.__create_series_list(block, series_generator, filter_from_1=True)
+
+        block_coefs, block_series, block_size = [], [], 0  # block_size counts filtered out coefficients too
+        chunk_start = 0
+        while True:
+            chunk = list(itertools.islice(coefficient_iter, SERIES_CACHE_CHUNK))
+            if not chunk:
+                break
+            key = SeriesCache.key(self.poly_domains_generator, side, g_N_initial_search_terms, chunk_start,
+                                  SERIES_CACHE_CHUNK)
+            series = series_cache.get(key, lambda: [series_generator(coef, g_N_initial_search_terms)
+                                                    for coef in chunk])
+            if len(series) != len(chunk):  # safety check
+                series = [series_generator(coef, g_N_initial_search_terms) for coef in chunk]
+            if isinstance(series, np.ndarray):
+                series_filter = np.all(series[:, 1:] != 0, axis=1).tolist()
+            else:
+                series_filter = [0 not in an[1:] for an in series]
+            position = 0
+            while position < len(chunk):
+                end = position + min(block_length - block_size, len(chunk) - position)
+                kept = [i for i in range(position, end) if series_filter[i]]
+                block_coefs += [chunk[i] for i in kept]
+                if isinstance(series, np.ndarray):
+                    block_series += series[kept].tolist()
+                else:
+                    block_series += [series[i] for i in kept]
+                block_size += end - position
+                position = end
+                if block_size == block_length:
+                    yield block_coefs, block_series
+                    block_coefs, block_series, block_size = [], [], 0
+            chunk_start += len(chunk)
+        if block_size:
+            yield block_coefs, block_series
 
     @staticmethod
     def __create_series_list(coefficient_iter: Iterator,
@@ -45,109 +175,276 @@ class EfficientGCFEnumerator(AbstractGCFEnumerator):
         The polynomial families are supplied from self.poly_domains_generator
 
         For each an and bn pair, a gcf is calculated using efficient_gcf_calculation defined under this scope,
-        and compared self.hash_tables for hits.
+        and compared self.hash_tables for hits. the key of each gcf is computed once, and probed in all of the tables.
 
         :param print_results: if True print the status of calculation.
-        :return: intermediate results (list of 'Match')
+        :return: intermediate results (list of 'Match'). a list of them per table if the enumerator has multiple tables.
         """
 
         def efficient_gcf_calculation():
             """
-            enclosure. a_, b_, and key_factor are used from outer scope.
+            enclosure. a_, b_, depth, and key_factor are used from outer scope.
             moved here from mobius.EfficientGCF to optimize performance.
-            :return: key for LHS hash table
+            :return: value of the gcf
             """
             prev_q = 0
             q = 1
             prev_p = 1
             p = a_[0]
-            for i in range(1, len(a_)):
+            for i in range(1, depth):
                 tmp_a = q
                 tmp_b = p
                 q = a_[i] * q + b_[i] * prev_q
                 p = a_[i] * p + b_[i] * prev_p
                 prev_q = tmp_a
                 prev_p = tmp_b
+            if depth < g_N_initial_search_terms:  # planned by adaptive_depth, continue if the key isn't settled yet
+                p, q, prev_p, prev_q = settle_gcf(p, q, prev_p, prev_q)
             if q == 0:  # safety check
-                value = 0
-            else:
-                value = mpmath.mpf(p) / mpmath.mpf(q)
-            return int(value * key_factor)  # calculate hash key of gcf value
+                return mpmath.mpf(0)
+            return mpmath.mpf(p) / mpmath.mpf(q)
+
+        def accelerated_gcf_calculation():
+            """
+            enclosure. a_, b_, depth, first_accelerated, and self.accelerator are used from outer scope.
+            same as efficient_gcf_calculation, and also accelerates the convergents from first_accelerated on.
+            :return: value of the gcf, and the accelerated value (None if a convergent is infinite)
+            """
+            prev_q = 0
+            q = 1
+            prev_p = 1
+            p = a_[0]
+            convergents = []
+            for i in range(1, depth):
+                tmp_a = q
+                tmp_b = p
+                q = a_[i] * q + b_[i] * prev_q
+                p = a_[i] * p + b_[i] * prev_p
+                prev_q = tmp_a
+                prev_p = tmp_b
+                if i >= first_accelerated:
+                    convergents.append((i, p, q))
+            if depth < g_N_initial_search_terms:
+                p, q, prev_p, prev_q = settle_gcf(p, q, prev_p, prev_q, convergents)
+                convergents = convergents[-g_N_acceleration_terms:]
+            if q == 0:  # safety check
+                return mpmath.mpf(0), None
+            if any(c_q == 0 for _, _, c_q in convergents):
+                return mpmath.mpf(p) / mpmath.mpf(q), None
+            values = [mpmath.mpf(c_p) / mpmath.mpf(c_q) for _, c_p, c_q in convergents]
+            try:
+                accelerated = accelerate(self.accelerator, values, [i for i, _, _ in convergents])
+            except ZeroDivisionError:
+                accelerated = None
+            return values[-1], accelerated
+
+        def settle_gcf(p, q, prev_p, prev_q, convergents=None):
+            """
+            enclosure. a_, b_, depth, group and settled_factor are used from outer scope.
+            the planned depth is only a lower bound: continues the recurrence after depth terms until the last two
+            convergents differ by less than 1 / settled_factor, up to g_N_initial_search_terms terms.
+            p_n/q_n - p_(n-1)/q_(n-1) = +-b_1*...*b_n / (q_n*q_(n-1)), so this is checked with integers.
+            :param convergents: (optional) list to append (n, p_n, q_n) of the calculated convergents to.
+            :return: p, q, prev_p, prev_q of the last convergent
+            """
+            b_product = abs(math.prod(b_[1:depth]))
+            i = depth
+            while i < g_N_initial_search_terms and abs(q * prev_q) <= b_product * settled_factor:
+                q, prev_q = a_[i] * q + b_[i] * prev_q, q
+                p, prev_p = a_[i] * p + b_[i] * prev_p, p
+                b_product *= abs(b_[i])
+                if convergents is not None:
+                    convergents.append((i, p, q))
+                i += 1
+            if i > depth:
+                group[2] += 1
+            return p, q, prev_p, prev_q
+
+        def probe_accelerated_gcf(an_coef, bn_coef):
+            """
+            enclosure. calculates the gcf of a_ and b_, and probes the hash tables with its key, and with the key of the
+            accelerated value if it's different.
+            :return: number of hits
+            """
+            value, accelerated = accelerated_gcf_calculation()
+            found = probe_hash_tables(value, an_coef, bn_coef)
+            if accelerated is not None and int(accelerated * key_factor) != int(value * key_factor):
+                found += probe_hash_tables(accelerated, an_coef, bn_coef)
+            return found
+
+        def plan_depth(a_signature, b_signature):
+            """
+            enclosure. depth_plans and depth_report are used from outer scope.
+            :return: number of terms for gcfs of the given signatures, the entry of their group in depth_report (None
+                if the depth isn't adaptive), and the first convergent to accelerate (None if they aren't accelerated).
+            """
+            signatures = (a_signature, b_signature)
+            if signatures not in depth_plans:
+                if a_signature is None:
+                    depth_plans[signatures] = g_N_initial_search_terms, None, default_first_accelerated
+                else:
+                    convergence_class, group_depth = plan_search_depth(
+                        *a_signature, *b_signature, g_N_initial_key_length + g_N_adaptive_depth_guard_digits,
+                        g_N_initial_search_terms)
+                    group_depth = max(group_depth, min_depth) if self.adaptive_depth else g_N_initial_search_terms
+                    group = depth_report.setdefault((convergence_class, group_depth), [0, 0., 0]) \
+                        if self.adaptive_depth else None
+                    group_first_accelerated = None
+                    if self.accelerator == 'wynn':
+                        group_first_accelerated = group_depth - g_N_acceleration_terms
+                    elif self.accelerator == 'richardson' and convergence_class == SUB_EXPONENTIAL:
+                        group_first_accelerated = 1  # extrapolated from all of the convergents
+                    depth_plans[signatures] = group_depth, group, group_first_accelerated
+            return depth_plans[signatures]
+
+        def probe_hash_tables(value, an_coef, bn_coef):
+            """
+            the key of the value is computed once, and looked up in all tables. canonical tables are probed with the key
+            of its fractional part (see LHSHashTable.canonical_key)
+            :return: number of hits
+            """
+            key = int(value * key_factor)  # calculate hash key of gcf value
+            canonical_key = LHSHashTable.canonical_key(value, key_factor) if any_canonical else None
+            found = 0
+            for table_results, hash_table in zip(results, hash_tables):
+                table_key = canonical_key if hash_table.canonical else key
+                if table_key in hash_table:  # find hits in hash tables
+                    table_results.append(Match(table_key, an_coef, bn_coef))
+                    found += 1
+            return found
 
         start = time()
-        a_coef_iter = self.get_an_iterator()  # all coefficients possibilities for 'a_n'
-        b_coef_iter = self.get_bn_iterator()
         size_b = self.get_bn_length()
         size_a = self.get_an_length()
-        num_iterations = size_b * size_a
+        num_iterations = size_b * size_a  # series with '0' terms are subtracted when their block is created
         key_factor = 1 / self.threshold
+        cache_bn, block_length = self._plan_tiling(size_a, size_b, self.cache_memory)
+        if print_results and block_length < (size_b if cache_bn else size_a):
+            print(f'caching {"bn" if cache_bn else "an"} in blocks of {block_length} series')
 
         counter = 0  # number of permutations passed
         print_counter = counter
-        results = []  # list of intermediate results
-
-        if size_a > size_b:  # cache {bn} in RAM, iterate over an
-            b_coef_list, bn_list = self.__create_series_list(b_coef_iter, self.create_bn_series, filter_from_1=True)
-            real_bn_size = len(bn_list)
-            num_iterations = (num_iterations // self.get_bn_length()) * real_bn_size
-            if print_results:
-                print(f'created final enumerations filters after {time() - start}s')
-            start = time()
-            for a_coef in a_coef_iter:
-                an = self.create_an_series(a_coef, g_N_initial_search_terms)
-                if 0 in an[1:]:  # a_0 is allowed to be 0.
-                    counter += real_bn_size
-                    print_counter += real_bn_size
-                    continue
-                for bn_coef in zip(bn_list, b_coef_list):
-                    # evaluation of GCF: taken from mobius.EfficientGCF and moved here to avoid function call overhead.
-                    a_ = an
-                    b_ = bn_coef[0]
-                    key = efficient_gcf_calculation()  # calculate hash key of gcf value
-
-                    if key in self.hash_table:  # find hits in hash table
-                        results.append(Match(key, a_coef, bn_coef[1]))
-                    if print_results:
-                        counter += 1
-                        print_counter += 1
-                        if print_counter >= 100000:  # print status.
-                            print_counter = 0
-                            print(
-                                f"passed {counter} out of {num_iterations} " +
-                                f"({round(100. * counter / num_iterations, 2)}%). found so far {len(results)} results")
-
-        else:  # cache {an} in RAM, iterate over bn
-            a_coef_list, an_list = self.__create_series_list(a_coef_iter, self.create_an_series, filter_from_1=True)
-            real_an_size = len(an_list)
-            num_iterations = (num_iterations // self.get_an_length()) * real_an_size
-            if print_results:
-                print(f'created final enumerations filters after {time() - start}s')
-            start = time()
-            for b_coef in b_coef_iter:
-                bn = self.create_bn_series(b_coef, g_N_initial_search_terms)
-                if 0 in bn[1:]:
-                    counter += real_an_size
-                    print_counter += real_an_size
-                    continue
-                for an_coef in zip(an_list, a_coef_list):
-                    a_ = an_coef[0]
-                    b_ = bn
-                    key = efficient_gcf_calculation()  # calculate hash key of gcf value
-
-                    if key in self.hash_table:  # find hits in hash table
-                        results.append(Match(key, an_coef[1], b_coef))
-                    if print_results:
-                        counter += 1
-                        print_counter += 1
-                        if print_counter >= 100000:  # print status.
-                            print_counter = 0
-                            print(
-                                f"passed {counter} out of {num_iterations} " +
-                                f"({round(100. * counter / num_iterations, 2)}%). found so far {len(results)} results")
+        hash_tables = self.hash_tables
+        any_canonical = any(hash_table.canonical for hash_table in hash_tables)
+        results = [[] for _ in hash_tables]  # lists of intermediate results, per table
+        n_results = 0
+        min_depth = g_N_acceleration_terms + 1 if self.accelerator is not None else 2
+        # first convergent accelerated at g_N_initial_search_terms, if the convergence class isn't needed for it
+        default_first_accelerated = g_N_initial_search_terms - g_N_acceleration_terms if self.accelerator else None
+        depth_plans = {}  # (an signature, bn signature) -> (depth, group in depth_report)
+        depth_report = {}  # (convergence class, depth) -> [number of gcfs, time, number of gcfs continued after depth]
+        settled_factor = 10 ** (g_N_initial_key_length + g_N_adaptive_depth_guard_digits)
+        self.depth_report = depth_report
+        n_cached = 0  # number of coefficients of the cached side, before filtering
+        enumeration_time = 0.
+
+        if cache_bn:  # cache {bn} in RAM, a block at a time, iterate over an
+            for b_coef_list, bn_list in self.__iter_series_blocks(self.get_bn_iterator(), self.create_bn_series,
+                                                                   block_length, 'bn'):
+                real_bn_size = len(bn_list)
+                block_size = min(block_length, size_b - n_cached)
+                n_cached += block_size
+                num_iterations -= (block_size - real_bn_size) * size_a
+                bn_groups = self.__group_by_signature(b_coef_list, bn_list, 'bn')
+                if print_results:
+                    print(f'created final enumerations filters after {time() - start}s')
+                start = time()
+                for a_coef in self.get_an_iterator():
+                    an = self.create_an_series(a_coef, g_N_initial_search_terms)
+                    if 0 in an[1:]:  # a_0 is allowed to be 0.
+                        counter += real_bn_size
+                        print_counter += real_bn_size
+                        continue
+                    a_signature = self.__poly_signature(a_coef, 'an')
+                    for b_signature, bn_group in bn_groups:
+                        depth, group, first_accelerated = plan_depth(a_signature, b_signature)
+                        group_start = time()
+                        for bn_coef in bn_group:
+                            # evaluation of GCF: taken from mobius.EfficientGCF and moved here to avoid function call
+                            # overhead.
+                            a_ = an
+                            b_ = bn_coef[0]
+                            if first_accelerated is None:
+                                value = efficient_gcf_calculation()
+                                n_results += probe_hash_tables(value, a_coef, bn_coef[1])
+                            else:
+                                n_results += probe_accelerated_gcf(a_coef, bn_coef[1])
+                            if print_results:
+                                counter += 1
+                                print_counter += 1
+                                if print_counter >= 100000:  # print status.
+                                    print_counter = 0
+                                    print(
+                                        f"passed {counter} out of {num_iterations} " +
+                                        f"({round(100. * counter / num_iterations, 2)}%). " +
+                                        f"found so far {n_results} results")
+                        if group is not None:
+                            group[0] += len(bn_group)
+                            group[1] += time() - group_start
+                enumeration_time += time() - start
+                start = time()  # the next block is created when the loop continues
+
+        else:  # cache {an} in RAM, a block at a time, iterate over bn
+            for a_coef_list, an_list in self.__iter_series_blocks(self.get_an_iterator(), self.create_an_series,
+                                                                   block_length, 'an'):
+                real_an_size = len(an_list)
+                block_size = min(block_length, size_a - n_cached)
+                n_cached += block_size
+                num_iterations -= (block_size - real_an_size) * size_b
+                an_groups = self.__group_by_signature(a_coef_list, an_list, 'an')
+                if print_results:
+                    print(f'created final enumerations filters after {time() - start}s')
+                start = time()
+                for b_coef in self.get_bn_iterator():
+                    bn = self.create_bn_series(b_coef, g_N_initial_search_terms)
+                    if 0 in bn[1:]:
+                        counter += real_an_size
+                        print_counter += real_an_size
+                        continue
+                    b_signature = self.__poly_signature(b_coef, 'bn')
+                    for a_signature, an_group in an_groups:
+                        depth, group, first_accelerated = plan_depth(a_signature, b_signature)
+                        group_start = time()
+                        for an_coef in an_group:
+                            a_ = an_coef[0]
+                            b_ = bn
+                            if first_accelerated is None:
+                                value = efficient_gcf_calculation()
+                                n_results += probe_hash_tables(value, an_coef[1], b_coef)
+                            else:
+                                n_results += probe_accelerated_gcf(an_coef[1], b_coef)
+                            if print_results:
+                                counter += 1
+                                print_counter += 1
+                                if print_counter >= 100000:  # print status.
+                                    print_counter = 0
+                                    print(
+                                        f"passed {counter} out of {num_iterations} " +
+                                        f"({round(100. * counter / num_iterations, 2)}%). " +
+                                        f"found so far {n_results} results")
+                        if group is not None:
+                            group[0] += len(an_group)
+                            group[1] += time() - group_start
+                enumeration_time += time() - start
+                start = time()  # the next block is created when the loop continues
 
         if print_results:
-            print(f'created results after {time() - start}s')
-        return results
+            print(f'created results after {enumeration_time}s')
+            for (convergence_class, group_depth), (n_gcfs, group_time, n_continued) in sorted(depth_report.items()):
+                print(f'{convergence_class} gcfs: {n_gcfs} calculated to depth {group_depth} in {group_time}s, '
+                      f'{n_continued} of them continued until their key settled')
+        return results if self.multi_constant else results[0]
+
+    def _evaluate_gcf(self, create_series, digits, max_terms, min_terms=64):
+        """
+        see AbstractGCFEnumerator._evaluate_gcf. with the 'richardson' accelerator, a gcf the regular evaluation doesn't
+        certify is also evaluated by richardson_evaluation, which is used if it certifies more digits.
+        """
+        evaluation = super()._evaluate_gcf(create_series, digits, max_terms, min_terms)
+        if self.accelerator != 'richardson' or evaluation.digits >= digits:
+            return evaluation
+        extrapolation = richardson_evaluation(create_series, digits, max_terms, min_terms)
+        return extrapolation if extrapolation.digits > evaluation.digits else evaluation
 
     def _refine_results(self, intermediate_results: List[Match], print_results=True):
         """
@@ -160,6 +457,7 @@ class EfficientGCFEnumerator(AbstractGCFEnumerator):
         counter = 0
         n_iterations = len(intermediate_results)
         constant_vals = [const() for const in self.constants_generator]
+        depths = []
         for res in intermediate_results:
             counter += 1
             if (counter % 50) == 0 and print_results:
@@ -177,18 +475,24 @@ class EfficientGCFEnumerator(AbstractGCFEnumerator):
                 # user
                 continue
 
-            # create a_n, b_n with huge length, calculate gcf, and verify result.
-            an = self.create_an_series(res.rhs_an_poly, g_N_verify_terms)
-            bn = self.create_bn_series(res.rhs_bn_poly, g_N_verify_terms)
-            gcf = EfficientGCF(an, bn)
-            rhs_str = mpmath.nstr(gcf.evaluate(), g_N_verify_compare_length)
+            # calculate gcf with as many terms as needed for the compared digits, and verify result.
+            def create_series(n_terms):
+                return self.create_an_series(res.rhs_an_poly, n_terms), self.create_bn_series(res.rhs_bn_poly, n_terms)
+            evaluation = self._evaluate_gcf(create_series, g_N_verify_compare_length + g_N_verify_guard_digits,
+                                            g_N_verify_max_terms)
+            depths.append(evaluation.depth)
+            # canonical tables store the LHS of the fractional part, shift it back by the integer part of the gcf.
+            shift = int(mpmath.floor(evaluation.value)) if self.hash_table.canonical else 0
 
             for i, match in enumerate(all_matches):
-                val_str = mpmath.nstr(match[0], g_N_verify_compare_length)
-                if val_str == rhs_str:
+                if values_agree(match[0] + shift, evaluation.value, g_N_verify_compare_length):
                     # This patch is ment to allow support for multiple matches for an
                     # LHS key, i will later be used to determind which item in the LHS dict
                     # was matched
-                    results.append(RefinedMatch(*res, i, match[1], match[2]))
+                    c_top = tuple(t + shift * b for t, b in zip(match[1], match[2]))
+                    results.append(RefinedMatch(*res, i, c_top, match[2]))
 
+        if depths and print_results:
+            print('verified with {} to {} GCF terms (average {})'.format(
+                min(depths), max(depths), round(sum(depths) / len(depths))))
         return results
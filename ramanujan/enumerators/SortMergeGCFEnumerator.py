@@ -0,0 +1,216 @@
+import itertools
+import mpmath
+import numpy as np
+from typing import List, Iterator, Callable
+from time import time
+
+from ramanujan.constants import g_N_initial_search_terms
+from ramanujan.LHSHashTable import LHSHashTable
+from .AbstractGCFEnumerator import Match
+from .EfficientGCFEnumerator import EfficientGCFEnumerator
+
+BLOCK_SIZE = 2 ** 20  # number of gcf keys sorted and joined at once
+MAX_KEY = 2 ** 62  # keys of larger values don't fit int64 (and are not in LHS tables), MAX_KEY stands for them
+FLOAT_KEY_LIMIT = 2 ** 52  # float64 can't tell keys apart above this, so larger keys are calculated exactly
+# error of float64 values, relative to the value or to 1 (the convergents cancel each other out). keys of values that
+# are closer than that to a key boundary are calculated exactly
+KEY_TOLERANCE = 1e-12
+SERIES_ARRAY_BYTES = 8 * g_N_initial_search_terms  # size of a float64 series
+# size of a pair in a joined block: its an and bn series, and its value, key and indices
+PAIR_BYTES = 2 * SERIES_ARRAY_BYTES + 64
+
+
+class SortMergeGCFEnumerator(EfficientGCFEnumerator):
+    """
+    This enumerator finds hits without probing bloom filters.
+
+    first enumeration calculates the keys of a block of GCFs at once (vectorized, in float64), sorts them, and
+    merge-joins them with the sorted keys of the LHS table (see LHSHashTable.sorted_keys). only exact key matches are
+    refined, so the refine stage doesn't spend time on false positives of the bloom filter.
+    keys that float64 can't tell from their neighbours (values near a key boundary, or too large) are calculated with
+    integers and mpmath, the same as EfficientGCFEnumerator.
+    results refining is the same as EfficientGCFEnumerator.
+    """
+
+    def __init__(self, *args, block_size=BLOCK_SIZE, **kwargs):
+        """
+        :param block_size: (optional) maximal number of gcf keys to sort and join at once. half of cache_memory (see
+            EfficientGCFEnumerator) is used for the cached series, and half for the arrays of a joined block, so
+            blocks are smaller if they don't fit.
+        """
+        super().__init__(*args, **kwargs)
+        self.block_size = block_size
+
+    @staticmethod
+    def __create_series_array(coefficient_iter: Iterator,
+                              series_generator: Callable[[List[int], int], List[int]]) -> [List, List, np.ndarray]:
+        """
+        :return: coefficients, their series, and array of their series (a row per series). series with '0' in any term
+                 (but the first) are filtered out.
+        """
+        coef_list = []
+        series_list = []
+        for coef in coefficient_iter:
+            series = series_generator(coef, g_N_initial_search_terms)
+            if 0 not in series[1:]:
+                coef_list.append(coef)
+                series_list.append(series)
+        return coef_list, series_list, np.array(series_list, dtype=np.float64).reshape(len(series_list), -1)
+
+    @staticmethod
+    def _gcf_values(an, bn):
+        """
+        vectorized version of efficient_gcf_calculation (see EfficientGCFEnumerator._first_enumeration).
+        p and q are normalized on every step, so the float64 values don't overflow.
+        :param an: array of a_n series, a row per gcf.
+        :param bn: array of b_n series, a row per gcf.
+        :return: array of gcf values (inf or nan for gcf that don't have a finite value).
+        """
+        prev_q = np.zeros(len(an))
+        q = np.ones(len(an))
+        prev_p = np.ones(len(an))
+        p = an[:, 0].copy()
+        with np.errstate(all='ignore'):
+            for i in range(1, an.shape[1]):
+                q, prev_q = an[:, i] * q + bn[:, i] * prev_q, q
+                p, prev_p = an[:, i] * p + bn[:, i] * prev_p, p
+                scale = np.maximum(np.abs(p), np.abs(q))
+                scale[scale == 0] = 1
+                q /= scale
+                prev_q /= scale
+                p /= scale
+                prev_p /= scale
+            return np.where(q == 0, 0, p / q)
+
+    @staticmethod
+    def _exact_gcf_value(an, bn):
+        """
+        same as efficient_gcf_calculation (see EfficientGCFEnumerator._first_enumeration), for a single gcf.
+        :param an: a_n series (ints).
+        :param bn: b_n series (ints).
+        :return: mpf value of the gcf.
+        """
+        prev_q = 0
+        q = 1
+        prev_p = 1
+        p = an[0]
+        for i in range(1, len(an)):
+            q, prev_q = an[i] * q + bn[i] * prev_q, q
+            p, prev_p = an[i] * p + bn[i] * prev_p, p
+        if q == 0:  # safety check
+            return mpmath.mpf(0)
+        return mpmath.mpf(p) / mpmath.mpf(q)
+
+    def _first_enumeration(self, print_results: bool):
+        """
+        Calculates the same gcf keys as EfficientGCFEnumerator, a block at a time. keys are calculated in float64, and
+        again exactly if float64 isn't precise enough for them.
+        The series of one side are cached in RAM, a block of them at a time (see EfficientGCFEnumerator._plan_tiling).
+        every joined block pairs them with the series of a few coefficients of the other side.
+
+        :param print_results: if True print the status of calculation.
+        :return: intermediate results (list of 'Match'). a list of them per table if the enumerator has multiple tables.
+        """
+        start = time()
+        key_factor = 1 / self.threshold
+        block_size = max(min(self.block_size, (self.cache_memory // 2) // PAIR_BYTES), 1)
+        # a joined block pairs at least one series with all of the cached block, so it is at most block_size long
+        cache_bn, cached_block_length = self._plan_tiling(
+            self.get_an_length(), self.get_bn_length(),
+            min(self.cache_memory // 2, block_size * SERIES_ARRAY_BYTES), SERIES_ARRAY_BYTES)
+        if cache_bn:  # cache {bn} in RAM, a block at a time, iterate over an
+            cached_iter, cached_generator = self.get_bn_iterator(), self.create_bn_series
+            iter_generator, get_iter_coefs = self.create_an_series, self.get_an_iterator
+        else:  # cache {an} in RAM, a block at a time, iterate over bn
+            cached_iter, cached_generator = self.get_an_iterator(), self.create_an_series
+            iter_generator, get_iter_coefs = self.create_bn_series, self.get_bn_iterator
+        lhs_keys = [hash_table.sorted_keys() for hash_table in self.hash_tables]
+        if print_results:
+            print(f'created LHS keys after {time() - start}s')
+
+        start = time()
+        results = [[] for _ in self.hash_tables]  # lists of intermediate results, per table
+        counter = 0
+
+        def join_block(block_coefs, block_series):
+            """
+            enclosure. cached_coefs, cached_series, cached_int_series and n_cached are used from outer scope.
+            calculates the keys of all pairs of block_series and the cached series, and joins them with the keys of the
+            LHS tables.
+            """
+            iter_series = np.repeat(np.array(block_series, dtype=np.float64), n_cached, axis=0)
+            paired_series = np.tile(cached_series, (len(block_series), 1))
+            an, bn = (paired_series, iter_series) if not cache_bn else (iter_series, paired_series)
+            values = self._gcf_values(an, bn)
+            with np.errstate(invalid='ignore'):
+                scaled = values * key_factor
+                valid = np.isfinite(scaled)
+                pair_indices = np.nonzero(valid)[0]
+                values = values[valid]
+                scaled = scaled[valid]
+                inexact = (np.abs(scaled) >= FLOAT_KEY_LIMIT) | \
+                    (np.abs(scaled - np.round(scaled)) < KEY_TOLERANCE * np.maximum(np.abs(scaled), key_factor))
+            keys = np.trunc(np.where(inexact, 0, scaled)).astype(np.int64)  # same as int(value * key_factor)
+            exact_values = {}  # index in keys -> mpf value, for keys that float64 isn't precise enough for
+            for i in np.nonzero(inexact)[0]:
+                iter_index, cached_index = divmod(pair_indices[i], n_cached)
+                paired = (cached_int_series[cached_index], block_series[iter_index])
+                value = self._exact_gcf_value(*(paired if not cache_bn else paired[::-1]))
+                key = int(value * key_factor)
+                exact_values[i] = value
+                keys[i] = key if abs(key) < MAX_KEY else MAX_KEY
+            canonical_keys = None
+            for table_results, hash_table, table_keys in zip(results, self.hash_tables, lhs_keys):
+                if hash_table.canonical:  # key of the fractional part, see LHSHashTable.canonical_key
+                    if canonical_keys is None:
+                        with np.errstate(invalid='ignore'):
+                            canonical_keys = np.trunc((values - np.floor(values)) * key_factor).astype(np.int64)
+                        for i, value in exact_values.items():
+                            canonical_keys[i] = LHSHashTable.canonical_key(value, key_factor)
+                    block_keys = canonical_keys
+                else:
+                    block_keys = keys
+                if len(table_keys) == 0:
+                    continue
+                # merge-join of the sorted block keys with the sorted table keys
+                order = np.argsort(block_keys, kind='stable')
+                sorted_keys = block_keys[order]
+                positions = np.minimum(np.searchsorted(table_keys, sorted_keys), len(table_keys) - 1)
+                for i in order[table_keys[positions] == sorted_keys]:
+                    iter_coef = block_coefs[pair_indices[i] // n_cached]
+                    cached_coef = cached_coefs[pair_indices[i] % n_cached]
+                    an_coef, bn_coef = (cached_coef, iter_coef) if not cache_bn else (iter_coef, cached_coef)
+                    table_results.append(Match(int(block_keys[i]), an_coef, bn_coef))
+
+        cached_iter = iter(cached_iter)
+        while True:
+            cached_block = list(itertools.islice(cached_iter, cached_block_length))
+            if not cached_block:
+                break
+            cached_coefs, cached_int_series, cached_series = self.__create_series_array(cached_block, cached_generator)
+            n_cached = len(cached_coefs)
+            if n_cached == 0:  # all of the series of the block were filtered out
+                continue
+            coefs_per_block = max(block_size // n_cached, 1)
+            block_coefs = []
+            block_series = []
+            for coef in get_iter_coefs():
+                series = iter_generator(coef, g_N_initial_search_terms)
+                if 0 in series[1:]:  # a_0 is allowed to be 0.
+                    continue
+                block_coefs.append(coef)
+                block_series.append(series)
+                if len(block_coefs) == coefs_per_block:
+                    join_block(block_coefs, block_series)
+                    counter += len(block_coefs) * n_cached
+                    block_coefs = []
+                    block_series = []
+                    if print_results:
+                        print(f"passed {counter} permutations. found so far {sum(len(r) for r in results)} results")
+            if block_coefs:
+                join_block(block_coefs, block_series)
+                counter += len(block_coefs) * n_cached
+
+        if print_results:
+            print(f'created results after {time() - start}s')
+        return results if self.multi_constant else results[0]
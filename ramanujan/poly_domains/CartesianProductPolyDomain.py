@@ -1,5 +1,5 @@
 from .AbstractPolyDomains import AbstractPolyDomains
-from ..utils.utils import iter_series_items_from_compact_poly
+from ..utils.utils import iter_series_items_from_compact_poly, get_poly_deg_and_leading_coef
 from itertools import product
 
 
@@ -65,6 +65,22 @@ class CartesianProductPolyDomain(AbstractPolyDomains):
 		return iter_series_items_from_compact_poly, \
 			iter_series_items_from_compact_poly
 
+	@staticmethod
+	def get_poly_an_degree(an_coefs):
+		return get_poly_deg_and_leading_coef(an_coefs)[0]
+
+	@staticmethod
+	def get_poly_bn_degree(bn_coefs):
+		return get_poly_deg_and_leading_coef(bn_coefs)[0]
+
+	@staticmethod
+	def get_poly_an_lead_coef(an_coefs):
+		return get_poly_deg_and_leading_coef(an_coefs)[1]
+
+	@staticmethod
+	def get_poly_bn_lead_coef(bn_coefs):
+		return get_poly_deg_and_leading_coef(bn_coefs)[1]
+
 	def dump_domain_ranges(self):
 		an_domain = CartesianProductPolyDomain.expand_coef_range_to_full_domain(self.a_coef_range)
 		bn_domain = CartesianProductPolyDomain.expand_coef_range_to_full_domain(self.b_coef_range)
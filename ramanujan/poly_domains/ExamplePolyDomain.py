@@ -45,3 +45,20 @@ class ExampleDomain(CartesianProductPolyDomain):
                 yield coefs[0] * (i ** 4)
 
         return an_iterator, bn_iterator
+
+    @staticmethod
+    def get_poly_an_degree(an_coefs):
+        # a(n) = 2 * c_0 * n^2 + 2 * c_0 * n + c_0 + c_1
+        return 2 if an_coefs[0] != 0 else 0
+
+    @staticmethod
+    def get_poly_bn_degree(bn_coefs):
+        return 4
+
+    @staticmethod
+    def get_poly_an_lead_coef(an_coefs):
+        return 2 * an_coefs[0] if an_coefs[0] != 0 else an_coefs[1]
+
+    @staticmethod
+    def get_poly_bn_lead_coef(bn_coefs):
+        return bn_coefs[0]
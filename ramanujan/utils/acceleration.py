@@ -0,0 +1,103 @@
+import math
+import mpmath
+from ramanujan.utils.mobius import GCFEvaluation
+from ramanujan.utils.utils import agreeing_digits
+from ramanujan.constants import g_N_richardson_nodes
+
+"""
+Convergence accelerators for the convergents of a GCF, used to compute hash keys of GCFs that converge too slowly for
+the number of terms of the first enumeration (see EfficientGCFEnumerator).
+    wynn - Wynn's epsilon algorithm over the last few convergents. fits geometric and alternating convergence, so it
+        finds GCFs that converge geometrically but slowly. their hits are certified by the regular evaluation.
+    richardson - polynomial extrapolation in 1/n to 1/n = 0 over all of the convergents. fits convergence like
+        c_1/n + c_2/n^2 + ..., so it finds GCFs of the sub-exponential class (see convergence_rate.predict_convergence).
+        their hits are certified by richardson_evaluation.
+"""
+
+ACCELERATORS = ['wynn', 'richardson']
+
+
+def wynn_epsilon(values):
+    """
+    :param values: mpf values of consecutive elements of a sequence.
+    :return: estimate of the limit of the sequence (the even column of the epsilon table furthest from values).
+    """
+    prev_column = [mpmath.mpf(0)] * (len(values) + 1)
+    column = list(values)
+    best = column[-1]
+    for k in range(1, len(values)):
+        diffs = [column[i + 1] - column[i] for i in range(len(column) - 1)]
+        if any(d == 0 for d in diffs):  # the sequence converged, nothing to accelerate
+            return best
+        prev_column, column = column, [prev_column[i + 1] + 1 / diffs[i] for i in range(len(diffs))]
+        if k % 2 == 0:
+            best = column[-1]
+    return best
+
+
+def richardson_extrapolation(values, indices):
+    """
+    :param values: mpf values of elements of a sequence.
+    :param indices: distinct indices of the values in the sequence (n).
+    :return: value at 1/n = 0 of the polynomial in 1/n through the given values. its lagrange weights there are
+        n_i^(k-1) / prod(n_i - n_j) for k values, so they're calculated exactly with integers.
+    """
+    power = len(indices) - 1
+    result = mpmath.mpf(0)
+    for i, (value, n) in enumerate(zip(values, indices)):
+        denominator = math.prod(n - m for j, m in enumerate(indices) if j != i)
+        result += value * n ** power / denominator
+    return result
+
+
+def accelerate(accelerator, values, indices):
+    """
+    :param accelerator: 'wynn' or 'richardson'.
+    :param values: mpf values of consecutive convergents.
+    :param indices: index of each convergent.
+    :return: estimate of the limit.
+    """
+    if accelerator == 'wynn':
+        return wynn_epsilon(values)
+    if accelerator == 'richardson':
+        return richardson_extrapolation(values, indices)
+    raise ValueError(f'unknown accelerator {accelerator}, use one of {ACCELERATORS}')
+
+
+def richardson_evaluation(create_series, digits, max_terms, min_terms=64):
+    """
+    evaluate a GCF that converges like c_1/n + c_2/n^2 + ... by richardson_extrapolation of its convergents, at up to
+    g_N_richardson_nodes evenly spaced depths. the depth is doubled until the extrapolations over all of these
+    convergents and over every other one agree on the required digits, or max_terms is reached.
+    the extrapolation loses about a digit per convergent, so it's calculated with that many more digits.
+    :param create_series: function of n, returns the first n items of the an and bn series (as used by EfficientGCF).
+    :param digits: number of significant digits required.
+    :param max_terms: maximal number of terms to use.
+    :param min_terms: (optional) number of terms to start with.
+    :return: GCFEvaluation of the value (mpf in working precision), number of terms used, and the digits the
+        extrapolations agree on.
+    """
+    depth = min(min_terms, max_terms)
+    while True:
+        a_, b_ = create_series(depth)
+        step = max(depth // g_N_richardson_nodes, 1)
+        nodes = list(range(depth - 1 - step * (min(depth - 1, g_N_richardson_nodes) - 1), depth, step))
+        convergents = []
+        prev_q, q, prev_p, p = 0, 1, 1, a_[0]
+        for i in range(1, depth):
+            q, prev_q = a_[i] * q + b_[i] * prev_q, q
+            p, prev_p = a_[i] * p + b_[i] * prev_p, p
+            if i == nodes[len(convergents)]:
+                if q == 0:
+                    return GCFEvaluation(mpmath.mpf(0), depth, 0)
+                convergents.append((p, q))
+        with mpmath.workdps(mpmath.mp.dps + len(nodes)):
+            values = [mpmath.mpf(p) / mpmath.mpf(q) for p, q in convergents]
+            value = richardson_extrapolation(values, nodes)
+            # every other convergent, up to the last one
+            first = (len(values) + 1) % 2
+            other_value = richardson_extrapolation(values[first::2], nodes[first::2])
+            certified = agreeing_digits(value, other_value)
+        if certified >= digits or depth >= max_terms:
+            return GCFEvaluation(+value, depth, certified)
+        depth = min(depth * 2, max_terms)
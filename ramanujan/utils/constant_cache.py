@@ -0,0 +1,139 @@
+import os
+import re
+import pickle
+import hashlib
+import tempfile
+import mpmath
+from sympy import lambdify
+from ramanujan.constants import g_const_dict
+
+"""
+High precision values of constants (zeta(3), catalan, pi*acosh(2), ...) are needed again and again in the refine and
+verify stages, at 2000-4000 digits. This file holds a cache that keeps the most precise value computed so far for each
+constant, in memory and on disk, so it is computed once across runs and processes. Lower precisions are served by
+rounding the cached value.
+Values are kept on disk only if RAMANUJAN_CONSTANT_CACHE (environment variable) or set_constant_cache_directory gives a
+directory. a file per constant, named by its g_const_dict name, holds its most precise value and that precision.
+"""
+
+GUARD_BITS = 32  # values are computed with a few extra bits, so rounding them down is exact.
+
+
+class ConstantCache(object):
+
+    def __init__(self, directory=None):
+        """
+        :param directory: (opt) directory of the cached values. if None, values are only cached in memory.
+        """
+        self.directory = directory
+        self.values = {}  # {key: (prec, mpf)}
+
+    def get(self, key, generator):
+        """
+        Get the value of a constant in the working precision.
+        :param key: name of the constant (see constant_key).
+        :param generator: function that computes the constant in the working precision.
+        :return: mpf in the working precision.
+        """
+        prec = mpmath.mp.prec
+        cached = self.values.get(key)
+        if cached is None or cached[0] < prec:
+            loaded = self.__load(key)  # another process might have computed it
+            if loaded is not None and (cached is None or loaded[0] > cached[0]):
+                cached = loaded
+        if cached is None or cached[0] < prec:
+            with mpmath.workprec(prec + GUARD_BITS):
+                cached = (prec, mpmath.mpf(generator()))
+            self.__save(key, cached)
+        self.values[key] = cached
+        return +cached[1]  # unary plus rounds to the working precision
+
+    def __path(self, key):
+        safe = re.sub(r'[^\w.-]', '_', key)[:64]
+        return os.path.join(self.directory, '{}-{}.mpf'.format(safe, hashlib.sha1(key.encode()).hexdigest()[:10]))
+
+    def __load(self, key):
+        if self.directory is None:
+            return None
+        return self.__load_file(self.__path(key))
+
+    @staticmethod
+    def __load_file(path):
+        try:
+            with open(path, 'rb') as f:
+                prec, man, exp = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+        with mpmath.workprec(prec + GUARD_BITS):  # mpf rounds to the working precision
+            return prec, mpmath.mpf((man, exp))
+
+    def __save(self, key, cached):
+        if self.directory is None:
+            return
+        prec, value = cached
+        man, exp = value.man_exp
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile('wb', dir=self.directory, delete=False) as f:
+                pickle.dump((prec, int(man), int(exp)), f)
+            stored = self.__load_file(self.__path(key))
+            if stored is not None and stored[0] >= prec:  # another process saved a more precise value meanwhile
+                os.remove(f.name)
+                return
+            os.replace(f.name, self.__path(key))  # atomic, readers see either the old value or the new one
+        except OSError:
+            pass  # the cache is an optimization only
+
+
+g_constant_cache = ConstantCache(os.environ.get('RAMANUJAN_CONSTANT_CACHE') or None)
+
+
+def set_constant_cache_directory(directory):
+    """
+    :param directory: directory for the cached values of constants. None keeps them in memory only.
+    """
+    global g_constant_cache
+    g_constant_cache = ConstantCache(directory)
+
+
+def constant_key(sym_constant):
+    """
+    :param sym_constant: sympy constant.
+    :return: name of the constant in g_const_dict ('zeta_3' for zeta(3)), or its str if it isn't there.
+    """
+    if getattr(sym_constant, 'func', None) == g_const_dict['zeta']:
+        return 'zeta_{}'.format(sym_constant.args[0])
+    for name, value in g_const_dict.items():
+        if value == sym_constant:
+            return name
+    return str(sym_constant)
+
+
+class CachedConstant(object):
+    """
+    A generator of the mpf value of a sympy constant in the working precision, served from the constants cache.
+    Can be pickled (e.g. sent to worker processes).
+    """
+
+    def __init__(self, sym_constant):
+        self.sym_constant = sym_constant
+        self.key = constant_key(sym_constant)
+        self.__generator = None
+
+    def __getstate__(self):
+        # lambdified functions can't be pickled, it is created again when needed.
+        return {'sym_constant': self.sym_constant, 'key': self.key}
+
+    def __setstate__(self, state):
+        self.__init__(state['sym_constant'])
+
+    def __generate(self):
+        if self.__generator is None:
+            try:
+                self.__generator = lambdify((), self.sym_constant, modules="mpmath")
+            except AttributeError:  # Hackish constant
+                self.__generator = self.sym_constant.mpf_val
+        return self.__generator()
+
+    def __call__(self):
+        return g_constant_cache.get(self.key, self.__generate)
@@ -1,5 +1,7 @@
+import math
 import matplotlib.pyplot as plt
 import mpmath
+import numpy as np
 from mpmath import mpf as dec
 from ramanujan.utils.mobius import GeneralizedContinuedFraction
 
@@ -34,3 +36,138 @@ def calculate_convergence(gcf: GeneralizedContinuedFraction, reference, plot=Fal
         plt.show()
     log_slope = 2 * (log_diff[length-1] - log_diff[length//2]) / length
     return -log_slope
+
+
+def estimate_convergence(gcf: GeneralizedContinuedFraction, n_terms=200):
+    """
+    estimate the convergence rate of General Continued Fraction without a reference value.
+    uses the distance between consecutive convergents, which has the closed form:
+    |p_n / q_n - p_(n-1) / q_(n-1)| = |b_0 * ... * b_(n-1)| / |q_n * q_(n-1)|
+    so only the denominators are calculated, and the logarithm is taken from the bit length of the integers instead of
+    dividing big numbers in high precision. only the last two denominators are kept.
+    the result is the average number of decimal digits per term, sampled at the same indices as calculate_convergence.
+    :param gcf: General Continued Fraction to estimate.
+    :param n_terms: (optional) maximal number of terms to use.
+    :return: estimated number of digits per term (float). inf if the GCF is finite.
+    """
+    length = min(n_terms, len(gcf.b_), len(gcf.a_))
+    samples = [length // 2, length - 1]
+    log2_diffs = []
+    prev_q, q = 0, 1
+    log2_b_prod = 0.0
+    for i in range(1, length):
+        if gcf.b_[i - 1] == 0:  # the GCF is a finite fraction
+            return math.inf
+        prev_q, q = q, gcf.a_[i] * q + gcf.b_[i - 1] * prev_q
+        log2_b_prod += math.log2(abs(gcf.b_[i - 1]))
+        # postpone the sample if a convergent is undefined
+        if i >= samples[len(log2_diffs)] and q != 0 and prev_q != 0:
+            # math.log2 of an int is taken from its bit length and leading bits, not by a big division
+            log2_diffs.append(log2_b_prod - math.log2(abs(q)) - math.log2(abs(prev_q)))
+            samples[len(log2_diffs) - 1] = i
+            if len(log2_diffs) == len(samples):
+                break
+    if len(log2_diffs) < len(samples) or samples[1] == samples[0]:
+        return 0.0
+    return -(log2_diffs[1] - log2_diffs[0]) * math.log10(2) / (samples[1] - samples[0])
+
+
+def estimate_convergence_batch(gcfs, n_terms=200):
+    """
+    estimate the convergence rates of many General Continued Fractions at once (see estimate_convergence).
+    GCFs of the same length are calculated together, a term at a time, in float64 arrays: the denominators are
+    normalized on every step, and the base 2 logarithm of the normalization is accumulated instead of keeping big
+    integers. all of them are sampled at the same indices.
+    GCFs that can't be calculated this way (a denominator too close to 0 at a sample index, terms that don't fit
+    float64, or too short) are estimated one by one by estimate_convergence.
+    :param gcfs: iterable of General Continued Fractions.
+    :param n_terms: (optional) maximal number of terms to use.
+    :return: list of estimated number of digits per term.
+    """
+    gcfs = list(gcfs)
+    rates = [None] * len(gcfs)
+    by_length = {}
+    for i, gcf in enumerate(gcfs):
+        by_length.setdefault(min(n_terms, len(gcf.b_), len(gcf.a_)), []).append(i)
+    for length, indices in by_length.items():
+        if length < 4:
+            continue
+        try:
+            a_ = np.array([gcfs[i].a_[:length] for i in indices], dtype=np.float64)
+            b_ = np.array([gcfs[i].b_[:length - 1] for i in indices], dtype=np.float64)
+        except (OverflowError, TypeError, ValueError):
+            continue
+        with np.errstate(divide='ignore'):
+            log2_b_prods = np.cumsum(np.log2(np.abs(b_)), axis=1)
+        samples = [length // 2, length - 1]
+        log2_diffs = []
+        valid = np.all(b_ != 0, axis=1) & np.all(np.isfinite(a_), axis=1) & np.all(np.isfinite(b_), axis=1)
+        prev_q, q = np.zeros(len(indices)), np.ones(len(indices))
+        log2_scale = np.zeros(len(indices))  # q and prev_q are stored divided by 2^log2_scale
+        with np.errstate(all='ignore'):
+            for i in range(1, length):
+                prev_q, q = q, a_[:, i] * q + b_[:, i - 1] * prev_q
+                scale = np.maximum(np.abs(q), np.abs(prev_q))
+                scale[scale == 0] = 1
+                q /= scale
+                prev_q /= scale
+                log2_scale += np.log2(scale)
+                if i in samples:
+                    # the denominators are normalized, so the smaller one is relative to the larger one (which is 1)
+                    valid &= (np.abs(q) > 1e-8) & (np.abs(prev_q) > 1e-8)
+                    log2_diffs.append(log2_b_prods[:, i - 1] - np.log2(np.abs(q)) - np.log2(np.abs(prev_q)) -
+                                      2 * log2_scale)
+            batch_rates = -(log2_diffs[1] - log2_diffs[0]) * math.log10(2) / (samples[1] - samples[0])
+        for i, rate, is_valid in zip(indices, batch_rates, valid & np.isfinite(batch_rates)):
+            if is_valid:
+                rates[i] = float(rate)
+    return [rate if rate is not None else estimate_convergence(gcf, n_terms) for gcf, rate in zip(gcfs, rates)]
+
+
+SUPER_EXPONENTIAL = 'super exponential'
+EXPONENTIAL = 'exponential'
+SUB_EXPONENTIAL = 'sub exponential'
+
+
+def predict_convergence(a_deg, a_lead, b_deg, b_lead):
+    """
+    predict the convergence class of a polynomial GCF from the degrees and leading coefficients of a_n and b_n (the
+    conditions printed by utils.plot_gcf_convergens).
+    for a_n ~ A * n^d and b_n ~ B * n^(2d), the convergents differ like (l_2 / l_1)^n, where l_1, l_2 are the roots of
+    x^2 = A * x + B. so the rate is exponential only if A^2 + 4B > 0.
+    :return: convergence class, and the estimated number of digits per term (None if it doesn't depend on n linearly).
+    """
+    if a_lead == 0 or b_lead == 0:  # degenerate polynomials, nothing to predict from
+        return SUB_EXPONENTIAL, None
+    if 2 * a_deg > b_deg:
+        return SUPER_EXPONENTIAL, None
+    if 2 * a_deg < b_deg:
+        return SUB_EXPONENTIAL, None
+    discriminant = a_lead ** 2 + 4 * b_lead
+    if discriminant <= 0:  # roots of equal magnitude
+        return SUB_EXPONENTIAL, None
+    root = math.sqrt(discriminant)
+    return EXPONENTIAL, math.log10((abs(a_lead) + root) / abs(abs(a_lead) - root))
+
+
+def plan_search_depth(a_deg, a_lead, b_deg, b_lead, digits, max_depth):
+    """
+    estimate the number of terms a polynomial GCF needs for its value to settle on the given number of digits (see
+    predict_convergence). super exponential GCFs settle when the convergents difference, which is about
+    (B / A^2)^n / (n!)^(2 * a_deg - b_deg), is small enough. this ignores the lower coefficients, so it's only an
+    estimate, and the convergents should still be checked from this depth on (see EfficientGCFEnumerator).
+    :param digits: number of digits after the decimal point.
+    :param max_depth: maximal number of terms, used for GCFs that converge too slowly.
+    :return: convergence class, and number of terms.
+    """
+    convergence_class, digits_per_term = predict_convergence(a_deg, a_lead, b_deg, b_lead)
+    if convergence_class == EXPONENTIAL:
+        return convergence_class, min(math.ceil(digits / digits_per_term) + 1, max_depth)
+    if convergence_class == SUPER_EXPONENTIAL:
+        log_ratio = math.log10(abs(b_lead) / a_lead ** 2)
+        log_diff = 0.0
+        for n in range(1, max_depth):
+            log_diff += log_ratio - (2 * a_deg - b_deg) * math.log10(n)
+            if log_diff < -digits:
+                return convergence_class, n + 1
+    return convergence_class, max_depth
@@ -0,0 +1,134 @@
+import math
+import mpmath
+from ramanujan.utils.mobius import find_transform_pslq
+
+"""
+Many discovered results are Mobius transforms of each other, i.e. their values x, y satisfy y = (ax + b) / (cx + d)
+with integer a, b, c, d.
+If ad - bc = +-1, this happens iff the simple continued fractions of x and y are equal from some term on (up to a shift
+of the index), so the tail of the simple continued fraction is a canonical form of the class. Since the shift is
+unknown, a value is fingerprinted by all the windows of its tail that are a local minimum of a hash among their
+neighbours (winnowing). Such windows depend only on the tail itself, so equivalent values share fingerprints, and
+classes are found with a hash index instead of comparing all pairs.
+Any other transform is such a transform applied on (ax + b) / d, with ad = |det| and 0 <= b < d (Hermite normal form).
+so these are fingerprinted as well, for determinants up to a bound.
+"""
+
+DEFAULT_WINDOW = 12  # consecutive terms in a fingerprint. long enough so unrelated values rarely share one.
+DEFAULT_RADIUS = 4  # a window is a fingerprint if its hash is minimal among the windows this close to it.
+DEFAULT_SKIP = 6  # leading terms that are ignored, a transform with small coefficients changes only a short prefix.
+DEFAULT_MAX_DET = 16  # largest determinant of transforms between grouped values.
+
+
+def _value_to_rational(value, digits):
+    with mpmath.workdps(digits):
+        man, exp = (+mpmath.mpf(value)).man_exp
+    return (int(man) << exp, 1) if exp >= 0 else (int(man), 1 << -exp)
+
+
+def _rational_scf(numerator, denominator, digits):
+    # the n'th term is determined if q_n ** 2 is smaller than 10 ** digits
+    limit = 10 ** (digits // 2)
+    terms = []
+    prev_q, q = 0, 1
+    while denominator != 0:
+        term, remainder = divmod(numerator, denominator)
+        prev_q, q = q, term * q + prev_q
+        if q > limit:
+            break
+        terms.append(term)
+        numerator, denominator = denominator, remainder
+    return terms
+
+
+def certified_scf(value, digits):
+    """
+    simple continued fraction terms of a value, only as far as they are determined by its first digits.
+    the expansion is calculated exactly (by Euclid's algorithm) on the binary representation of the value.
+    :param value: mpf value.
+    :param digits: number of accurate digits of the value.
+    :return: list of terms.
+    """
+    return _rational_scf(*_value_to_rational(value, digits), digits)
+
+
+def _winnow(terms, window, radius, skip):
+    terms = terms[skip:]
+    hashes = [hash(tuple(terms[i:i + window])) for i in range(len(terms) - window + 1)]
+    # windows near the ends don't have all their neighbours, so whether they are minimal depends on the truncation
+    return set(hashes[i] for i in range(radius, len(hashes) - radius)
+               if hashes[i] == min(hashes[i - radius:i + radius + 1]))
+
+
+def mobius_fingerprints(value, digits, window=DEFAULT_WINDOW, radius=DEFAULT_RADIUS, skip=DEFAULT_SKIP):
+    """
+    fingerprints of the class of a value under integer mobius transforms of determinant +-1 (see the top of this file).
+    :param value: mpf value.
+    :param digits: number of accurate digits of the value.
+    :param window: (optional) number of consecutive terms in a fingerprint.
+    :param radius: (optional) winnowing radius.
+    :param skip: (optional) number of leading terms to ignore.
+    :return: set of fingerprints. empty for rational values, or when there aren't enough digits.
+    """
+    return _winnow(certified_scf(value, digits), window, radius, skip)
+
+
+def hermite_transforms(max_det):
+    """
+    :param max_det: largest determinant.
+    :return: list of (a, b, d) of the transforms (ax + b) / d, with 1 < ad <= max_det and 0 <= b < d.
+    """
+    return [(det // d, b, d) for det in range(2, max_det + 1) for d in range(1, det + 1) if det % d == 0
+            for b in range(d)]
+
+
+def group_by_equivalence(items, values, digits, max_det=DEFAULT_MAX_DET, limit=None):
+    """
+    group items into classes of values that are mobius transforms of each other.
+    :param items: results to group.
+    :param values: mpf value of each item.
+    :param digits: number of accurate digits of the values.
+    :param max_det: (optional) largest absolute determinant of the transforms looked for.
+    :param limit: (optional) if given, a class is only joined if a transform with coefficients up to limit is found
+                  between the value and the class representative (see mobius.find_transform_pslq).
+    :return: list of classes, each a list of items. the first item of a class is its representative.
+             classes and items keep the order of the given items.
+    """
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            return
+        representative, member = min(root_i, root_j), max(root_i, root_j)
+        if limit is not None:
+            with mpmath.workdps(digits):
+                if find_transform_pslq(values[representative], values[member], limit) is None:
+                    return
+        parent[member] = representative
+
+    rationals = [_value_to_rational(value, digits) for value in values]
+    index = {}
+    for i, (numerator, denominator) in enumerate(rationals):
+        for fingerprint in _winnow(_rational_scf(numerator, denominator, digits), DEFAULT_WINDOW, DEFAULT_RADIUS,
+                                   DEFAULT_SKIP):
+            union(i, index.setdefault(fingerprint, i))
+    # the transformed value loses up to log10(det) digits
+    transformed_digits = digits - 2 * int(math.log10(max(max_det, 1)) + 1)
+    for a, b, d in hermite_transforms(max_det):
+        for i, (numerator, denominator) in enumerate(rationals):
+            terms = _rational_scf(a * numerator + b * denominator, d * denominator, transformed_digits)
+            for fingerprint in _winnow(terms, DEFAULT_WINDOW, DEFAULT_RADIUS, DEFAULT_SKIP):
+                if fingerprint in index:
+                    union(i, index[fingerprint])
+
+    classes = {}
+    for i, item in enumerate(items):
+        classes.setdefault(find(i), []).append(item)
+    return [classes[root] for root in sorted(classes)]
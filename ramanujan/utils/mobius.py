@@ -1,13 +1,20 @@
+import math
+import multiprocessing
 import numpy as np
+from collections import namedtuple
 from math import gcd, floor, ceil
 from mpmath import mpf as dec
 import mpmath
+from mpmath.libmp import MPZ
 from sympy import Symbol, pprint
-from ortools.linear_solver.pywraplp import Solver
 
 
 class MobiusTransform(object):
-    def __init__(self, arr=np.eye(2, dtype=object)):
+    __slots__ = ('a', 'b', 'c', 'd', '_normalize_bits')
+
+    NORMALIZE_BITS = 256  # coefficients are normalized lazily, once they grew by this many bits since last time.
+
+    def __init__(self, arr=None):
         """
             This class represents a Mobius Transform stored as:
             ( a b )
@@ -15,9 +22,38 @@ class MobiusTransform(object):
             matrix.
             applying this transform onto x will result in:
             (ax + b) / (cx + d)
+            The coefficients are kept as four python ints. Since a transform is only defined up to a scalar,
+            multiplications don't normalize the coefficients, unless they grew too large (see NORMALIZE_BITS).
+        :param arr: (optional) 2x2 array of coefficients. default is the identity transform.
         """
         super().__init__()
-        self.data = arr
+        if arr is None:
+            self.a, self.b, self.c, self.d = 1, 0, 0, 1
+        else:
+            self.data = arr
+        self._normalize_bits = self.NORMALIZE_BITS
+
+    @classmethod
+    def from_values(cls, a, b, c, d):
+        """
+        create a transform without going through an array.
+        :return: MobiusTransform of (ax + b) / (cx + d)
+        """
+        tmp = cls.__new__(cls)
+        tmp.a, tmp.b, tmp.c, tmp.d = a, b, c, d
+        tmp._normalize_bits = cls.NORMALIZE_BITS
+        return tmp
+
+    @property
+    def data(self):
+        """
+        :return: coefficients as a 2x2 object array (a copy, changing it does not affect the transform).
+        """
+        return np.array([[self.a, self.b], [self.c, self.d]], dtype=object)
+
+    @data.setter
+    def data(self, arr):
+        self.a, self.b, self.c, self.d = int(arr[0][0]), int(arr[0][1]), int(arr[1][0]), int(arr[1][1])
 
     def __str__(self) -> str:
         return str(self.data)
@@ -45,8 +81,10 @@ class MobiusTransform(object):
         :param other: MobiusTransform object to multiply with (multiply on right)
         :return: result MobiusTransform
         """
-        tmp = MobiusTransform(np.matmul(self.data, other.data))
-        tmp.normalize()
+        a, b, c, d = self.a, self.b, self.c, self.d
+        tmp = MobiusTransform.from_values(a * other.a + b * other.c, a * other.b + b * other.d,
+                                          c * other.a + d * other.c, c * other.b + d * other.d)
+        tmp._lazy_normalize()
         return tmp
 
     def __imul__(self, other):
@@ -55,8 +93,23 @@ class MobiusTransform(object):
         :param other: mobius transform
         :return: self
         """
-        self.data = np.matmul(self.data, other.data)
-        self.normalize()
+        a, b, c, d = self.a, self.b, self.c, self.d
+        self.a, self.b = a * other.a + b * other.c, a * other.b + b * other.d
+        self.c, self.d = c * other.a + d * other.c, c * other.b + d * other.d
+        self._lazy_normalize()
+        return self
+
+    def compose_gcf_step(self, b_i, a_i):
+        """
+        self = [self] o [[0, b_i], [1, a_i]] in place. this is a single step of a GCF (see GeneralizedContinuedFraction)
+        :param b_i: numerator of the step.
+        :param a_i: denominator of the step.
+        :return: self
+        """
+        a, c = self.a, self.c
+        self.a, self.b = self.b, a * b_i + self.b * a_i
+        self.c, self.d = self.d, c * b_i + self.d * a_i
+        self._lazy_normalize()
         return self
 
     def __call__(self, x=None):
@@ -82,19 +135,21 @@ class MobiusTransform(object):
         """
         if not isinstance(other, MobiusTransform):
             raise TypeError("Comparision of wrong types")
-        if np.array_equal(self.data, other.data):
-            return True
-        else:
-            return False
+        return self.__normalized_values() == other.__normalized_values()
 
     def normalize(self):
         """
-        to be called after every operation. this should prevent coefficients from exploding.
+        divide the coefficients by their gcd. this should prevent coefficients from exploding.
         """
-        a, b, c, d = self.__values()
-        divider = gcd(gcd(a, b), gcd(c, d))
-        if divider != 1:
-            self.data //= divider
+        self.a, self.b, self.c, self.d = self.__normalized_values()
+        self._normalize_bits = self.__bit_length() + self.NORMALIZE_BITS
+
+    def _lazy_normalize(self):
+        """
+        normalize only if coefficients grew by NORMALIZE_BITS since the last normalization.
+        """
+        if self.__bit_length() > self._normalize_bits:
+            self.normalize()
 
     def reciprocal(self):
         """
@@ -102,8 +157,7 @@ class MobiusTransform(object):
         :return: a reciprocal transform
         """
         a, b, c, d = self.__values()
-        tmp = MobiusTransform(np.array([[c, d], [a, b]], dtype=object))
-        return tmp
+        return MobiusTransform.from_values(c, d, a, b)
 
     def inverse(self):
         """
@@ -111,12 +165,50 @@ class MobiusTransform(object):
         """
         a, b, c, d = self.__values()
         det = a * d - b * c
-        tmp = MobiusTransform(det * np.array([[d, -b], [-c, a]], dtype=object))
+        tmp = MobiusTransform.from_values(det * d, -det * b, -det * c, det * a)
         tmp.normalize()
         return tmp
 
     def __values(self):
-        return self.data[0, 0], self.data[0, 1], self.data[1, 0], self.data[1, 1]
+        return self.a, self.b, self.c, self.d
+
+    def __normalized_values(self):
+        a, b, c, d = self.__values()
+        divider = gcd(gcd(a, b), gcd(c, d))
+        if divider > 1:
+            return a // divider, b // divider, c // divider, d // divider
+        return a, b, c, d
+
+    def __bit_length(self):
+        return (abs(self.a) | abs(self.b) | abs(self.c) | abs(self.d)).bit_length()
+
+
+BINARY_SPLITTING_MIN_TERMS = 128  # shorter products are faster to multiply from left to right.
+_PRODUCT_TREE_LEAF = 16
+
+
+def matrix_product_tree(matrices, lo=0, hi=None):
+    """
+    multiply a sequence of 2x2 integer matrices with binary splitting.
+    multiplying from left to right multiplies a huge number by a small one on every step, which is O(n^2) in total.
+    a product tree multiplies numbers of similar sizes, so fast big int multiplication (gmpy if installed) pays off.
+    :param matrices: sequence of (a, b, c, d) tuples, each one is the matrix [[a, b], [c, d]].
+    :param lo: (optional) index of the first matrix to multiply.
+    :param hi: (optional) index after the last matrix to multiply.
+    :return: (a, b, c, d) of the product matrices[lo] * ... * matrices[hi - 1].
+    """
+    if hi is None:
+        hi = len(matrices)
+    if hi - lo <= _PRODUCT_TREE_LEAF:
+        a, b, c, d = MPZ(1), MPZ(0), MPZ(0), MPZ(1)
+        for i in range(lo, hi):
+            e, f, g, h = matrices[i]
+            a, b, c, d = a * e + b * g, a * f + b * h, c * e + d * g, c * f + d * h
+        return a, b, c, d
+    mid = (lo + hi) // 2
+    a, b, c, d = matrix_product_tree(matrices, lo, mid)
+    e, f, g, h = matrix_product_tree(matrices, mid, hi)
+    return a * e + b * g, a * f + b * h, c * e + d * g, c * f + d * h
 
 
 class GeneralizedContinuedFraction(object):
@@ -154,9 +246,13 @@ class GeneralizedContinuedFraction(object):
         """
         self.a_ = (self.a_ + a_).copy()
         self.b_ = (self.b_ + b_).copy()
-        for i in range(min(len(a_) - 1, len(b_))):
-            mat = np.array([[0, b_[i]], [1, a_[i + 1]]], dtype=object)
-            self.mobius *= MobiusTransform(mat)
+        n = min(len(a_) - 1, len(b_))
+        if n >= BINARY_SPLITTING_MIN_TERMS:
+            product = matrix_product_tree([(0, b_[i], 1, a_[i + 1]) for i in range(n)])
+            self.mobius *= MobiusTransform.from_values(*product)
+            return
+        for i in range(n):
+            self.mobius.compose_gcf_step(b_[i], a_[i + 1])
 
     def __len__(self, item):
         return len(self.a_)
@@ -196,16 +292,16 @@ class GeneralizedContinuedFraction(object):
         """
         const = const_gen()  # could be useful to have better precision along the way
         a_ = [floor(const) if b_[0] > 0 else ceil(const)]
-        k = MobiusTransform(np.array([[1, -a_[0]], [0, 1]]))  # x = x - a[0]
+        k = MobiusTransform.from_values(1, -a_[0], 0, 1)  # x = x - a[0]
         for i in range(1, len(b_)):
-            k_rcp = MobiusTransform(np.array([[0, b_[i - 1]], [1, 0]], dtype=object)) * k  # 1) calculate floor(b[i]/x)
+            k_rcp = MobiusTransform.from_values(0, b_[i - 1], 1, 0) * k  # 1) calculate floor(b[i]/x)
             try:
                 rcp = k_rcp(const)  # 1) (**)
             except ZeroDivisionError:
                 print("Finished extraction sooner than expected. Rational input, or insufficient precision.")
                 raise ZeroDivisionError
             a_.append(floor(rcp) if b_[i] > 0 else ceil(rcp))  # 2) find a_i
-            next_transform = MobiusTransform(np.array([[0, b_[i-1]], [1, a_[i]]], dtype=object))  # 3) x = b[i]/x - a[i]
+            next_transform = MobiusTransform.from_values(0, b_[i-1], 1, a_[i])  # 3) x = b[i]/x - a[i]
             k = next_transform.inverse() * k
         return cls(a_, b_)
 
@@ -251,14 +347,21 @@ class SimpleContinuedFraction(GeneralizedContinuedFraction):
 
 
 class EfficientGCF(object):
-    def __init__(self, a_, b_):
+    def __init__(self, a_, b_, binary_splitting=None):
         """
         efficient calculation of general continued fraction - only build and evaluate.
         the calculation is done with the recursive formula of the gcf convergent.
         ref: https://en.wikipedia.org/wiki/Generalized_continued_fraction (switch names between a and b in ref)
         :param a_: an series
         :param b_: bn series
-        """
+        :param binary_splitting: (optional) evaluate the recursion as a product tree (see matrix_product_tree).
+                                 gives the exact same convergent. by default used for long series.
+        """
+        if binary_splitting is None:
+            binary_splitting = len(a_) >= BINARY_SPLITTING_MIN_TERMS
+        if binary_splitting:
+            self._product_tree_convergent(a_, b_)
+            return
         self.prev_A = 0
         self.A = 1
         self.prev_B = 1
@@ -272,12 +375,72 @@ class EfficientGCF(object):
             self.prev_A = tmp_a
             self.prev_B = tmp_b
 
+    def _product_tree_convergent(self, a_, b_):
+        # [[B_n, B_n-1], [A_n, A_n-1]] = [[a_0, 1], [1, 0]] * T_1 * ... * T_n, where T_i = [[a_i, 1], [b_i, 0]]
+        p00, p01, p10, p11 = matrix_product_tree([(a_[i], 1, b_[i], 0) for i in range(1, len(a_))])
+        self.A = p00
+        self.prev_A = p01
+        self.B = a_[0] * p00 + p10
+        self.prev_B = a_[0] * p01 + p11
+
     def evaluate(self):
         if self.A == 0:
             return dec(0)
         return dec(self.B) / dec(self.A)
 
 
+GCFEvaluation = namedtuple('GCFEvaluation', 'value depth digits')
+
+
+def evaluate_gcf_to_precision(create_series, digits, max_terms, min_terms=64):
+    """
+    evaluate a GCF with just enough terms for a required number of digits.
+    the number of terms is doubled until the error estimate certifies the digits, or max_terms is reached.
+    the distance between consecutive convergents is |b_1 * ... * b_n| / |A_n * A_n-1|. assuming it decays
+    geometrically with ratio r (estimated from the previous depth), the error of the n'th convergent is at most
+    distance * r / (1 - r).
+    terms are multiplied with a product tree, and added depths only multiply the previous product once.
+    :param create_series: function of n, returns the first n items of the an and bn series (as used by EfficientGCF).
+    :param digits: number of significant digits required.
+    :param max_terms: maximal number of terms to use.
+    :param min_terms: (optional) number of terms to start with.
+    :return: GCFEvaluation of the value (mpf in working precision), number of terms used, and certified digits.
+    """
+    p00, p01, p10, p11 = 1, 0, 0, 1
+    a0 = None
+    n_terms = 1
+    log2_b_prod = 0.0
+    prev_log2_diff = None
+    prev_n_terms = None
+    certified = 0
+    while True:
+        next_n_terms = min(max(n_terms * 2, min_terms), max_terms)
+        a_, b_ = create_series(next_n_terms)
+        a0 = a_[0]
+        e, f, g, h = matrix_product_tree([(a_[i], 1, b_[i], 0) for i in range(n_terms, next_n_terms)])
+        p00, p01, p10, p11 = p00 * e + p01 * g, p00 * f + p01 * h, p10 * e + p11 * g, p10 * f + p11 * h
+        if 0 in b_[n_terms:next_n_terms]:  # finite fraction, the convergent is exact.
+            n_terms = next_n_terms
+            certified = mpmath.inf
+            break
+        log2_b_prod += sum(math.log2(abs(b)) for b in b_[n_terms:next_n_terms])
+        n_terms = next_n_terms
+        if p00 != 0 and p01 != 0:
+            # math.log2 of an int is taken from its bit length and leading bits, not by a big division
+            log2_diff = log2_b_prod - math.log2(abs(p00)) - math.log2(abs(p01))
+            if prev_log2_diff is not None and log2_diff < prev_log2_diff:
+                log2_r = (log2_diff - prev_log2_diff) / (n_terms - prev_n_terms)
+                log2_error = log2_diff + log2_r - math.log2(-math.expm1(log2_r * math.log(2)))  # diff * r / (1 - r)
+                value_log2 = math.log2(abs(a0 * p00 + p10) or 1) - math.log2(abs(p00))
+                certified = max(int((value_log2 - log2_error) * math.log10(2)), 0)
+            prev_log2_diff, prev_n_terms = log2_diff, n_terms
+        if certified >= digits or n_terms >= max_terms:
+            break
+    if p00 == 0:
+        return GCFEvaluation(dec(0), n_terms, 0)
+    return GCFEvaluation(dec(a0 * p00 + p10) / dec(p00), n_terms, certified)
+
+
 def find_transform(x, y, limit, threshold=1e-7):
     """
     find a integer solution to ax + b - cxy - dy = 0
@@ -288,6 +451,7 @@ def find_transform(x, y, limit, threshold=1e-7):
     :param threshold: optimal solution threshold.
     :return MobiusTransform in case of success or None.
     """
+    from ortools.linear_solver.pywraplp import Solver  # optional, only needed here (see find_transform_pslq)
     x1 = x
     x2 = dec(1.0)
     x3 = -x*y
@@ -313,6 +477,51 @@ def find_transform(x, y, limit, threshold=1e-7):
         return None
 
 
+def find_transform_pslq(x, y, limit, maxsteps=10000):
+    """
+    find a integer solution to ax + b - cxy - dy = 0 with an integer relation algorithm (PSLQ).
+    this will give us the mobius transform: T(x) = y
+    much faster than find_transform, and doesn't require ortools. the relation is searched in the working precision.
+    :param x: numeric constant to check
+    :param y: numeric manipulation of constant
+    :param limit: range to look at
+    :param maxsteps: (optional) maximal number of PSLQ iterations.
+    :return MobiusTransform in case of success or None.
+    """
+    relation = mpmath.pslq([x, dec(1), -x * y, -y], maxcoeff=limit, maxsteps=maxsteps)
+    if relation is None or any(abs(coef) > limit for coef in relation):
+        return None
+    a, b, c, d = relation
+    if a * d - b * c == 0:  # y doesn't depend on x (e.g. y is rational)
+        return None
+    if c < 0 or (c == 0 and d < 0):  # remove the sign redundancy
+        a, b, c, d = -a, -b, -c, -d
+    ret = MobiusTransform.from_values(a, b, c, d)
+    ret.normalize()
+    return ret
+
+
+def _find_transform_pslq_worker(args):
+    x, y, limit, dps = args
+    with mpmath.workdps(dps):
+        return find_transform_pslq(x, y, limit)
+
+
+def find_transforms(pairs, limit, workers=1):
+    """
+    find mobius transforms for many pairs of values (see find_transform_pslq), in a process pool.
+    :param pairs: list of (x, y) pairs.
+    :param limit: range to look at
+    :param workers: (optional) number of worker processes.
+    :return: list of MobiusTransform (or None where there is no relation), in the order of the pairs.
+    """
+    args = [(dec(x), dec(y), limit, mpmath.mp.dps) for x, y in pairs]
+    if workers <= 1:
+        return [_find_transform_pslq_worker(arg) for arg in args]
+    with multiprocessing.Pool(workers) as pool:
+        return pool.map(_find_transform_pslq_worker, args, chunksize=max(len(args) // (workers * 4), 1))
+
+
 def check_and_modify_precision(const, transform, const_gen, offset):
     """
     tried to use this to calculate and enlarge precision along the way.. but it only made it slower.
@@ -0,0 +1,84 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+"""
+Series of the cached side of the first enumeration (see EfficientGCFEnumerator) depend only on the poly domain, and not
+on the searched constants or LHS tables. This file holds an on-disk cache of these series, so repeated searches over the
+same domain load them instead of generating them again.
+Series are stored as int64 .npy files (one per chunk of SERIES_CACHE_CHUNK coefficients) and are memory-mapped when
+loaded. Files are named by a hash of the domain class, its coefficient ranges, the series side, the number of terms and
+the chunk, so a changed domain never reads series of another domain. chunks don't depend on the memory budget of the
+enumeration, so searches with a different budget use the same files.
+The cache is off unless RAMANUJAN_SERIES_CACHE (environment variable) or set_series_cache_directory gives a directory.
+"""
+
+SERIES_CACHE_CHUNK = 2 ** 14  # number of coefficients (series) in a cached file
+
+
+class SeriesCache(object):
+
+    def __init__(self, directory):
+        """
+        :param directory: directory of the cached series.
+        """
+        self.directory = directory
+
+    @staticmethod
+    def key(poly_domain, side, n_terms, chunk_start, chunk_length):
+        """
+        :param poly_domain: poly domain the series are created from.
+        :param side: 'an' or 'bn'.
+        :param n_terms: number of terms in each series.
+        :param chunk_start: index of the first coefficient of the chunk.
+        :param chunk_length: number of coefficients in a chunk (SERIES_CACHE_CHUNK).
+        :return: key of a chunk of series.
+        """
+        description = repr((type(poly_domain).__module__, type(poly_domain).__name__, poly_domain.dump_domain_ranges(),
+                            side, n_terms, chunk_start, chunk_length))
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def get(self, key, generate):
+        """
+        Get a chunk of series.
+        :param key: key of the chunk (see SeriesCache.key).
+        :param generate: function that returns the series of the chunk (list of lists of ints).
+        :return: int64 array of the series (a row per series), or the generated lists if they don't fit int64.
+        """
+        path = os.path.join(self.directory, key + '.npy')
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            pass
+        series_list = generate()
+        try:
+            series = np.array(series_list, dtype=np.int64)
+        except (OverflowError, ValueError):  # doesn't fit int64, or series of different lengths
+            return series_list
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile('wb', dir=self.directory, suffix='.npy', delete=False) as f:
+                np.save(f, series)
+            os.replace(f.name, path)  # atomic, readers see either no file or the whole of it
+        except OSError:
+            pass  # the cache is an optimization only
+        return series
+
+
+g_series_cache = SeriesCache(os.environ['RAMANUJAN_SERIES_CACHE']) if os.environ.get('RAMANUJAN_SERIES_CACHE') else None
+
+
+def set_series_cache_directory(directory):
+    """
+    :param directory: directory for cached series. None turns the cache off.
+    """
+    global g_series_cache
+    g_series_cache = SeriesCache(directory) if directory is not None else None
+
+
+def get_series_cache():
+    """
+    :return: the series cache, or None if it is off.
+    """
+    return g_series_cache
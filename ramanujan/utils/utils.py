@@ -1,9 +1,10 @@
+import math
 import numpy as np
 from typing import List
 import time
 import mpmath
 import matplotlib.pyplot as plt
-from sympy import lambdify
+from ramanujan.utils.constant_cache import CachedConstant
 
 # Measures the amount of time the function takes to run in milliseconds in order to check improvements
 def measure_performance(func):
@@ -73,14 +74,34 @@ def create_mpf_const_generator(sym_constants):
     """
     Returns a generator that creates an mpf objects from sympy constants
     This allows us to get an object that matches the scope's mpf's workdps
+    Values are served from the constants cache, so each constant is computed once per precision (see constant_cache.py)
     """
-    constants_generator = []
-    for i in range(len(sym_constants)):
-        try:
-            constants_generator.append(lambdify((), sym_constants[i], modules="mpmath"))
-        except AttributeError:  # Hackish constant
-            constants_generator.append(sym_constants[i].mpf_val)
-    return constants_generator
+    return [CachedConstant(sym_constant) for sym_constant in sym_constants]
+
+
+def agreeing_digits(a, b):
+    """
+    count the significant decimal digits two values agree on.
+    the values are subtracted and compared by their binary exponents (mpmath.mag), instead of formatting strings.
+    :param a: mpf value.
+    :param b: mpf value.
+    :return: number of agreeing digits (int), or inf if the values are identical.
+    """
+    if a == b:
+        return math.inf
+    scale = max(mpmath.mag(a), mpmath.mag(b))
+    diff_mag = mpmath.mag(a - b)
+    return max(int((scale - diff_mag) * math.log10(2)), 0)
+
+
+def values_agree(a, b, digits):
+    """
+    :param a: mpf value.
+    :param b: mpf value.
+    :param digits: number of significant decimal digits to compare.
+    :return: True if the values agree on (at least) the given number of digits.
+    """
+    return agreeing_digits(a, b) >= digits
 
 
 def get_series_items_from_iter(series_iter, coefs, max_n, start_n = 0):
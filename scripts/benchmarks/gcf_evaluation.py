@@ -0,0 +1,26 @@
+from time import time
+import mpmath
+from ramanujan.utils.mobius import EfficientGCF
+
+"""
+This script compares the left to right recursion of EfficientGCF with binary splitting (product tree evaluation).
+
+The GCF is Apery's continued fraction for zeta(3):
+an = 34n^3 + 51n^2 + 27n + 5
+bn = -n^6
+whose convergents grow by ~10 digits per term.
+Both methods calculate the exact same convergent, so only the time differs.
+"""
+
+mpmath.mp.dps = 100
+for n_terms in [1000, 10000, 100000]:
+    an = [34 * n ** 3 + 51 * n ** 2 + 27 * n + 5 for n in range(n_terms)]
+    bn = [-n ** 6 for n in range(n_terms)]
+    timings = []
+    for binary_splitting in [False, True]:
+        start = time()
+        gcf = EfficientGCF(an, bn, binary_splitting=binary_splitting)
+        timings.append(time() - start)
+        value = gcf.evaluate()
+    print('{} terms: sequential {:.3f}s, binary splitting {:.3f}s, value {}'.format(
+        n_terms, timings[0], timings[1], mpmath.nstr(6 / value, 20)))
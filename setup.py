@@ -20,7 +20,10 @@ setuptools.setup(
         'pytz>=2019.3',
         'six>=1.14.0',
         'sympy>=1.5.1',
-        'ortools>=7.4.7247',
-        'pybloom-live'
-    ]
+        'pybloom-live',
+        'bitarray>=2.3',  # bitarray(buffer=...), to map bloom filter bits (LHSHashTable)
+    ],
+    extras_require={
+        'milp': ['ortools>=7.4.7247'],  # mobius.find_transform only
+    }
 )
\ No newline at end of file
@@ -1,9 +1,16 @@
+import os
 import unittest
+import tempfile
+import mpmath
+import numpy as np
 from ramanujan.LHSHashTable import LHSHashTable
-from ramanujan.enumerators.EfficientGCFEnumerator import EfficientGCFEnumerator
+from ramanujan.enumerators.EfficientGCFEnumerator import EfficientGCFEnumerator, SERIES_BYTES
+from ramanujan.enumerators.SortMergeGCFEnumerator import SortMergeGCFEnumerator, PAIR_BYTES, MAX_KEY, FLOAT_KEY_LIMIT
 from ramanujan.poly_domains.CartesianProductPolyDomain import CartesianProductPolyDomain
 from ramanujan.poly_domains.Zeta3Domain1 import Zeta3Domain1
-from ramanujan.constants import g_const_dict
+from ramanujan.utils.series_cache import set_series_cache_directory
+from ramanujan.utils.convergence_rate import SUPER_EXPONENTIAL
+from ramanujan.constants import g_const_dict, g_N_initial_search_terms
 
 
 def get_testable_data(refined_res_list):
@@ -93,5 +100,267 @@ class APITests(unittest.TestCase):
         self.assertEqual(len(results), 46)
 
 
+    def test_MITM_multiple_constants(self):
+        e_lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        pi_lhs = LHSHashTable('pi_lhs_dept5_db', 5, [g_const_dict['pi']])
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            1, [-5, 5])
+
+        # a single enumeration for both tables finds the same results as an enumeration per table
+        enumerator = EfficientGCFEnumerator(
+            [e_lhs, pi_lhs],
+            poly_search_domain,
+            [[g_const_dict['e']], [g_const_dict['pi']]])
+        e_results, pi_results = enumerator.full_execution(print_convergence_rate=False)
+
+        self.assertEqual(len(e_results), 20)
+        self.assertIn(
+            ((4, 2), (0, 1), (1, 1), (-1, 1)),
+            get_testable_data(e_results))
+        pi_enumerator = EfficientGCFEnumerator(pi_lhs, poly_search_domain, [g_const_dict['pi']])
+        self.assertEqual(
+            sorted(get_testable_data(pi_results)),
+            sorted(get_testable_data(pi_enumerator.full_execution(print_convergence_rate=False))))
+
+
+    def test_MITM_canonical_keys(self):
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        canonical_lhs = LHSHashTable('e_canonical_lhs_dept5_db', 5, [g_const_dict['e']], canonical=True)
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            1, [-5, 5])
+
+        results = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']]).full_execution(
+            print_convergence_rate=False)
+        canonical_enumerator = EfficientGCFEnumerator(canonical_lhs, poly_search_domain, [g_const_dict['e']])
+        canonical_results = canonical_enumerator.full_execution(print_convergence_rate=False)
+
+        # every result is found again, with a LHS of the same value
+        self.assertEqual(len(canonical_results), len(results))
+        self.assertIn(
+            ((4, 2), (0, 1), (1, 1), (-1, 1)),
+            get_testable_data(canonical_results))
+        self.assertTrue(set((r.rhs_an_poly, r.rhs_bn_poly) for r in results) <=
+                        set((r.rhs_an_poly, r.rhs_bn_poly) for r in canonical_results))
+
+
+    def test_MITM_sort_merge(self):
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            1, [-5, 5])
+
+        efficient_enumerator = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']])
+        enumerator = SortMergeGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']], block_size=1000)
+
+        # exact key matches only, so no more hits than the bloom filter, and the same results
+        hits = enumerator.find_initial_hits()
+        self.assertLessEqual(len(hits), len(efficient_enumerator.find_initial_hits()))
+        results = get_testable_data(enumerator.full_execution(print_convergence_rate=False))
+        self.assertEqual(
+            sorted(results),
+            sorted(get_testable_data(efficient_enumerator.full_execution(print_convergence_rate=False))))
+
+        # a memory budget of 40 pairs caches and joins the series in many small blocks, with the same hits
+        tiled_enumerator = SortMergeGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']],
+                                                  cache_memory=2 * 40 * PAIR_BYTES)
+        self.assertEqual(sorted(tiled_enumerator.find_initial_hits()), sorted(hits))
+
+    def test_MITM_sort_merge_keys(self):
+        class AllKeys:
+            """ a table that holds every key """
+            def __init__(self, canonical):
+                self.canonical = canonical
+
+            def __contains__(self, key):
+                return True
+
+        class SortedKeys:
+            """ a table that holds the given keys """
+            def __init__(self, keys, canonical):
+                self.keys = np.unique(np.array(list(keys), dtype=np.int64))
+                self.canonical = canonical
+
+            def sorted_keys(self):
+                return self.keys
+
+        # has values on key boundaries (rationals like -3), and values too large for float64 to tell keys apart
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            1, [-5, 5])
+        for canonical in [False, True]:
+            enumerator = EfficientGCFEnumerator(AllKeys(canonical), poly_search_domain, [g_const_dict['e']])
+            with mpmath.workdps(enumerator.enum_dps):
+                hits = {(hit.lhs_key, tuple(hit.rhs_an_poly), tuple(hit.rhs_bn_poly))
+                        for hit in enumerator._first_enumeration(False) if abs(hit.lhs_key) < MAX_KEY}
+                sort_merge_hits = {
+                    (hit.lhs_key, tuple(hit.rhs_an_poly), tuple(hit.rhs_bn_poly))
+                    for hit in SortMergeGCFEnumerator(SortedKeys((key for key, _, _ in hits), canonical),
+                                                      poly_search_domain, [g_const_dict['e']],
+                                                      block_size=1000)._first_enumeration(False)}
+            keys = [key for key, _, _ in hits]
+            self.assertTrue(any(abs(key) % 10 ** 6 in [0, 1, 10 ** 6 - 1] for key in keys))
+            if not canonical:
+                self.assertTrue(any(FLOAT_KEY_LIMIT <= abs(key) for key in keys))
+            # every gcf has the same key in both enumerators
+            self.assertEqual(sort_merge_hits, hits)
+
+
+    def test_MITM_reject_false_hits(self):
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            1, [-5, 5])
+        enumerator = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']])
+
+        with mpmath.workdps(enumerator.enum_dps):
+            hits = enumerator._first_enumeration(False)
+            kept_hits = enumerator.reject_false_hits(hits)
+        self.assertLess(len(kept_hits), len(hits))
+        self.assertIsNone(lhs.lhs_possibilities)  # compared with the fingerprints only, the .db file wasn't read
+        self.assertEqual(len(enumerator.refine_results(kept_hits)), 20)
+
+        # all of the hits are refined if the enumerator doesn't compare fingerprints
+        all_hits = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']],
+                                          fingerprint_hits=False).find_initial_hits(print_results=False)
+        self.assertEqual(sorted(all_hits), sorted(hits))
+
+
+    def test_MITM_cache_blocks(self):
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            1, [-5, 5])
+
+        # the cached side doesn't fit, and is enumerated in blocks of 7 series
+        enumerator = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']],
+                                            cache_memory=7 * SERIES_BYTES)
+        self.assertEqual(enumerator._plan_tiling(55, 121, enumerator.cache_memory), (False, 7))
+        results = get_testable_data(enumerator.full_execution(print_convergence_rate=False))
+        self.assertEqual(len(results), 20)
+        self.assertIn(
+            ((1, 1), (1, 0), (1, 0), (-2, 1)),
+            results)
+
+
+    def test_MITM_series_cache(self):
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            1, [-5, 5])
+
+        # the first run stores the cached series ({an}, the smaller side)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            set_series_cache_directory(cache_dir)
+            try:
+                enumerator = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']])
+                results = get_testable_data(enumerator.full_execution(print_convergence_rate=False))
+                self.assertEqual(len(results), 20)
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+                with mpmath.workdps(enumerator.enum_dps):
+                    hits = enumerator._first_enumeration(False)
+
+                # the second run loads them, even with another memory budget (blocks of 7 series)
+                enumerator = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']],
+                                                    cache_memory=7 * SERIES_BYTES)
+                generated = []
+                create_an_series = enumerator.create_an_series
+                enumerator.create_an_series = lambda *args: generated.append(args) or create_an_series(*args)
+                with mpmath.workdps(enumerator.enum_dps):
+                    self.assertEqual(sorted(enumerator._first_enumeration(False)), sorted(hits))
+                self.assertEqual(generated, [])
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+            finally:
+                set_series_cache_directory(None)
+
+
+    def test_MITM_accelerated_keys(self):
+        lhs = LHSHashTable('pi_lhs_dept5_db', 5, [g_const_dict['pi']])
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            2, [-5, 5])
+
+        results = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['pi']]).full_execution(
+            print_convergence_rate=False)
+        enumerator = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['pi']], accelerator='wynn')
+        accelerated_results = enumerator.full_execution(print_convergence_rate=False)
+
+        # slowly converging gcfs are found only by the keys of their accelerated values
+        self.assertEqual(len(results), 12)
+        self.assertEqual(len(accelerated_results), 16)
+        self.assertTrue(set(get_testable_data(results)) <= set(get_testable_data(accelerated_results)))
+
+
+    def test_MITM_sub_exponential_keys(self):
+        lhs = LHSHashTable('zeta2_lhs_dept1_db', 1, [g_const_dict['zeta'](2)])
+        poly_search_domain = CartesianProductPolyDomain(
+            2, [0, 2],
+            4, [-1, 0])
+        expected = ((2, 2, 1), (-1, 0, 0, 0, 0), (1, 0), (0, 1))  # 1 / zeta(2), that converges like 1 / n
+
+        results = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['zeta'](2)],
+                                         accelerator='wynn').full_execution(print_convergence_rate=False)
+        enumerator = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['zeta'](2)],
+                                            accelerator='richardson')
+        accelerated_results = enumerator.full_execution(print_convergence_rate=False)
+
+        # it's found only by extrapolating all of its convergents, and verified only by richardson_evaluation
+        self.assertNotIn(expected, get_testable_data(results))
+        self.assertIn(expected, get_testable_data(accelerated_results))
+        self.assertTrue(set(get_testable_data(results)) <= set(get_testable_data(accelerated_results)))
+
+
+    def test_MITM_adaptive_depth(self):
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            1, [-5, 5])
+
+        results = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']]).full_execution(
+            print_convergence_rate=False)
+        enumerator = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']], adaptive_depth=True)
+        adaptive_results = enumerator.full_execution(print_convergence_rate=False)
+
+        # deg(a) = 1 > deg(b) / 2, so every gcf converges super exponentially, most of them in less than the full depth
+        self.assertEqual(set(get_testable_data(results)), set(get_testable_data(adaptive_results)))
+        self.assertEqual({convergence_class for convergence_class, _ in enumerator.depth_report}, {SUPER_EXPONENTIAL})
+        self.assertTrue(all(depth <= g_N_initial_search_terms for _, depth in enumerator.depth_report))
+        self.assertLess(min(depth for _, depth in enumerator.depth_report), g_N_initial_search_terms // 2)
+
+    def test_MITM_adaptive_depth_keys(self):
+        class KeyRecorder:
+            """ a table that records the keys it's probed with, and holds none of them """
+            canonical = False
+
+            def __init__(self):
+                self.keys = []
+
+            def __contains__(self, key):
+                self.keys.append(key)
+                return False
+
+        # includes a = n, b = -3n - 4, predicted to settle much earlier than it does
+        poly_search_domain = CartesianProductPolyDomain(
+            1, [-5, 5],
+            1, [-5, 5])
+        keys = []
+        for adaptive_depth in [False, True]:
+            table = KeyRecorder()
+            enumerator = EfficientGCFEnumerator(table, poly_search_domain, [g_const_dict['e']],
+                                                adaptive_depth=adaptive_depth)
+            enumerator._first_enumeration(print_results=False)
+            keys.append(table.keys)
+
+        # every gcf is probed with the same key as in the full depth, in the same order. the only exception are values
+        # on the boundary of two keys (rationals like -5/4), that are truncated to either side at any depth.
+        self.assertEqual(len(keys[0]), len(keys[1]))
+        for full_key, adaptive_key in zip(*keys):
+            if full_key != adaptive_key:
+                self.assertEqual(abs(full_key - adaptive_key), 1)
+                self.assertTrue(full_key % 10 ** 6 == 0 or adaptive_key % 10 ** 6 == 0)
+        self.assertTrue(any(n_continued for _, _, n_continued in enumerator.depth_report.values()))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,125 @@
+import os
+import pickle
+import mpmath
+import unittest
+import multiprocessing
+from multiprocessing import shared_memory
+from ramanujan.LHSHashTable import LHSHashTable, BLOOM_HEADER_SIZE
+from ramanujan.constants import g_const_dict, g_N_initial_search_dps
+
+
+def lookup_in_shared_table(args):
+    handle, keys = args
+    lhs = LHSHashTable.attach(handle)
+    return [(key in lhs, lhs[key]) for key in keys]
+
+
+class LHSHashTableTests(unittest.TestCase):
+
+    def test_shared_table(self):
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        with open(lhs.s_name, 'rb') as f:
+            keys = list(pickle.load(f).keys())[:40]
+        expected = [(True, lhs[key]) for key in keys]
+
+        handle = lhs.share()
+        self.assertEqual([lhs[key] for key in keys], [values for _, values in expected])
+        with multiprocessing.Pool(2) as pool:
+            results = pool.map(lookup_in_shared_table, [(handle, keys[:20]), (handle, keys[20:])])
+        self.assertEqual(results[0] + results[1], expected)
+
+        attached = LHSHashTable.attach(handle)
+        self.assertEqual(attached.evaluate(keys[0]), lhs.evaluate(keys[0]))
+        with self.assertRaises(KeyError):
+            attached[1]
+        attached.unshare()
+        lhs.unshare()
+        self.assertEqual(lhs[keys[0]], expected[0][1])
+
+        # arrays returned by a shared table don't keep it from being closed, and it's freed at the end of the block
+        with lhs.shared() as handle:
+            attached = LHSHashTable.attach(handle)
+            sorted_keys = attached.sorted_keys()
+            attached.unshare()
+        self.assertEqual(sorted_keys.tolist(), lhs.sorted_keys().tolist())
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=handle.memory_name)
+
+    def test_bloom_file(self):
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        with open(lhs.s_name, 'rb') as f:
+            keys = list(pickle.load(f).keys())
+
+        # the filter is mapped from its file instead of being rebuilt from the keys
+        loaded = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        self.assertEqual(loaded.bloom.bitarray[:loaded.bloom.num_bits], lhs.bloom.bitarray[:lhs.bloom.num_bits])
+        self.assertTrue(all(key in loaded for key in keys))
+        self.assertTrue(all(key in pickle.loads(pickle.dumps(loaded)) for key in keys[:100]))
+
+        # a damaged file is rebuilt
+        bloom_name = lhs.lhs_hash_name_to_bloom_name(lhs.s_name)
+        with open(bloom_name, 'r+b') as f:
+            f.write(b'X')
+        self.assertIsNone(lhs._map_bloom())
+        rebuilt = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        self.assertEqual(rebuilt.bloom.bitarray, lhs.bloom.bitarray[:lhs.bloom.num_bits])  # rebuilt, not mapped
+        self.assertIsNotNone(lhs._map_bloom())
+
+        # damaged bits are detected by their checksum
+        with open(bloom_name, 'r+b') as f:
+            f.seek(BLOOM_HEADER_SIZE)
+            byte = f.read(1)
+            f.seek(BLOOM_HEADER_SIZE)
+            f.write(bytes([byte[0] ^ 1]))
+        self.assertIsNone(lhs._map_bloom())
+        LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        self.assertIsNotNone(lhs._map_bloom())
+
+        # a filter of an older .db file (with the same size) is stale
+        db_stat = os.stat(lhs.s_name)
+        os.utime(lhs.s_name, ns=(db_stat.st_atime_ns, db_stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(lhs._map_bloom())
+        LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        self.assertIsNotNone(lhs._map_bloom())
+
+
+    def test_canonical_mode(self):
+        LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        canonical_lhs = LHSHashTable('e_canonical_lhs_dept5_db', 5, [g_const_dict['e']], canonical=True)
+
+        # the keys of the tables are different, so a table can't be opened with the other mode
+        with self.assertRaises(ValueError):
+            LHSHashTable('e_canonical_lhs_dept5_db', 5, [g_const_dict['e']])
+        with self.assertRaises(ValueError):
+            LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']], canonical=True)
+        self.assertTrue(LHSHashTable('e_canonical_lhs_dept5_db', 5, [g_const_dict['e']], canonical=True).canonical)
+        self.assertTrue(pickle.loads(pickle.dumps(canonical_lhs)).canonical)
+
+    def test_fingerprints(self):
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        with open(lhs.s_name, 'rb') as f:
+            keys = list(pickle.load(f).keys())[:40]
+
+        # the fingerprints of a key are the digits after it of its entries, in any order
+        key_factor = 1 / lhs.threshold
+        fingerprints = [lhs.fingerprints(key).tolist() for key in keys]
+        self.assertEqual(len(lhs.fingerprints(1)), 0)
+        self.assertIsNone(lhs.lhs_possibilities)  # the .db file isn't read for them
+        with mpmath.workdps(g_N_initial_search_dps):
+            for key, key_fingerprints in zip(keys, fingerprints):
+                expected = [LHSHashTable.fingerprint(value, int(key), key_factor) for value, _, _ in lhs.evaluate(key)]
+                self.assertEqual(sorted(key_fingerprints), sorted(expected))
+
+        # fingerprints of a table without the file (e.g. of an older version), or of an older .db file are created again
+        os.remove(lhs.lhs_hash_name_to_fingerprints_name(lhs.s_name))
+        loaded = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        self.assertEqual([loaded.fingerprints(key).tolist() for key in keys], fingerprints)
+        db_stat = os.stat(lhs.s_name)
+        os.utime(lhs.s_name, ns=(db_stat.st_atime_ns, db_stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(lhs._map_fingerprints())
+        self.assertEqual([pickle.loads(pickle.dumps(loaded)).fingerprints(key).tolist() for key in keys], fingerprints)
+        self.assertIsNotNone(lhs._map_fingerprints())
+
+
+if __name__ == '__main__':
+    unittest.main()
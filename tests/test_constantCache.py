@@ -0,0 +1,64 @@
+import os
+import pickle
+import sympy
+import mpmath
+import unittest
+import tempfile
+from ramanujan.utils.constant_cache import ConstantCache, CachedConstant, set_constant_cache_directory
+
+
+def fail():
+    raise AssertionError('the value should have been served from the cache')
+
+
+class ConstantCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        set_constant_cache_directory(None)
+        self.directory.cleanup()
+
+    def test_lower_precision(self):
+        with mpmath.workdps(200):
+            ConstantCache(self.directory.name).get('zeta_3', lambda: mpmath.zeta(3))
+        # served by rounding the more precise value of another run, the same as computing it at the lower precision
+        with mpmath.workdps(50):
+            self.assertEqual(ConstantCache(self.directory.name).get('zeta_3', fail), mpmath.zeta(3))
+
+    def test_reload_at_stored_precision(self):
+        with mpmath.workdps(200):
+            ConstantCache(self.directory.name).get('zeta_3', lambda: mpmath.zeta(3))
+        cache = ConstantCache(self.directory.name)
+        with mpmath.workdps(50):  # loaded while working at a lower precision
+            cache.get('zeta_3', fail)
+        with mpmath.workdps(200):
+            self.assertEqual(cache.get('zeta_3', fail), mpmath.zeta(3))
+
+    def test_keep_more_precise_file(self):
+        other_process = ConstantCache(self.directory.name)
+
+        def generate_while_other_process_saves():
+            with mpmath.workdps(200):
+                other_process.get('zeta_3', lambda: mpmath.zeta(3))
+            return mpmath.zeta(3)
+
+        with mpmath.workdps(50):
+            ConstantCache(self.directory.name).get('zeta_3', generate_while_other_process_saves)
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)  # the less precise value isn't left behind
+        with mpmath.workdps(200):
+            self.assertEqual(ConstantCache(self.directory.name).get('zeta_3', fail), mpmath.zeta(3))
+
+    def test_cached_constant(self):
+        set_constant_cache_directory(self.directory.name)
+        constant = pickle.loads(pickle.dumps(CachedConstant(sympy.zeta(3))))  # e.g. sent to a worker process
+        self.assertEqual(constant.key, 'zeta_3')
+        self.assertEqual(CachedConstant(sympy.pi * sympy.acosh(2)).key, 'pi-acosh_2')
+        with mpmath.workdps(100):
+            self.assertEqual(constant(), mpmath.zeta(3))
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
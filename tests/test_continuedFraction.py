@@ -0,0 +1,104 @@
+import unittest
+import mpmath
+import numpy as np
+from ramanujan.utils.mobius import MobiusTransform, GeneralizedContinuedFraction, SimpleContinuedFraction, EfficientGCF, \
+    evaluate_gcf_to_precision, find_transforms
+from ramanujan.utils.convergence_rate import calculate_convergence, estimate_convergence, estimate_convergence_batch
+
+
+class MobiusTests(unittest.TestCase):
+
+    def test_composition(self):
+        left = MobiusTransform(np.array([[2, 3], [5, 7]], dtype=object))
+        right = MobiusTransform(np.array([[1, -4], [6, 9]], dtype=object))
+        expected = np.matmul(left.data, right.data)
+        self.assertTrue(np.array_equal((left * right).data, expected))
+        left *= right
+        self.assertTrue(np.array_equal(left.data, expected))
+        self.assertEqual(MobiusTransform().compose_gcf_step(3, 4), MobiusTransform(np.array([[0, 3], [1, 4]])))
+
+    def test_equality_up_to_scalar(self):
+        self.assertEqual(MobiusTransform(np.array([[2, 4], [6, 8]], dtype=object)),
+                         MobiusTransform.from_values(1, 2, 3, 4))
+        self.assertNotEqual(MobiusTransform.from_values(1, 2, 3, 4), MobiusTransform.from_values(1, 2, 3, 5))
+        transform = MobiusTransform.from_values(2, 3, 5, 7)
+        self.assertEqual(transform * transform.inverse(), MobiusTransform())
+
+    def test_lazy_normalization(self):
+        # a product of many scaled transforms should not keep all the common factors
+        transform = MobiusTransform()
+        for _ in range(1000):
+            transform *= MobiusTransform.from_values(2, 0, 0, 2)
+        self.assertLessEqual(transform.a.bit_length(), MobiusTransform.NORMALIZE_BITS + 1)
+        self.assertEqual(transform, MobiusTransform())
+
+    def test_find_transforms(self):
+        with mpmath.workdps(100):
+            x = mpmath.e
+            transforms = find_transforms([(x, (2 * x - 3) / (x + 5)), (x, mpmath.pi), (x, mpmath.mpf(3) / 7)], 10)
+        self.assertEqual(transforms[0], MobiusTransform.from_values(2, -3, 1, 5))
+        self.assertIsNone(transforms[1])
+        self.assertIsNone(transforms[2])  # rational, independent of x
+
+
+class ContinuedFractionTests(unittest.TestCase):
+
+    def test_evaluate(self):
+        with mpmath.workdps(50):
+            gcf = GeneralizedContinuedFraction([2] + [1] * 200, [1] * 200)  # 2 + 1/(1 + 1/(1 + ...))
+            self.assertLess(abs(gcf.evaluate() - (1 + (1 + mpmath.sqrt(5)) / 2)), mpmath.mpf(10) ** -40)
+
+    def test_binary_splitting(self):
+        an = [34 * n ** 3 + 51 * n ** 2 + 27 * n + 5 for n in range(500)]
+        bn = [-n ** 6 for n in range(500)]
+        sequential = EfficientGCF(an, bn, binary_splitting=False)
+        product_tree = EfficientGCF(an, bn, binary_splitting=True)
+        self.assertEqual((sequential.A, sequential.B, sequential.prev_A, sequential.prev_B),
+                         (product_tree.A, product_tree.B, product_tree.prev_A, product_tree.prev_B))
+        with mpmath.workdps(100):
+            gcf = GeneralizedContinuedFraction(an, bn[1:])
+            self.assertLess(abs(gcf.evaluate() - sequential.evaluate()), mpmath.mpf(10) ** -95)
+
+    def test_evaluate_to_precision(self):
+        def apery(n_terms):  # 6 / zeta(3)
+            return [34 * n ** 3 + 51 * n ** 2 + 27 * n + 5 for n in range(n_terms)], [-n ** 6 for n in range(n_terms)]
+        with mpmath.workdps(300):
+            evaluation = evaluate_gcf_to_precision(apery, 200, 1000)
+            self.assertGreaterEqual(evaluation.digits, 200)
+            self.assertLess(evaluation.depth, 1000)
+            self.assertLess(abs(evaluation.value - 6 / mpmath.zeta(3)), mpmath.mpf(10) ** -200)
+
+    def test_from_irrational_constant(self):
+        with mpmath.workdps(100):
+            scf = SimpleContinuedFraction.from_irrational_constant(lambda: mpmath.e, 20)
+        self.assertEqual(scf.a_[:10], [2, 1, 2, 1, 1, 4, 1, 1, 6, 1])
+
+
+class ConvergenceRateTests(unittest.TestCase):
+
+    def setUp(self):
+        apery_an = [34 * n ** 3 + 51 * n ** 2 + 27 * n + 5 for n in range(200)]
+        with mpmath.workdps(1500):
+            self.gcfs = [(GeneralizedContinuedFraction([1] * 200, [1] * 200), (1 + mpmath.sqrt(5)) / 2),
+                         (GeneralizedContinuedFraction([1] + [2] * 199, [1] * 200), mpmath.sqrt(2)),
+                         (GeneralizedContinuedFraction(apery_an, [-n ** 6 for n in range(1, 201)]), 6 / mpmath.zeta(3))]
+
+    def test_estimate_convergence(self):
+        # the estimate without a reference value agrees with the rate of the distance from the reference
+        with mpmath.workdps(1500):
+            for gcf, reference in self.gcfs:
+                rate = float(calculate_convergence(gcf, reference))
+                self.assertAlmostEqual(estimate_convergence(gcf), rate, delta=0.02 * rate)
+
+    def test_estimate_convergence_batch(self):
+        gcfs = [gcf for gcf, _ in self.gcfs] + [
+            GeneralizedContinuedFraction([1] * 200, [1, 0] + [1] * 198),  # finite
+            GeneralizedContinuedFraction([1] * 100, [1] * 100),  # another length
+            GeneralizedContinuedFraction([0, 1, -1] * 50, [1] * 150),  # a denominator is 0, estimated one by one
+            GeneralizedContinuedFraction([1, 2, 3], [1, 1, 1])]  # too short
+        for batch_rate, gcf in zip(estimate_convergence_batch(gcfs), gcfs):
+            self.assertAlmostEqual(batch_rate, estimate_convergence(gcf), places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
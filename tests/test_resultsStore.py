@@ -0,0 +1,31 @@
+import unittest
+from ramanujan.LHSHashTable import LHSHashTable
+from ramanujan.ResultsStore import ResultsStore
+from ramanujan.enumerators.EfficientGCFEnumerator import EfficientGCFEnumerator
+from ramanujan.poly_domains.CartesianProductPolyDomain import CartesianProductPolyDomain
+from ramanujan.constants import g_const_dict
+
+
+class ResultsStoreTests(unittest.TestCase):
+
+    def test_mitm_runs(self):
+        store = ResultsStore(':memory:')
+        lhs = LHSHashTable('e_lhs_dept5_db', 5, [g_const_dict['e']])
+        poly_search_domain = CartesianProductPolyDomain(1, [-5, 5], 1, [-5, 5])
+        enumerator = EfficientGCFEnumerator(lhs, poly_search_domain, [g_const_dict['e']])
+
+        results = enumerator.full_execution(print_convergence_rate=False, results_store=store)
+        self.assertEqual(store.count_conjectures([g_const_dict['e']]), len(results))
+        self.assertTrue(store.has_conjecture([g_const_dict['e']], (4, 2), (0, 1)))
+
+        # a second run takes all the results from the store, and doesn't store them twice
+        known = store.known_refined_matches([g_const_dict['e']])
+        self.assertEqual(len(known), len(set(store.refined_match_key(r) for r in results)))
+        second_results = enumerator.full_execution(print_convergence_rate=False, results_store=store)
+        self.assertEqual(sorted(second_results), sorted(results))
+        self.assertEqual(store.count_conjectures(), len(results))
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
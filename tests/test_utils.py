@@ -0,0 +1,74 @@
+import math
+import unittest
+import mpmath
+from ramanujan.utils.utils import agreeing_digits, values_agree
+from ramanujan.utils.equivalence import mobius_fingerprints, hermite_transforms, group_by_equivalence
+
+
+class AgreeingDigitsTests(unittest.TestCase):
+
+    def test_equal_values(self):
+        with mpmath.workdps(60):
+            self.assertEqual(agreeing_digits(mpmath.pi, +mpmath.pi), math.inf)
+            self.assertEqual(agreeing_digits(mpmath.mpf(0), mpmath.mpf(0)), math.inf)
+            self.assertTrue(values_agree(mpmath.e, +mpmath.e, 1000))
+
+    def test_zero(self):
+        with mpmath.workdps(60):
+            # a small value agrees with 0 on no digits, however small it is
+            self.assertEqual(agreeing_digits(mpmath.mpf(0), mpmath.mpf('1e-20')), 0)
+            self.assertEqual(agreeing_digits(mpmath.mpf('1e-20'), mpmath.mpf(0)), 0)
+            self.assertFalse(values_agree(mpmath.mpf(0), mpmath.mpf('1e-50'), 10))
+
+    def test_opposite_signs(self):
+        with mpmath.workdps(60):
+            self.assertEqual(agreeing_digits(mpmath.mpf(1), mpmath.mpf(-1)), 0)
+            self.assertEqual(agreeing_digits(mpmath.mpf('1e-5'), mpmath.mpf('-1e-5')), 0)
+            self.assertFalse(values_agree(mpmath.pi, -mpmath.pi, 1))
+
+    def test_digit_boundary(self):
+        with mpmath.workdps(60):
+            # 0.999... and 1.000... differ in every printed digit, but agree on the value
+            almost_one = 1 - mpmath.mpf(10) ** -30
+            self.assertEqual(agreeing_digits(almost_one, mpmath.mpf(1)), 30)
+            self.assertEqual(agreeing_digits(mpmath.mpf(1), almost_one), 30)
+            self.assertTrue(values_agree(almost_one, mpmath.mpf(1), 30))
+            self.assertFalse(values_agree(almost_one, mpmath.mpf(1), 31))
+            # digits are counted from the binary exponents, so the count is at most one digit short
+            self.assertIn(agreeing_digits(mpmath.mpf(123456), mpmath.mpf(123457)), [4, 5])
+            self.assertEqual(agreeing_digits(mpmath.mpf('1.23456'), mpmath.mpf('1.23457')), 5)
+
+
+
+class EquivalenceTests(unittest.TestCase):
+
+    def test_unimodular_transform(self):
+        with mpmath.workdps(110):
+            x = mpmath.pi
+            y = (3 * x + 2) / (4 * x + 3)  # determinant 1
+            # the continued fractions of both end with the same tail, so they share fingerprints
+            self.assertTrue(mobius_fingerprints(x, 100) & mobius_fingerprints(y, 100))
+            # no other transforms are looked for, the class is found by the fingerprint index
+            self.assertEqual(group_by_equivalence(['x', 'y'], [x, y], 100, max_det=1), [['x', 'y']])
+
+    def test_hermite_transform(self):
+        transforms = hermite_transforms(4)
+        self.assertEqual(len(transforms), 3 + 4 + 7)  # sum of the divisors of each determinant
+        self.assertTrue(all(1 < a * d <= 4 and 0 <= b < d for a, b, d in transforms))
+        self.assertIn((1, 1, 2), transforms)
+        with mpmath.workdps(110):
+            x = mpmath.pi
+            y = (3 * x + 5) / (x + 1)  # determinant -2, (x + 1) / 2 transformed by a determinant 1 transform
+            self.assertFalse(mobius_fingerprints(x, 100) & mobius_fingerprints(y, 100))
+            self.assertEqual(group_by_equivalence(['x', 'y'], [x, y], 100, max_det=1), [['x'], ['y']])
+            self.assertEqual(group_by_equivalence(['x', 'y'], [x, y], 100, max_det=2), [['x', 'y']])
+
+    def test_unrelated_constants(self):
+        with mpmath.workdps(110):
+            values = [mpmath.pi, mpmath.e, 1 / mpmath.pi]
+            self.assertFalse(mobius_fingerprints(mpmath.pi, 100) & mobius_fingerprints(mpmath.e, 100))
+            self.assertEqual(group_by_equivalence(['pi', 'e', '1/pi'], values, 100), [['pi', '1/pi'], ['e']])
+
+
+if __name__ == '__main__':
+    unittest.main()